@@ -5,9 +5,20 @@ This script will process the existing JSON file and add state/province data
 for universities in countries that have states/provinces.
 """
 
+import argparse
+import filecmp
+import hashlib
 import json
+import os
 import re
-from typing import Dict, List, Optional
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from delta_manifest import DeltaManifest, manifest_path_for, patch_path_for, plan_delta, write_patch
+from university_store import UniversityStore
+from university_stream import iter_universities, write_universities
 
 # State/Province mappings for major countries
 US_STATES = {
@@ -51,152 +62,364 @@ INDIA_STATES = {
     "Uttar Pradesh": "UP", "Uttarakhand": "UK", "West Bengal": "WB"
 }
 
-# Common city-state patterns for US universities
-US_CITY_STATE_PATTERNS = [
-    (r"University of (\w+)(?: at| in)? (\w+)", "US"),
-    (r"(\w+) University(?: of| at| in)? (\w+)", "US"),
-    (r"(\w+) College(?: of| at| in)? (\w+)", "US"),
-    (r"(\w+) Institute(?: of| at| in)? (\w+)", "US"),
-    (r"(\w+) State University", "US"),
-    (r"(\w+) State College", "US"),
-    (r"(\w+) University", "US"),
-]
+# Common city-state mappings, consulted after the state/province names
+US_CITY_STATES = {
+    "New York": "NY", "Los Angeles": "CA", "Chicago": "IL", "Houston": "TX",
+    "Phoenix": "AZ", "Philadelphia": "PA", "San Antonio": "TX", "San Diego": "CA",
+    "Dallas": "TX", "San Jose": "CA", "Austin": "TX", "Jacksonville": "FL",
+    "Fort Worth": "TX", "Columbus": "OH", "Charlotte": "NC", "San Francisco": "CA",
+    "Indianapolis": "IN", "Seattle": "WA", "Denver": "CO", "Washington": "DC",
+    "Boston": "MA", "El Paso": "TX", "Nashville": "TN", "Detroit": "MI",
+    "Oklahoma City": "OK", "Portland": "OR", "Las Vegas": "NV", "Memphis": "TN",
+    "Louisville": "KY", "Baltimore": "MD", "Milwaukee": "WI", "Albuquerque": "NM",
+    "Tucson": "AZ", "Fresno": "CA", "Sacramento": "CA", "Kansas City": "MO",
+    "Mesa": "AZ", "Atlanta": "GA", "Long Beach": "CA", "Colorado Springs": "CO",
+    "Raleigh": "NC", "Miami": "FL", "Virginia Beach": "VA", "Omaha": "NE",
+    "Oakland": "CA", "Minneapolis": "MN", "Tulsa": "OK", "Arlington": "TX",
+    "Tampa": "FL", "New Orleans": "LA", "Wichita": "KS", "Cleveland": "OH",
+    "Bakersfield": "CA", "Aurora": "CO", "Anaheim": "CA", "Honolulu": "HI",
+    "Santa Ana": "CA", "Corpus Christi": "TX", "Riverside": "CA", "Lexington": "KY",
+    "Stockton": "CA", "Henderson": "NV", "Saint Paul": "MN", "St. Louis": "MO",
+    "Chula Vista": "CA", "Orlando": "FL", "Laredo": "TX",
+    "Chandler": "AZ", "Madison": "WI", "Lubbock": "TX", "Scottsdale": "AZ",
+    "Reno": "NV", "Buffalo": "NY", "Gilbert": "AZ", "Glendale": "AZ",
+    "North Las Vegas": "NV", "Fremont": "CA", "Boise": "ID", "Irvine": "CA"
+}
+
+CANADIAN_CITY_PROVINCES = {
+    "Toronto": "ON", "Montreal": "QC", "Vancouver": "BC", "Calgary": "AB",
+    "Edmonton": "AB", "Ottawa": "ON", "Winnipeg": "MB", "Quebec City": "QC",
+    "Hamilton": "ON", "Kitchener": "ON", "London": "ON", "Victoria": "BC",
+    "Halifax": "NS", "Saskatoon": "SK", "Regina": "SK", "St. John's": "NL"
+}
+
+AUSTRALIAN_CITY_STATES = {
+    "Sydney": "NSW", "Melbourne": "VIC", "Brisbane": "QLD", "Perth": "WA",
+    "Adelaide": "SA", "Hobart": "TAS", "Canberra": "ACT", "Darwin": "NT"
+}
+
+# Lookup tables per country, in priority order: earlier tables (and earlier
+# entries within a table) win when a name mentions several places.
+COUNTRY_STATE_TABLES = {
+    "United States": [US_STATES, US_CITY_STATES],
+    "Canada": [CANADIAN_PROVINCES, CANADIAN_CITY_PROVINCES],
+    "Australia": [AUSTRALIAN_STATES, AUSTRALIAN_CITY_STATES],
+    "Germany": [GERMAN_STATES],
+    "India": [INDIA_STATES],
+}
+
+# State abbreviation already present in the name, e.g. "Foo College (NY)"
+US_STATE_ABBR_PATTERN = re.compile(r'\(([A-Z]{2})\)')
+
+
+def _trie_pattern(node: Dict) -> str:
+    """Render a character trie as a regex; longer branches are tried first."""
+    branches = [
+        re.escape(char) + _trie_pattern(child)
+        for char, child in sorted(node.items()) if char != ""
+    ]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if "" in node:
+        # A needle ends here; the longer continuations are optional
+        body = "(?:" + body + ")?"
+    return body
+
+
+class StateMatcher:
+    """
+    Finds the highest-priority place name mentioned in a university name.
+
+    All place names ("needles") are compiled into one trie-shaped regex
+    wrapped in a lookahead, so a single scan reports the longest needle
+    starting at every position; shorter needles starting at the same spot
+    are its prefixes and are folded in ahead of time. Names are scanned one
+    space-separated token at a time and the result for each distinct token
+    is memoized, so repeated words like "university" cost a dict lookup.
+    Multi-word needles ("new york", "st. john's") are detected where their
+    first word ends a token and the rest of the name continues with them.
+    The cost per name grows with its length, not with the size of the tables.
+    """
+
+    # Drop memoized tokens once this many distinct ones have been seen
+    TOKEN_CACHE_SIZE = 200000
+
+    def __init__(self, tables: List[Dict[str, str]]):
+        priorities: Dict[str, int] = {}
+        values: List[str] = []
+        for table in tables:
+            for place_name, code in table.items():
+                needle = place_name.lower()
+                if needle not in priorities:
+                    priorities[needle] = len(values)
+                    values.append(code)
+        self._values = values
+        self._no_match = len(values)
+
+        # For each needle, the best priority among needles that are its prefixes
+        self._best: Dict[str, int] = {
+            needle: min(
+                priority for other, priority in priorities.items()
+                if needle.startswith(other)
+            )
+            for needle in priorities
+        }
+
+        trie: Dict = {}
+        for needle in priorities:
+            node = trie
+            for char in needle:
+                node = node.setdefault(char, {})
+            node[""] = {}
+        self._findall = re.compile("(?=(" + _trie_pattern(trie) + "))").findall
+
+        # Multi-word needles keyed by their first word: [(priority, rest), ...]
+        self._heads: Dict[str, List] = {}
+        for needle, priority in priorities.items():
+            first_word, space, rest = needle.partition(" ")
+            if space and first_word:
+                self._heads.setdefault(first_word, []).append((priority, space + rest))
+        self._head_words = tuple(self._heads)
+
+        self._tokens: Dict[str, tuple] = {}
+
+    def _scan_token(self, token: str) -> tuple:
+        """Best priority of needles inside a token, plus multi-word needles it can start."""
+        found = self._findall(token)
+        priority = min(map(self._best.__getitem__, found)) if found else self._no_match
+
+        heads = ()
+        if self._head_words and token.endswith(self._head_words):
+            starts = []
+            for start in range(len(token)):
+                starts.extend(self._heads.get(token[start:], ()))
+            heads = tuple(sorted(starts))
+
+        if len(self._tokens) >= self.TOKEN_CACHE_SIZE:
+            self._tokens.clear()
+        entry = self._tokens[token] = (priority, heads)
+        return entry
+
+    def match(self, name_lower: str) -> Optional[str]:
+        """Return the code of the best place found in an already lowercased name."""
+        tokens = self._tokens
+        best = self._no_match
+        offset = 0
+        for token in name_lower.split(" "):
+            entry = tokens.get(token) or self._scan_token(token)
+            if entry[0] < best:
+                best = entry[0]
+            offset += len(token) + 1
+            if entry[1]:
+                for priority, rest in entry[1]:
+                    if priority >= best:
+                        break
+                    if name_lower.startswith(rest, offset - 1):
+                        best = priority
+                        break
+        if best == self._no_match:
+            return None
+        return self._values[best]
+
+
+STATE_MATCHERS = {
+    country: StateMatcher(tables) for country, tables in COUNTRY_STATE_TABLES.items()
+}
+
+# Delta manifests written with other tables are ignored, since their results may differ
+TABLES_FINGERPRINT = hashlib.blake2b(
+    json.dumps(COUNTRY_STATE_TABLES, sort_keys=True).encode("utf-8"), digest_size=8
+).hexdigest()
+
 
 def extract_state_from_name(university_name: str, country: str) -> Optional[str]:
     """Extract state/province from university name based on country."""
     
+    matcher = STATE_MATCHERS.get(country)
+    if matcher is None:
+        return None
+    
     if country == "United States":
         # Check for state abbreviations in parentheses
-        state_match = re.search(r'\(([A-Z]{2})\)', university_name)
-        if state_match:
-            return state_match.group(1)
-        
-        # Check for common state patterns
-        for state_name, state_code in US_STATES.items():
-            if state_name.lower() in university_name.lower():
-                return state_code
-        
-        # Check for city-state patterns
-        for pattern, _ in US_CITY_STATE_PATTERNS:
-            match = re.search(pattern, university_name, re.IGNORECASE)
-            if match:
-                # Try to match the second group with a state
-                potential_state = match.group(2)
-                for state_name, state_code in US_STATES.items():
-                    if state_name.lower() in potential_state.lower():
-                        return state_code
-        
-        # Common city-state mappings
-        city_state_map = {
-            "New York": "NY", "Los Angeles": "CA", "Chicago": "IL", "Houston": "TX",
-            "Phoenix": "AZ", "Philadelphia": "PA", "San Antonio": "TX", "San Diego": "CA",
-            "Dallas": "TX", "San Jose": "CA", "Austin": "TX", "Jacksonville": "FL",
-            "Fort Worth": "TX", "Columbus": "OH", "Charlotte": "NC", "San Francisco": "CA",
-            "Indianapolis": "IN", "Seattle": "WA", "Denver": "CO", "Washington": "DC",
-            "Boston": "MA", "El Paso": "TX", "Nashville": "TN", "Detroit": "MI",
-            "Oklahoma City": "OK", "Portland": "OR", "Las Vegas": "NV", "Memphis": "TN",
-            "Louisville": "KY", "Baltimore": "MD", "Milwaukee": "WI", "Albuquerque": "NM",
-            "Tucson": "AZ", "Fresno": "CA", "Sacramento": "CA", "Kansas City": "MO",
-            "Mesa": "AZ", "Atlanta": "GA", "Long Beach": "CA", "Colorado Springs": "CO",
-            "Raleigh": "NC", "Miami": "FL", "Virginia Beach": "VA", "Omaha": "NE",
-            "Oakland": "CA", "Minneapolis": "MN", "Tulsa": "OK", "Arlington": "TX",
-            "Tampa": "FL", "New Orleans": "LA", "Wichita": "KS", "Cleveland": "OH",
-            "Bakersfield": "CA", "Aurora": "CO", "Anaheim": "CA", "Honolulu": "HI",
-            "Santa Ana": "CA", "Corpus Christi": "TX", "Riverside": "CA", "Lexington": "KY",
-            "Stockton": "CA", "Henderson": "NV", "Saint Paul": "MN", "St. Louis": "MO",
-            "Chula Vista": "CA", "Orlando": "FL", "San Jose": "CA", "Laredo": "TX",
-            "Chandler": "AZ", "Madison": "WI", "Lubbock": "TX", "Scottsdale": "AZ",
-            "Reno": "NV", "Buffalo": "NY", "Gilbert": "AZ", "Glendale": "AZ",
-            "North Las Vegas": "NV", "Fremont": "CA", "Boise": "ID", "Irvine": "CA"
-        }
-        
-        for city, state in city_state_map.items():
-            if city.lower() in university_name.lower():
-                return state
-    
-    elif country == "Canada":
-        for province_name, province_code in CANADIAN_PROVINCES.items():
-            if province_name.lower() in university_name.lower():
-                return province_code
-        
-        # Common Canadian city-province mappings
-        city_province_map = {
-            "Toronto": "ON", "Montreal": "QC", "Vancouver": "BC", "Calgary": "AB",
-            "Edmonton": "AB", "Ottawa": "ON", "Winnipeg": "MB", "Quebec City": "QC",
-            "Hamilton": "ON", "Kitchener": "ON", "London": "ON", "Victoria": "BC",
-            "Halifax": "NS", "Saskatoon": "SK", "Regina": "SK", "St. John's": "NL"
-        }
-        
-        for city, province in city_province_map.items():
-            if city.lower() in university_name.lower():
-                return province
-    
-    elif country == "Australia":
-        for state_name, state_code in AUSTRALIAN_STATES.items():
-            if state_name.lower() in university_name.lower():
-                return state_code
-        
-        # Common Australian city-state mappings
-        city_state_map = {
-            "Sydney": "NSW", "Melbourne": "VIC", "Brisbane": "QLD", "Perth": "WA",
-            "Adelaide": "SA", "Hobart": "TAS", "Canberra": "ACT", "Darwin": "NT"
-        }
-        
-        for city, state in city_state_map.items():
-            if city.lower() in university_name.lower():
-                return state
+        if "(" in university_name:
+            state_match = US_STATE_ABBR_PATTERN.search(university_name)
+            if state_match:
+                return state_match.group(1)
     
-    elif country == "Germany":
-        for state_name, state_code in GERMAN_STATES.items():
-            if state_name.lower() in university_name.lower():
-                return state_code
-    
-    elif country == "India":
-        for state_name, state_code in INDIA_STATES.items():
-            if state_name.lower() in university_name.lower():
-                return state_code
-    
-    return None
+    return matcher.match(university_name.lower())
+
+def extract_states(universities: List[Dict]) -> List[Optional[str]]:
+    """Extract the state/province for each university, in input order."""
+    return _extract_states_chunk([
+        (university.get("name", ""), university.get("country"))
+        for university in universities
+    ])
+
+
+def _extract_states_chunk(chunk: List[Tuple[str, Optional[str]]]) -> List[Optional[str]]:
+    """Worker entry point: extract states for a chunk of (name, country) pairs."""
+    return [
+        extract_state_from_name(name, country) if country is not None else None
+        for name, country in chunk
+    ]
+
+
+def extract_states_parallel(universities: List[Dict], workers: int) -> List[Optional[str]]:
+    """
+    Extract states on a process pool, returning them in input order.
+
+    Only (name, country) pairs are sent to the workers. Each worker builds
+    STATE_MATCHERS once when it imports this module and keeps its token
+    cache warm across all the chunks it is handed.
+    """
+    pairs = [
+        (university.get("name", ""), university.get("country"))
+        for university in universities
+    ]
+    # A few chunks per worker keeps them busy without much pickling overhead
+    chunk_size = max(1, -(-len(pairs) // (workers * 4)))
+    chunks = [pairs[i:i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+
+    states: List[Optional[str]] = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk_states in executor.map(_extract_states_chunk, chunks):
+            states.extend(chunk_states)
+    return states
 
-def add_states_to_universities(input_file: str, output_file: str):
-    """Process the universities JSON file and add state/province information."""
+
+def add_states_to_universities(input_file: str, output_file: str, workers: int = 1, delta: bool = False):
+    """
+    Process the universities JSON file and add state/province information.
+    
+    With delta=True, only records added or changed since the last run (as
+    recorded in the manifest next to output_file) are matched, and the
+    changes are written to a patch file instead of rewriting output_file.
+    Without a usable manifest and output file, a full run is done.
+    """
     
     print(f"Reading universities from {input_file}...")
     with open(input_file, 'r', encoding='utf-8') as f:
         universities = json.load(f)
     
-    print(f"Processing {len(universities)} universities...")
+    manifest = DeltaManifest(manifest_path_for(output_file), fingerprint=TABLES_FINGERPRINT)
+    changes = None
+    if delta and os.path.exists(output_file):
+        changes = plan_delta(manifest, universities)
+        if changes is None:
+            print(f"No usable manifest at {manifest.path}, doing a full run.")
+        else:
+            print(f"Delta against {manifest.path}: {changes.summary()}")
+    pending = changes.pending if changes is not None else universities
     
+    if workers > 1:
+        print(f"Processing {len(pending)} universities on {workers} workers...")
+        states = extract_states_parallel(pending, workers)
+    else:
+        print(f"Processing {len(pending)} universities...")
+        states = extract_states(pending)
+    
+    store = UniversityStore(universities)
     updated_count = 0
-    for university in universities:
-        if "country" in university:
-            country = university["country"]
-            university_name = university.get("name", "")
-            
-            # Extract state/province
-            state = extract_state_from_name(university_name, country)
-            
-            if state:
-                university["state"] = state
-                updated_count += 1
+    for university, state in zip(pending, states):
+        if state:
+            store.update(university, {"state": state})
+            updated_count += 1
     
     print(f"Added state/province information to {updated_count} universities.")
     
+    if changes is not None:
+        patch_file = patch_path_for(output_file)
+        change_count = write_patch(changes, patch_file)
+        manifest.save(universities)
+        print(f"Wrote {change_count} changes to {patch_file} ({output_file} left unchanged).")
+        return
+    
     # Save updated data
     print(f"Saving updated universities to {output_file}...")
     with open(output_file, 'w', encoding='utf-8') as f:
         json.dump(universities, f, indent=2, ensure_ascii=False)
+    if delta:
+        manifest.save(universities)
     
     print("Done! State/province information has been added to the universities list.")
 
+
+def add_states(universities: Iterable[Dict], counts: Dict[str, int]) -> Iterator[Dict]:
+    """Generator stage: add the state/province to each university as it passes."""
+    for university in universities:
+        counts["processed"] += 1
+        if "country" in university:
+            state = extract_state_from_name(university.get("name", ""), university["country"])
+            if state:
+                university["state"] = state
+                counts["updated"] += 1
+        yield university
+
+
+def add_states_to_universities_streaming(input_file: str, output_file: str):
+    """
+    Same as add_states_to_universities, but records are parsed, enriched and
+    written one at a time, so memory stays flat regardless of the file size.
+    """
+    
+    print(f"Streaming universities from {input_file} to {output_file}...")
+    counts = {"processed": 0, "updated": 0}
+    write_universities(add_states(iter_universities(input_file), counts), output_file)
+    
+    print(f"Processed {counts['processed']} universities.")
+    print(f"Added state/province information to {counts['updated']} universities.")
+    print("Done! State/province information has been added to the universities list.")
+
+
+def verify_parallel_output(input_file: str, workers: int) -> bool:
+    """Check that the parallel run writes a byte-identical file to the serial run."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        serial_file = os.path.join(tmp_dir, "serial.json")
+        parallel_file = os.path.join(tmp_dir, "parallel.json")
+        add_states_to_universities(input_file, serial_file)
+        add_states_to_universities(input_file, parallel_file, workers=workers)
+        identical = filecmp.cmp(serial_file, parallel_file, shallow=False)
+    
+    if identical:
+        print(f"✅ Parallel output ({workers} workers) is byte-identical to the serial output.")
+    else:
+        print(f"❌ Parallel output ({workers} workers) differs from the serial output!")
+    return identical
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Add state/province information to the universities list.")
+    parser.add_argument("--input", default="app/assets/world_universities_and_domains.json",
+                        help="universities JSON file to read")
+    parser.add_argument("--output", default="app/assets/world_universities_with_states.json",
+                        help="where to write the updated universities")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes (default: 1, serial)")
+    parser.add_argument("--stream", action="store_true",
+                        help="parse, enrich and write records one at a time (serial only)")
+    parser.add_argument("--verify", action="store_true",
+                        help="compare the --workers output with a serial run and exit non-zero on mismatch")
+    parser.add_argument("--delta", action="store_true",
+                        help="only process records changed since the last --delta run and write a patch file")
+    args = parser.parse_args()
+    if args.stream and (args.workers > 1 or args.verify or args.delta):
+        parser.error("--stream cannot be combined with --workers, --verify or --delta")
+    return args
+
+
 if __name__ == "__main__":
-    input_file = "app/assets/world_universities_and_domains.json"
-    output_file = "app/assets/world_universities_with_states.json"
+    args = parse_args()
     
     try:
-        add_states_to_universities(input_file, output_file)
+        if args.verify:
+            sys.exit(0 if verify_parallel_output(args.input, max(args.workers, 2)) else 1)
+        if args.stream:
+            add_states_to_universities_streaming(args.input, args.output)
+        else:
+            add_states_to_universities(args.input, args.output, workers=args.workers, delta=args.delta)
     except FileNotFoundError:
-        print(f"Error: Could not find {input_file}")
+        print(f"Error: Could not find {args.input}")
         print("Please make sure the file exists and the path is correct.")
     except Exception as e:
         print(f"Error: {e}")
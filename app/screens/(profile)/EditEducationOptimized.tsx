@@ -23,6 +23,7 @@ import { AuthContext } from "../../context/AuthContext";
 import DateTimePickerModal from "react-native-modal-datetime-picker";
 import { format } from "date-fns";
 import universities from "../../assets/world_universities_and_domains.json";
+import { searchUniversityPositions } from "../../util/nameSearchIndex";
 import { defaultDegrees, defaultFields } from "../../util/defaultValues";
 import axios from "axios";
 import CampuslyAlert from "../../components/CampuslyAlert";
@@ -112,12 +113,15 @@ export default function EditEducationOptimized({ route }: { route: any }) {
     }
 
     setIsSearching(true);
-    const filtered = universities
-      .filter((uni: any) => 
-        uni.name.toLowerCase().includes(query.toLowerCase()) ||
-        uni.country.toLowerCase().includes(query.toLowerCase())
-      )
-      .slice(0, 20);
+    // The first 20 matches on either field are among the first 20 of each
+    const positions = new Set([
+      ...searchUniversityPositions(query, "name", 20),
+      ...searchUniversityPositions(query, "country", 20),
+    ]);
+    const filtered = Array.from(positions)
+      .sort((a, b) => a - b)
+      .slice(0, 20)
+      .map((position) => universities[position]);
     
     setSearchResults(filtered);
     setIsSearching(false);
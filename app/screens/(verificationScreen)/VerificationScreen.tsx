@@ -19,6 +19,7 @@ import { NativeStackNavigationProp } from "@react-navigation/native-stack";
 import { useColorScheme } from "react-native";
 import SchoolSelector from "../../components/SchoolSelector";
 import universities from "../../assets/world_universities_and_domains.json";
+import { searchUniversities } from "../../util/nameSearchIndex";
 import Colors from "../../constants/Colors";
 import { useTheme } from "react-native-paper";
 import Ionicons from "@expo/vector-icons/Ionicons";
@@ -112,9 +113,7 @@ export default function VerificationScreen() {
     setLoading(true);
     setError(null);
     if (query) {
-      const results = universities.filter((university) =>
-        university.name.toLowerCase().includes(query.toLowerCase())
-      );
+      const results = searchUniversities(query);
       setResults(results);
     }
     setLoading(false);
@@ -0,0 +1,116 @@
+import universities from "../assets/world_universities_and_domains.json";
+
+// Trigram postings built by name_search_index.py in the repository root.
+// Loaded with require so TypeScript does not infer a type for ~10k keys.
+const indexFile: NameSearchIndexFile = require("../assets/university_name_index.json");
+
+type SearchField = "name" | "country";
+
+interface NameSearchIndexFile {
+  version: number;
+  gram: number;
+  records: number;
+  checksum: number;
+  fields: Record<SearchField, Record<string, string>>;
+}
+
+const GRAM = 3;
+const SEARCH_FIELDS: SearchField[] = ["name", "country"];
+
+const lowercasedValues: Record<SearchField, string[]> = {
+  name: universities.map((university) => (university.name || "").toLowerCase()),
+  country: universities.map((university) => (university.country || "").toLowerCase()),
+};
+
+const decodedPostings: Record<SearchField, Map<string, number[]>> = {
+  name: new Map(),
+  country: new Map(),
+};
+
+// FNV-1a over the UTF-16 code units of the lowercased values, each
+// followed by a 0 unit; the same loop as app_checksum in name_search_index.py
+const valuesChecksum = (): number => {
+  let checksum = 0x811c9dc5;
+  for (const field of SEARCH_FIELDS) {
+    for (const value of lowercasedValues[field]) {
+      for (let i = 0; i < value.length; i++) {
+        checksum = Math.imul(checksum ^ value.charCodeAt(i), 0x01000193);
+      }
+      checksum = Math.imul(checksum, 0x01000193);
+    }
+  }
+  return checksum >>> 0;
+};
+
+// An index built from another version of the universities file would
+// return wrong records, even one with the same length, so fall back to
+// scanning in that case
+const indexUsable =
+  indexFile.version === 2 &&
+  indexFile.gram === GRAM &&
+  indexFile.records === universities.length &&
+  indexFile.checksum === valuesChecksum();
+
+const getPostings = (field: SearchField, gram: string): number[] | undefined => {
+  const cached = decodedPostings[field].get(gram);
+  if (cached) return cached;
+
+  const encoded = indexFile.fields[field][gram];
+  if (encoded === undefined) return undefined;
+
+  // Positions are stored as base-36 gaps from the previous position
+  const positions: number[] = [];
+  let position = 0;
+  for (const gap of encoded.split(",")) {
+    position += parseInt(gap, 36);
+    positions.push(position);
+  }
+  decodedPostings[field].set(gram, positions);
+  return positions;
+};
+
+/**
+ * Positions of the universities whose field contains the query, ignoring
+ * case, in dataset order. Same results as
+ * universities.filter((u) => u[field].toLowerCase().includes(query.toLowerCase())),
+ * but a query of three or more characters only checks the records listed
+ * under its rarest trigram.
+ */
+export const searchUniversityPositions = (
+  query: string,
+  field: SearchField = "name",
+  limit?: number
+): number[] => {
+  const lowerQuery = query.toLowerCase();
+  const values = lowercasedValues[field];
+  const matches: number[] = [];
+
+  let candidates: number[] | undefined;
+  if (indexUsable && lowerQuery.length >= GRAM) {
+    for (let i = 0; i + GRAM <= lowerQuery.length; i++) {
+      const postings = getPostings(field, lowerQuery.slice(i, i + GRAM));
+      if (!postings) return [];
+      if (!candidates || postings.length < candidates.length) {
+        candidates = postings;
+      }
+    }
+  }
+
+  const positions = candidates ?? values.keys();
+  for (const position of positions) {
+    if (values[position].includes(lowerQuery)) {
+      matches.push(position);
+      if (limit !== undefined && matches.length >= limit) break;
+    }
+  }
+  return matches;
+};
+
+export const searchUniversities = (
+  query: string,
+  field: SearchField = "name",
+  limit?: number
+) =>
+  searchUniversityPositions(query, field, limit).map(
+    (position) => universities[position]
+  );
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the universities dataset pipeline.
+
+Times state extraction, loading/saving the JSON file, reading the
+columnar export, the streaming add-states pipeline, near-duplicate
+detection, chained campusly_data.py stages against the separate scripts,
+and the Google enhancer loops on the bundled dataset and on synthetic
+datasets scaled up from it. The enhancers talk to an in-process
+FakeGeocodingServer with configurable latency and handshake cost, so no
+API key, quota or network access is needed; their results include the
+connections the server accepted.
+
+Each benchmark runs in a fresh process, so the peak RSS reported is that
+benchmark's own. Results are written as JSON; pass --compare with an
+earlier results file to print the change in throughput.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+DEFAULT_DATASET = "app/assets/world_universities_and_domains.json"
+DEFAULT_SIZES = [0, 100000, 1000000]  # 0 is the bundled file as-is
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process, or of a script it ran and waited for, in MiB."""
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def count_records(dataset: str) -> int:
+    from university_stream import iter_universities
+    return sum(1 for _ in iter_universities(dataset))
+
+
+def scaled_dataset(source: str, size: int, target: str):
+    """Write `size` records built by repeating the source records with numbered names."""
+    from university_stream import iter_universities, write_universities
+
+    universities = list(iter_universities(source))
+
+    def generate():
+        for i in range(size):
+            university = dict(universities[i % len(universities)])
+            copy = i // len(universities)
+            if copy:
+                university["name"] = f"{university['name']} {copy + 1}"
+            yield university
+
+    write_universities(generate(), target)
+
+
+# Benchmarks. Each runs in its own process and returns its measurements.
+
+def bench_extract_states(dataset: str, options: Dict) -> Dict:
+    from add_states_to_universities import extract_states
+    from university_stream import iter_universities
+
+    universities = list(iter_universities(dataset))
+    start = time.perf_counter()
+    extract_states(universities)
+    return {"records": len(universities), "seconds": time.perf_counter() - start}
+
+
+def bench_load_universities(dataset: str, options: Dict) -> Dict:
+    from enhance_universities_with_google_api import load_universities
+
+    start = time.perf_counter()
+    universities = load_universities(dataset)
+    return {"records": len(universities), "seconds": time.perf_counter() - start}
+
+
+def bench_save_universities(dataset: str, options: Dict) -> Dict:
+    from enhance_universities_with_google_api import load_universities, save_universities
+
+    universities = load_universities(dataset)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        start = time.perf_counter()
+        save_universities(universities, os.path.join(tmp_dir, "out.json"))
+        seconds = time.perf_counter() - start
+    return {"records": len(universities), "seconds": seconds}
+
+
+def bench_load_columnar(dataset: str, options: Dict) -> Dict:
+    from university_columnar import ColumnarUniversities, write_columnar
+    from university_stream import iter_universities
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        columnar_file = os.path.join(tmp_dir, "universities.ucol")
+        write_columnar(list(iter_universities(dataset)), columnar_file)
+        start = time.perf_counter()
+        with ColumnarUniversities(columnar_file) as reader:
+            records = len(list(reader))
+        seconds = time.perf_counter() - start
+    return {"records": records, "seconds": seconds}
+
+
+def bench_add_states_streaming(dataset: str, options: Dict) -> Dict:
+    from add_states_to_universities import add_states_to_universities_streaming
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        start = time.perf_counter()
+        add_states_to_universities_streaming(dataset, os.path.join(tmp_dir, "out.json"))
+        seconds = time.perf_counter() - start
+    return {"records": count_records(dataset), "seconds": seconds}
+
+
+def _run_script(script: str, *args: str) -> float:
+    """Wall time of running one of the scripts in a fresh interpreter, cold start included."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, os.path.join(SCRIPT_DIR, script), *args],
+                   check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def bench_scripts_separate(dataset: str, options: Dict) -> Dict:
+    """States, then both indexes, as three scripts that each load the file again."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        states_file = os.path.join(tmp_dir, "states.json")
+        seconds = _run_script("add_states_to_universities.py", "--input", dataset, "--output", states_file)
+        seconds += _run_script("name_search_index.py", "--input", states_file,
+                               "--output", os.path.join(tmp_dir, "names.json"))
+        seconds += _run_script("domain_index.py", "--input", states_file,
+                               "--output", os.path.join(tmp_dir, "domains.json"))
+    return {"records": count_records(dataset), "seconds": seconds}
+
+
+def bench_cli_chained(dataset: str, options: Dict) -> Dict:
+    """The same work as scripts_separate in one campusly_data.py run."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cold_start = _run_script("campusly_data.py", "--help")
+        seconds = _run_script(
+            "campusly_data.py", "--input", dataset,
+            "states",
+            "export", "--output", os.path.join(tmp_dir, "states.json"),
+            "index", "--name-index", os.path.join(tmp_dir, "names.json"),
+            "--domain-index", os.path.join(tmp_dir, "domains.json"),
+        )
+    return {"records": count_records(dataset), "seconds": seconds, "cold_start_ms": round(cold_start * 1000, 1)}
+
+
+def bench_near_duplicates(dataset: str, options: Dict) -> Dict:
+    from near_duplicates import DedupInput, find_duplicates
+    from university_stream import iter_universities
+
+    start = time.perf_counter()
+    data = DedupInput.from_universities(iter_universities(dataset))
+    clusters = find_duplicates(data)
+    return {"records": len(data), "seconds": time.perf_counter() - start, "clusters": len(clusters)}
+
+
+def _geocoding_sample(dataset: str, size: int) -> List[Dict]:
+    from university_stream import iter_universities
+
+    sample = []
+    for university in iter_universities(dataset):
+        if university.get("country") and not university.get("state"):
+            sample.append(university)
+            if len(sample) >= size:
+                break
+    return sample
+
+
+def _bench_enhancer(
+    dataset: str,
+    options: Dict,
+    concurrent: bool,
+    throttle_rate: Optional[float] = None,
+    pool_size: Optional[int] = None
+) -> Dict:
+    from enhance_universities_with_google_api import (
+        enhance_universities_concurrently,
+        enhance_universities_with_google_api
+    )
+    from fake_geocoding_server import FakeGeocodingServer
+
+    size = options["geocode_concurrent"] if concurrent else options["geocode_serial"]
+    universities = _geocoding_sample(dataset, size)
+    with FakeGeocodingServer(latency=options["latency"], throttle_rate=throttle_rate,
+                             handshake_latency=options["handshake_latency"]) as server:
+        start = time.perf_counter()
+        if concurrent:
+            enhance_universities_concurrently(
+                universities, "fake-key", concurrency=options["concurrency"],
+                rate=options["rate"], base_url=server.google_base_url, pool_size=pool_size
+            )
+        else:
+            enhance_universities_with_google_api(
+                universities, "fake-key", base_url=server.google_base_url, pool_size=pool_size
+            )
+        seconds = time.perf_counter() - start
+        requests_served = server.requests_served
+        throttled = server.requests_throttled
+        connections = server.connections_accepted
+    result = {"records": len(universities), "seconds": seconds, "requests": requests_served,
+              "connections": connections}
+    if throttle_rate:
+        result["throttled"] = throttled
+    return result
+
+
+def bench_google_enhancer_serial(dataset: str, options: Dict) -> Dict:
+    return _bench_enhancer(dataset, options, concurrent=False)
+
+
+def bench_google_enhancer_concurrent(dataset: str, options: Dict) -> Dict:
+    return _bench_enhancer(dataset, options, concurrent=True)
+
+
+def bench_google_enhancer_unpooled(dataset: str, options: Dict) -> Dict:
+    """The concurrent enhancer opening a new connection for every request, as before sessions were pooled."""
+    return _bench_enhancer(dataset, options, concurrent=True, pool_size=0)
+
+
+def bench_google_enhancer_throttled(dataset: str, options: Dict) -> Dict:
+    """The concurrent enhancer against a server that allows fewer requests than --rate asks for."""
+    return _bench_enhancer(dataset, options, concurrent=True, throttle_rate=options["throttle_rate"])
+
+
+BENCHMARKS = {
+    "extract_states": bench_extract_states,
+    "load_universities": bench_load_universities,
+    "save_universities": bench_save_universities,
+    "load_columnar": bench_load_columnar,
+    "add_states_streaming": bench_add_states_streaming,
+    "near_duplicates": bench_near_duplicates,
+    "scripts_separate": bench_scripts_separate,
+    "cli_chained": bench_cli_chained,
+    "google_enhancer_serial": bench_google_enhancer_serial,
+    "google_enhancer_concurrent": bench_google_enhancer_concurrent,
+    "google_enhancer_unpooled": bench_google_enhancer_unpooled,
+    "google_enhancer_throttled": bench_google_enhancer_throttled,
+}
+
+# The enhancers run on a fixed-size sample, so they are only timed on the bundled file
+GEOCODING_BENCHMARKS = {
+    "google_enhancer_serial", "google_enhancer_concurrent", "google_enhancer_unpooled", "google_enhancer_throttled"
+}
+
+
+def _run_in_child(name: str, dataset: str, options: Dict) -> Dict:
+    """Child process entry point; the scripts' progress output is discarded."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = BENCHMARKS[name](dataset, options)
+    result["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    return result
+
+
+def run_benchmark(name: str, dataset: str, options: Dict) -> Dict:
+    # spawn rather than fork, so the child starts without the parent's memory
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        result = pool.apply(_run_in_child, (name, dataset, options))
+
+    seconds = result["seconds"]
+    result["seconds"] = round(seconds, 4)
+    result["records_per_s"] = round(result["records"] / seconds, 1) if seconds else None
+    if "requests" in result:
+        result["requests_per_s"] = round(result["requests"] / seconds, 1) if seconds else None
+    return result
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(results: Dict, baseline_file: str):
+    """Print throughput relative to an earlier results file."""
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    previous = {
+        (entry["benchmark"], entry["dataset_records"]): entry for entry in baseline["results"]
+    }
+
+    print(f"\n📊 Compared with {baseline_file} ({baseline['meta'].get('git_commit')})")
+    for entry in results["results"]:
+        old = previous.get((entry["benchmark"], entry["dataset_records"]))
+        if not old or not old.get("records_per_s") or not entry.get("records_per_s"):
+            continue
+        ratio = entry["records_per_s"] / old["records_per_s"]
+        print(f"  {entry['benchmark']:<28} {entry['dataset_records']:>9} records: "
+              f"{ratio:6.2f}x records/s, peak RSS {old['peak_rss_mb']} -> {entry['peak_rss_mb']} MiB")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the universities dataset pipeline.")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET,
+                        help="bundled universities JSON file the synthetic datasets are built from")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="dataset sizes to run; 0 is the bundled file (default: 0 100000 1000000)")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS),
+                        help="run only these benchmarks")
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="fake geocoder latency per request in seconds (default: 0.05)")
+    parser.add_argument("--handshake-latency", type=float, default=0.05,
+                        help="fake geocoder cost of opening a connection in seconds, standing in for "
+                             "TCP+TLS (default: 0.05)")
+    parser.add_argument("--geocode-serial", type=int, default=20,
+                        help="records looked up by the serial enhancer, which sleeps between requests (default: 20)")
+    parser.add_argument("--geocode-concurrent", type=int, default=500,
+                        help="records looked up by the concurrent enhancer (default: 500)")
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help="requests in flight for the concurrent enhancer (default: 16)")
+    parser.add_argument("--rate", type=float, default=200.0,
+                        help="request rate cap for the concurrent enhancer (default: 200/s)")
+    parser.add_argument("--throttle-rate", type=float, default=50.0,
+                        help="requests/s the fake server allows in the throttled benchmark (default: 50/s)")
+    parser.add_argument("--output", default="benchmark_results.json",
+                        help="where to write the results JSON")
+    parser.add_argument("--compare", default=None,
+                        help="earlier results JSON to compare against")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    names = args.only or list(BENCHMARKS)
+    options = {
+        "latency": args.latency,
+        "handshake_latency": args.handshake_latency,
+        "geocode_serial": args.geocode_serial,
+        "geocode_concurrent": args.geocode_concurrent,
+        "concurrency": args.concurrency,
+        "rate": args.rate,
+        "throttle_rate": args.throttle_rate,
+    }
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "options": options,
+        },
+        "results": [],
+    }
+
+    print("⏱️  Benchmarking the universities pipeline")
+    print("=" * 70)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in args.sizes:
+            dataset = args.dataset
+            if size:
+                dataset = os.path.join(tmp_dir, f"universities_{size}.json")
+                print(f"\n🧪 Building a synthetic dataset of {size} records...")
+                scaled_dataset(args.dataset, size, dataset)
+            dataset_records = size or count_records(dataset)
+
+            for name in names:
+                if name in GEOCODING_BENCHMARKS and size:
+                    continue
+                result = run_benchmark(name, dataset, options)
+                entry = {"benchmark": name, "dataset_records": dataset_records, **result}
+                results["results"].append(entry)
+                requests_note = (
+                    f", {entry['requests_per_s']:>9} req/s" if "requests_per_s" in entry else ""
+                )
+                if "connections" in entry:
+                    requests_note += f", {entry['connections']} connections"
+                if "cold_start_ms" in entry:
+                    requests_note += f", cold start {entry['cold_start_ms']} ms"
+                print(f"  {name:<28} {entry['records']:>9} records: {entry['records_per_s']:>11} rec/s, "
+                      f"peak RSS {entry['peak_rss_mb']:>7} MiB{requests_note}")
+
+            if size:
+                os.remove(dataset)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results written to {args.output}")
+
+    if args.compare:
+        compare_results(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
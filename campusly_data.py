@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+campusly-data: one entry point for the dataset scripts.
+
+    python campusly_data.py states index
+    python campusly_data.py states enrich --offline export --format json columnar shards index
+    python campusly_data.py --stream --input big.json states export --output big_with_states.json
+
+Stages run in the order given, over a single load of --input, so a chain
+costs one parse and one write instead of one per script. states and
+enrich change records; if no export stage follows them, the result is
+written as JSON to export's default --output. With --stream, records flow
+from --input through states into a JSON export one at a time, for files
+too large to hold in memory. Without it, --compact holds the loaded list
+as university_record.University objects instead of dicts, which takes
+about 60% less memory for the same output.
+
+Only the modules of the stages named on the command line are imported:
+a states/index run never loads requests or NumPy, and enrich loads
+requests only when a provider is actually called. Each stage parses its
+own options ("python campusly_data.py enrich -h"). At the end a line per
+step (startup, load, each stage, write) shows where the time went.
+"""
+
+import argparse
+import importlib
+import json
+import sys
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+_STARTED = time.perf_counter()
+
+DEFAULT_INPUT = "app/assets/world_universities_and_domains.json"
+DEFAULT_OUTPUT = "app/assets/world_universities_with_states.json"
+
+EXPORT_FORMATS = ("json", "columnar", "shards")
+
+
+class Stage(ABC):
+    """One subcommand. Its modules are imported only when it appears on the command line."""
+    name = ""
+    help = ""
+    modules: Tuple[str, ...] = ()
+    modifies = False  # the records change, so the dataset has to be written out afterwards
+
+    def add_arguments(self, parser: argparse.ArgumentParser):
+        pass
+
+    @abstractmethod
+    def run(self, universities: List[Dict], args: argparse.Namespace):
+        """Run the stage over the loaded records."""
+
+
+class StatesStage(Stage):
+    name = "states"
+    help = "add states from the name rules of add_states_to_universities.py"
+    modules = ("add_states_to_universities",)
+    modifies = True
+
+    def add_arguments(self, parser: argparse.ArgumentParser):
+        parser.add_argument("--workers", type=int, default=1,
+                            help="worker processes for state extraction (default: 1)")
+
+    def run(self, universities: List[Dict], args: argparse.Namespace):
+        from add_states_to_universities import extract_states, extract_states_parallel
+
+        if args.workers > 1:
+            states = extract_states_parallel(universities, args.workers)
+        else:
+            states = extract_states(universities)
+        updated = 0
+        for university, state in zip(universities, states):
+            if state:
+                university["state"] = state
+                updated += 1
+        print(f"🏷️  Added a state to {updated} universities")
+
+    def stream(self, universities: Iterable[Dict], args: argparse.Namespace) -> Iterator[Dict]:
+        from add_states_to_universities import add_states
+
+        counts = {"processed": 0, "updated": 0}
+        yield from add_states(universities, counts)
+        print(f"🏷️  Added a state to {counts['updated']} of {counts['processed']} universities")
+
+
+class EnrichStage(Stage):
+    name = "enrich"
+    help = "resolve missing states through the tiers of resolution_pipeline.py"
+    modules = ("resolution_pipeline",)
+    modifies = True
+
+    def add_arguments(self, parser: argparse.ArgumentParser):
+        from resolution_pipeline import add_pipeline_arguments
+        add_pipeline_arguments(parser)
+
+    def run(self, universities: List[Dict], args: argparse.Namespace):
+        from resolution_pipeline import resolve_states
+
+        report = resolve_states(universities, args)
+        print(f"✅ Resolved {sum(stats.resolved for stats in report)} universities")
+
+
+class ExportStage(Stage):
+    name = "export"
+    help = "write the records as JSON, the columnar file and/or per-country shards"
+    modules = ("university_stream", "university_columnar", "dataset_shards")
+
+    def add_arguments(self, parser: argparse.ArgumentParser):
+        from dataset_shards import DEFAULT_SHARD_DIR
+
+        parser.add_argument("--format", dest="formats", nargs="+", choices=EXPORT_FORMATS, default=["json"],
+                            help="what to write (default: json)")
+        parser.add_argument("--output", default=DEFAULT_OUTPUT,
+                            help="JSON file to write (default: %(default)s)")
+        parser.add_argument("--columnar-output", default="app/assets/world_universities_and_domains.ucol",
+                            help="columnar file to write (default: %(default)s)")
+        parser.add_argument("--shard-dir", default=DEFAULT_SHARD_DIR,
+                            help="directory for the shards and manifest.json (default: %(default)s)")
+
+    def run(self, universities: Iterable[Dict], args: argparse.Namespace):
+        from dataset_shards import write_shards
+        from university_columnar import write_columnar
+        from university_stream import write_universities
+
+        for export_format in args.formats:
+            if export_format == "json":
+                count = write_universities(universities, args.output)
+                print(f"💾 Wrote {count} universities to {args.output}")
+            elif export_format == "columnar":
+                size = write_columnar(universities, args.columnar_output)
+                print(f"💾 Wrote the columnar file {args.columnar_output} ({size} bytes)")
+            else:
+                manifest = write_shards(universities, args.shard_dir)
+                print(f"💾 Wrote {len(manifest['shards'])} shards to {args.shard_dir}")
+
+
+class IndexStage(Stage):
+    name = "index"
+    help = "build the name search and email domain indexes for the app"
+    modules = ("name_search_index", "domain_index")
+
+    def add_arguments(self, parser: argparse.ArgumentParser):
+        parser.add_argument("--name-index", default="app/assets/university_name_index.json",
+                            help="where to write the name search index (default: %(default)s)")
+        parser.add_argument("--domain-index", default="app/assets/university_domain_index.json",
+                            help="where to write the domain index (default: %(default)s)")
+
+    def run(self, universities: List[Dict], args: argparse.Namespace):
+        from domain_index import DomainIndex
+        from name_search_index import build_index
+
+        with open(args.name_index, 'w', encoding='utf-8') as f:
+            json.dump(build_index(universities), f, ensure_ascii=False, separators=(",", ":"))
+        DomainIndex.from_universities(universities).save(args.domain_index)
+        print(f"🔍 Indexed {len(universities)} universities into {args.name_index} and {args.domain_index}")
+
+
+STAGES = {stage.name: stage for stage in (StatesStage(), EnrichStage(), ExportStage(), IndexStage())}
+
+
+def global_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="campusly-data",
+        description="Run dataset stages over a single load of the universities list.",
+        epilog="stages:\n" + "\n".join(f"  {name:<8} {stage.help}" for name, stage in STAGES.items())
+               + "\n\nstage options: campusly-data STAGE -h",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--input", default=DEFAULT_INPUT,
+                        help="universities JSON file to load (default: %(default)s)")
+    parser.add_argument("--stream", action="store_true",
+                        help="stream records from --input through states into a JSON export")
+    parser.add_argument("--compact", action="store_true",
+                        help="hold the loaded records as compact University objects instead of dicts")
+    return parser
+
+
+def stage_parser(stage: Stage) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog=f"campusly-data {stage.name}", description=stage.help)
+    stage.add_arguments(parser)
+    return parser
+
+
+def values_taken(parser: argparse.ArgumentParser, token: str) -> int:
+    """How many of the next tokens the option `token` of parser takes as its value."""
+    if not token.startswith("-") or "=" in token:
+        return 0
+    # argparse also accepts unambiguous prefixes, as in --out for --output
+    actions = parser._option_string_actions
+    action = actions.get(token)
+    if action is None:
+        prefixed = {actions[option] for option in actions if option.startswith(token)}
+        action = prefixed.pop() if len(prefixed) == 1 else None
+    if action is None:
+        return 0
+    # Lists (nargs "+" or "*") and optional values end at the next stage name
+    if action.nargs is None:
+        return 1
+    return action.nargs if isinstance(action.nargs, int) else 0
+
+
+def split_stages(argv: List[str]) -> Tuple[List[str], List[Tuple[str, List[str]]]]:
+    """
+    Global arguments, then (stage name, stage arguments) in command line
+    order. A stage name given as an option's value ("--output index") is
+    the value, not a new stage.
+    """
+    global_argv: List[str] = []
+    stages: List[Tuple[str, List[str]]] = []
+    parser = global_parser()
+    values = 0
+    for token in argv:
+        if values:
+            values -= 1
+        elif token in STAGES:
+            stages.append((token, []))
+            parser = stage_parser(STAGES[token])
+            continue
+        else:
+            values = values_taken(parser, token)
+        (stages[-1][1] if stages else global_argv).append(token)
+    return global_argv, stages
+
+
+def parse_args(argv: List[str]) -> Tuple[argparse.Namespace, List[Tuple[Stage, argparse.Namespace]]]:
+    global_argv, stage_argvs = split_stages(argv)
+    parser = global_parser()
+    args = parser.parse_args(global_argv)
+    if not stage_argvs:
+        parser.error(f"no stage given; choose from {', '.join(STAGES)}")
+
+    stages = []
+    for name, stage_argv in stage_argvs:
+        stage = STAGES[name]
+        stages.append((stage, stage_parser(stage).parse_args(stage_argv)))
+
+    # Changed records are written out even if the command line does not say so
+    last_export = max((i for i, (stage, _) in enumerate(stages) if stage is STAGES["export"]), default=-1)
+    if any(stage.modifies for stage, _ in stages[last_export + 1:]):
+        export = STAGES["export"]
+        stages.append((export, stage_parser(export).parse_args([])))
+
+    if args.stream:
+        *middle, (last, last_args) = stages
+        if (any(stage is not STAGES["states"] or stage_args.workers > 1 for stage, stage_args in middle)
+                or last is not STAGES["export"] or last_args.formats != ["json"]):
+            parser.error("--stream runs only states stages (without --workers) into a JSON export")
+    return args, stages
+
+
+def main(argv: List[str] = None):
+    args, stages = parse_args(sys.argv[1:] if argv is None else argv)
+    for stage, _ in stages:
+        for module in stage.modules:
+            importlib.import_module(module)
+    from university_stream import iter_universities
+
+    timings = [("startup", time.perf_counter() - _STARTED)]
+
+    if args.stream:
+        start = time.perf_counter()
+        universities: Iterable[Dict] = iter_universities(args.input)
+        for stage, stage_args in stages[:-1]:
+            universities = stage.stream(universities, stage_args)
+        export, export_args = stages[-1]
+        export.run(universities, export_args)
+        timings.append(("stream", time.perf_counter() - start))
+    else:
+        start = time.perf_counter()
+        if args.compact:
+            from university_record import load_records
+            universities = load_records(args.input)
+        else:
+            universities = list(iter_universities(args.input))
+        timings.append(("load", time.perf_counter() - start))
+        print(f"📖 Loaded {len(universities)} universities from {args.input}")
+        for stage, stage_args in stages:
+            start = time.perf_counter()
+            stage.run(universities, stage_args)
+            timings.append((stage.name, time.perf_counter() - start))
+
+    timings.append(("total", time.perf_counter() - _STARTED))
+    print("⏱️  " + ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Merge a new upstream dataset into the previous enriched outputs.
+
+    python dataset_merge.py
+    python dataset_merge.py --upstream ~/Downloads/world_universities_and_domains.json --dry-run
+
+When upstream publishes a new world_universities_and_domains.json, the
+states resolved for the old list still hold for almost every school,
+even one that was renamed, reordered or given another domain. The merge
+hash-joins the previous enriched records with the new upstream records
+and copies the resolved fields across. A refresh then only has to
+enrich what is actually new.
+
+The previous records are hashed once on each normalized domain and on
+(name, country). Each upstream record then probes those
+tables and matches, in this order:
+
+1. a previous record sharing a domain and the name
+2. a previous record with the same name and country (its domains changed)
+3. the only previous record sharing a domain (the school was renamed).
+   When several share one, the one in the same country is used, as long
+   as they agree on the resolved fields.
+
+Each previous record matches at most once, in dataset order. The
+resolved fields are not carried over when they contradict the new
+record. Such a record is a conflict, and the enrichment resolves it
+again:
+
+- country: the match is in another country, so its state code does not apply
+- upstream: the new record has its own value for a resolved field, or a
+  changed state-province naming another state
+- ambiguous: several previous records share a domain and disagree
+
+Each previous file is rewritten with the upstream records, in upstream
+order, and a report of the added, removed and conflicting records is
+written next to it. When the file has a delta manifest, the manifest is
+rewritten for the merged records. The next --delta run of the script
+that wrote the file then processes only three kinds of record: added
+ones, conflicts, and changed ones that had nothing resolved.
+"""
+
+import argparse
+import json
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from add_states_to_universities import extract_state_from_name
+from delta_manifest import DERIVED_FIELDS, DeltaManifest, derived_fields, manifest_fingerprint, manifest_path_for
+from university_store import normalize_domain
+from university_stream import write_universities
+
+DEFAULT_UPSTREAM = "app/assets/world_universities_and_domains.json"
+DEFAULT_PREVIOUS = ("app/assets/world_universities_with_states.json",
+                    "app/assets/world_universities_enhanced.json")
+
+REPORT_VERSION = 1
+
+
+def record_domains(university: Dict) -> Set[str]:
+    return {normalize_domain(domain) for domain in university.get("domains") or ()}
+
+
+def name_key(university: Dict) -> Tuple[Optional[str], Optional[str]]:
+    name = university.get("name")
+    return name.strip() if isinstance(name, str) else name, university.get("country")
+
+
+def upstream_fields(university: Dict) -> Dict:
+    return {key: value for key, value in university.items() if key not in DERIVED_FIELDS}
+
+
+def conflict_reason(previous: Dict, university: Dict) -> Optional[str]:
+    """Why the previous record's resolved fields must not be carried over, if they must not."""
+    if previous.get("country") != university.get("country"):
+        return "country"
+    for field in DERIVED_FIELDS:
+        if university.get(field) is not None and previous.get(field) not in (None, university[field]):
+            return "upstream"
+    province = university.get("state-province")
+    if province and province != previous.get("state-province") and previous.get("state"):
+        state = extract_state_from_name(province, university.get("country"))
+        if state and state != previous["state"]:
+            return "upstream"
+    return None
+
+
+class PreviousRecords:
+    """The previous enriched records, hashed on normalized domain and on (name, country)."""
+
+    def __init__(self, universities: List[Dict]):
+        self.records = universities
+        self.claimed = bytearray(len(universities))
+        self.by_domain: Dict[str, List[int]] = {}
+        self.by_name: Dict[Tuple[Optional[str], Optional[str]], List[int]] = {}
+        for position, university in enumerate(universities):
+            for domain in record_domains(university):
+                self.by_domain.setdefault(domain, []).append(position)
+            self.by_name.setdefault(name_key(university), []).append(position)
+
+    def match(self, university: Dict) -> Tuple[Optional[int], str]:
+        """
+        (position of the matching previous record, how it matched).
+
+        How is "domain" or "name"; a record without a match gets None and
+        "ambiguous" when several previous records could be it, or "".
+        """
+        claimed = self.claimed
+        domains = record_domains(university)
+        named = [position for position in self.by_name.get(name_key(university), ()) if not claimed[position]]
+        for position in named:
+            if not domains.isdisjoint(record_domains(self.records[position])):
+                return position, "domain"
+        if named:
+            return named[0], "name"
+
+        # Only renamed schools get here, so a domain shared by many records is scanned rarely
+        sharing = sorted({
+            position for domain in domains for position in self.by_domain.get(domain, ()) if not claimed[position]
+        })
+        if len(sharing) > 1:
+            country = university.get("country")
+            sharing = [position for position in sharing if self.records[position].get("country") == country] or sharing
+            resolved = {tuple(self.records[position].get(field) for field in DERIVED_FIELDS) for position in sharing}
+            if len(resolved) > 1:
+                return None, "ambiguous"
+        if sharing:
+            return sharing[0], "domain"
+        return None, ""
+
+    def unclaimed(self) -> Iterator[Dict]:
+        return (university for university, claimed in zip(self.records, self.claimed) if not claimed)
+
+
+class MergeResult:
+    """The merged records and what changed between the previous and the upstream lists."""
+
+    def __init__(self):
+        self.records: List[Dict] = []
+        self.pending: Set[int] = set()  # positions the next enrichment run has to process
+        self.added: List[Dict] = []
+        self.removed: List[Dict] = []
+        self.conflicts: List[Dict] = []
+        self.counts = {"unchanged": 0, "changed": 0, "added": 0, "removed": 0, "conflicts": 0,
+                       "carried": 0, "by_domain": 0, "by_name": 0}
+
+    def summary(self) -> str:
+        counts = self.counts
+        return (
+            f"{counts['unchanged']} unchanged, {counts['changed']} changed, {counts['added']} added, "
+            f"{counts['removed']} removed; resolved fields carried to {counts['carried']}, "
+            f"{counts['conflicts']} conflicts"
+        )
+
+    def report(self, upstream_file: str) -> Dict:
+        return {
+            "version": REPORT_VERSION,
+            "upstream": upstream_file,
+            "counts": self.counts,
+            "added": [[university.get("name"), university.get("country")] for university in self.added],
+            "removed": [{"name": university.get("name"), "country": university.get("country"),
+                         **derived_fields(university)} for university in self.removed],
+            "conflicts": self.conflicts,
+        }
+
+
+def _conflict(university: Dict, reason: str, previous: Optional[Dict] = None) -> Dict:
+    conflict = {"name": university.get("name"), "country": university.get("country"), "reason": reason}
+    if previous is not None:
+        conflict["previous"] = {"name": previous.get("name"), "country": previous.get("country"),
+                                **derived_fields(previous)}
+    return conflict
+
+
+def merge(previous: List[Dict], upstream: Iterable[Dict]) -> MergeResult:
+    """
+    Join the upstream records with the previous enriched ones and carry
+    the resolved fields across.
+
+    The previous list is hashed once and each upstream record probes it
+    once, so the merge is linear in the size of both lists. The upstream
+    records are updated in place.
+    """
+    index = PreviousRecords(previous)
+    result = MergeResult()
+    counts = result.counts
+    for university in upstream:
+        position, how = index.match(university)
+        if position is None:
+            if how == "ambiguous":
+                counts["conflicts"] += 1
+                result.conflicts.append(_conflict(university, how))
+            else:
+                counts["added"] += 1
+                result.added.append(university)
+            result.pending.add(len(result.records))
+            result.records.append(university)
+            continue
+
+        index.claimed[position] = 1
+        match = previous[position]
+        counts[f"by_{how}"] += 1
+        changed = upstream_fields(match) != upstream_fields(university)
+        counts["changed" if changed else "unchanged"] += 1
+
+        reason = conflict_reason(match, university)
+        fields = derived_fields(match)
+        if reason is not None:
+            counts["conflicts"] += 1
+            result.conflicts.append(_conflict(university, reason, match))
+            result.pending.add(len(result.records))
+        elif fields:
+            university.update(fields)
+            counts["carried"] += 1
+        elif changed:
+            # Nothing was resolved for the old version; the new one may resolve
+            result.pending.add(len(result.records))
+        result.records.append(university)
+
+    result.removed = list(index.unclaimed())
+    counts["removed"] = len(result.removed)
+    return result
+
+
+def report_path_for(output_file: str) -> str:
+    return f"{output_file}.merge.json"
+
+
+def merge_file(previous_file: str, upstream_file: str, dry_run: bool = False) -> MergeResult:
+    """
+    Merge upstream_file into previous_file and, unless dry_run, write the
+    merged records over previous_file, the merge report next to it and
+    its delta manifest if it has one.
+    """
+    with open(previous_file, 'r', encoding='utf-8') as f:
+        previous = json.load(f)
+    with open(upstream_file, 'r', encoding='utf-8') as f:
+        result = merge(previous, json.load(f))
+    if dry_run:
+        return result
+
+    # The manifest follows the script that wrote the file, so its fingerprint is kept
+    manifest_path = manifest_path_for(previous_file)
+    fingerprint = manifest_fingerprint(manifest_path)
+    write_universities(result.records, previous_file)
+    if fingerprint is not None:
+        DeltaManifest(manifest_path, fingerprint).save(result.records, stale=result.pending)
+    with open(report_path_for(previous_file), 'w', encoding='utf-8') as f:
+        json.dump(result.report(upstream_file), f, indent=2, ensure_ascii=False)
+    return result
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Carry resolved states from the enriched outputs to a new upstream list.")
+    parser.add_argument("--upstream", default=DEFAULT_UPSTREAM,
+                        help="new upstream universities JSON file (default: %(default)s)")
+    parser.add_argument("--previous", nargs="+", default=list(DEFAULT_PREVIOUS),
+                        help="enriched outputs to merge into, rewritten in place (default: both enriched outputs)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only report what the merge would change")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    for previous_file in args.previous:
+        print(f"🔀 Merging {args.upstream} into {previous_file}...")
+        start = time.perf_counter()
+        try:
+            result = merge_file(previous_file, args.upstream, args.dry_run)
+        except FileNotFoundError as e:
+            print(f"⏭️  Skipped: {e.filename} not found")
+            continue
+        seconds = time.perf_counter() - start
+
+        print(f"📊 {result.summary()} in {seconds:.2f}s")
+        print(f"   matched {result.counts['by_domain']} by domain, {result.counts['by_name']} by name and country")
+        print(f"   {len(result.pending)} universities left for the next enrichment run")
+        if args.dry_run:
+            continue
+        print(f"💾 Wrote {len(result.records)} universities to {previous_file}, "
+              f"report in {report_path_for(previous_file)}")
+        if manifest_fingerprint(manifest_path_for(previous_file)) is not None:
+            print(f"🧾 Updated {manifest_path_for(previous_file)}; the next --delta run only processes those")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Per-country shards of the universities dataset.
+
+The exporter splits the list into one JSON file per alpha_two_code (same
+layout as the full file, records in dataset order) and writes a manifest
+with each shard's record count, byte size and SHA-256. Scripts working on
+a few countries open only those shards instead of parsing the whole list;
+the manifest lets them find the shard for "US" or "United States" and
+check that the file is the one the manifest describes.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+from typing import Dict, Iterable, List, Set
+
+from university_stream import iter_universities, write_universities
+
+DEFAULT_SHARD_DIR = "app/assets/universities_by_country"
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+# Shard for records without a usable alpha_two_code
+UNKNOWN_SHARD = "_unknown"
+
+
+def shard_key(university: Dict) -> str:
+    code = university.get("alpha_two_code")
+    if isinstance(code, str) and re.fullmatch(r"[A-Za-z]{2}", code):
+        return code.upper()
+    return UNKNOWN_SHARD
+
+
+def _sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _previous_shard_files(shard_dir: str) -> Set[str]:
+    """Shard files listed by the manifest already in shard_dir, if there is one."""
+    try:
+        manifest = load_manifest(shard_dir)
+    except (FileNotFoundError, ValueError):
+        return set()
+    # Only plain file names; a manifest must not point the cleanup elsewhere
+    return {
+        shard["file"] for shard in manifest.get("shards", {}).values()
+        if os.path.basename(shard.get("file", "")) == shard.get("file") and shard["file"] != MANIFEST_NAME
+    }
+
+
+def write_shards(universities: Iterable[Dict], shard_dir: str) -> Dict:
+    """Write one shard per country code plus the manifest; returns the manifest."""
+    groups: Dict[str, List[Dict]] = {}
+    for university in universities:
+        groups.setdefault(shard_key(university), []).append(university)
+
+    os.makedirs(shard_dir, exist_ok=True)
+    previous = _previous_shard_files(shard_dir)
+    shards = {}
+    for key, members in groups.items():
+        file_name = f"{key}.json"
+        file_path = os.path.join(shard_dir, file_name)
+        write_universities(members, file_path)
+        shards[key] = {
+            "file": file_name,
+            "records": len(members),
+            "bytes": os.path.getsize(file_path),
+            "sha256": _sha256(file_path),
+            "countries": sorted({member.get("country") for member in members if member.get("country")}),
+        }
+
+    # Drop shards left over from an earlier export; only files its manifest
+    # listed, since the directory may hold other datasets
+    written = {shard["file"] for shard in shards.values()}
+    for file_name in previous - written:
+        file_path = os.path.join(shard_dir, file_name)
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "records": sum(shard["records"] for shard in shards.values()),
+        "shards": dict(sorted(shards.items())),
+    }
+    tmp_path = os.path.join(shard_dir, f"{MANIFEST_NAME}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(shard_dir, MANIFEST_NAME))
+    return manifest
+
+
+def load_manifest(shard_dir: str) -> Dict:
+    with open(os.path.join(shard_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported shard manifest in {shard_dir}")
+    return manifest
+
+
+def resolve_countries(manifest: Dict, countries: Iterable[str]) -> List[str]:
+    """Shard keys for country codes or names ("US", "united states"), in the order given."""
+    by_name = {
+        country.casefold(): key
+        for key, shard in manifest["shards"].items()
+        for country in shard["countries"]
+    }
+    keys = []
+    for country in countries:
+        key = country.upper() if country.upper() in manifest["shards"] else by_name.get(country.casefold())
+        if key is None:
+            raise ValueError(f"No shard for country {country!r}")
+        if key not in keys:
+            keys.append(key)
+    return keys
+
+
+def load_shards(shard_dir: str, countries: Iterable[str]) -> List[Dict]:
+    """Load the records of the given countries, checking each shard against the manifest."""
+    manifest = load_manifest(shard_dir)
+    universities: List[Dict] = []
+    for key in resolve_countries(manifest, countries):
+        shard = manifest["shards"][key]
+        file_path = os.path.join(shard_dir, shard["file"])
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        if len(data) != shard["bytes"] or hashlib.sha256(data).hexdigest() != shard["sha256"]:
+            raise ValueError(f"Shard {file_path} does not match the manifest; re-run dataset_shards.py")
+        universities.extend(json.loads(data))
+    return universities
+
+
+def shard_output_path(output_file: str, keys: List[str]) -> str:
+    """Output file for a run over some shards, e.g. world_universities_enhanced.US-CA.json."""
+    root, ext = os.path.splitext(output_file)
+    return f"{root}.{'-'.join(keys)}{ext}"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Split the universities list into per-country shards.")
+    parser.add_argument("--input", default="app/assets/world_universities_and_domains.json",
+                        help="universities JSON file to split")
+    parser.add_argument("--output-dir", default=DEFAULT_SHARD_DIR,
+                        help="directory for the shards and manifest.json")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    manifest = write_shards(iter_universities(args.input), args.output_dir)
+    largest = max(manifest["shards"].items(), key=lambda item: item[1]["records"])
+    print(f"✅ Wrote {manifest['records']} universities into {len(manifest['shards'])} shards in {args.output_dir}")
+    print(f"   Largest shard: {largest[0]} with {largest[1]['records']} universities")
@@ -0,0 +1,221 @@
+"""
+Incremental (delta) runs keyed on per-record content hashes.
+
+Every upstream record gets a stable content hash over its upstream fields
+(everything except the fields our scripts derive, such as "state"). A
+manifest written next to the output remembers, for each record, the hash
+and the derived fields of the last run. On the next refresh only records
+that are new or whose hash changed are parsed, matched or geocoded; the
+rest get their previous results back from the manifest. The changes are
+written as a small patch file instead of rewriting the whole output.
+
+Records are identified by (name, country, occurrence), where occurrence
+numbers the records that share a name and country in dataset order.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Collection, Dict, Iterable, List, Optional, Set, Tuple
+
+from university_stream import iter_universities, write_universities
+
+# Fields added by our own scripts; they are not part of the content hash
+DERIVED_FIELDS = ("state",)
+
+MANIFEST_VERSION = 1
+
+RecordKey = Tuple[str, str, int]
+
+
+def record_hash(university: Dict) -> str:
+    """Stable hash of a record's upstream fields, independent of key order."""
+    upstream = {key: value for key, value in university.items() if key not in DERIVED_FIELDS}
+    payload = json.dumps(upstream, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def derived_fields(university: Dict) -> Dict:
+    return {field: university[field] for field in DERIVED_FIELDS if field in university}
+
+
+def record_keys(universities: Iterable[Dict]) -> List[RecordKey]:
+    """(name, country, occurrence) for each record, in dataset order."""
+    seen: Dict[Tuple[str, str], int] = {}
+    keys = []
+    for university in universities:
+        name_country = (university.get("name"), university.get("country"))
+        occurrence = seen.get(name_country, 0)
+        seen[name_country] = occurrence + 1
+        keys.append(name_country + (occurrence,))
+    return keys
+
+
+class Delta:
+    """What changed between the manifest and the current records."""
+
+    def __init__(self):
+        self.unchanged: List[Tuple[Dict, Dict]] = []  # (record, fields from the manifest)
+        self.added: List[Tuple[RecordKey, Dict]] = []
+        self.changed: List[Tuple[RecordKey, Dict]] = []
+        self.removed: List[RecordKey] = []
+        self.pending: List[Dict] = []  # added and changed records, in dataset order
+
+    def summary(self) -> str:
+        return (
+            f"{len(self.unchanged)} unchanged, {len(self.added)} added, "
+            f"{len(self.changed)} changed, {len(self.removed)} removed"
+        )
+
+
+class DeltaManifest:
+    """
+    JSON manifest of {"key", "hash", "fields"} entries from the last run.
+
+    fingerprint identifies whatever else the results depend on (lookup
+    tables, provider); a manifest written with another fingerprint is
+    ignored, so every record is processed again.
+    """
+
+    def __init__(self, path: str, fingerprint: str = ""):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.entries: Dict[RecordKey, Tuple[str, Dict]] = {}
+
+    def load(self) -> bool:
+        """Read the manifest; returns False if there is no usable one."""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("version") != MANIFEST_VERSION or data.get("fingerprint") != self.fingerprint:
+            return False
+        self.entries = {
+            tuple(entry["key"]): (entry["hash"], entry.get("fields", {}))
+            for entry in data.get("records", ())
+        }
+        return True
+
+    def diff(self, universities: List[Dict]) -> Delta:
+        """Compare the current records with the manifest."""
+        delta = Delta()
+        current = set()
+        for key, university in zip(record_keys(universities), universities):
+            current.add(key)
+            previous = self.entries.get(key)
+            if previous is not None and previous[0] == record_hash(university):
+                delta.unchanged.append((university, previous[1]))
+                continue
+            (delta.added if previous is None else delta.changed).append((key, university))
+            delta.pending.append(university)
+        delta.removed = [key for key in self.entries if key not in current]
+        return delta
+
+    def save(self, universities: List[Dict], stale: Collection[int] = ()):
+        """
+        Record the hashes and derived fields of the finished run.
+
+        Records at the positions in stale get no hash, so the next delta
+        run processes them again as changed.
+        """
+        records = [
+            {"key": list(key), "hash": "" if position in stale else record_hash(university),
+             "fields": derived_fields(university)}
+            for position, (key, university) in enumerate(zip(record_keys(universities), universities))
+        ]
+        data = {"version": MANIFEST_VERSION, "fingerprint": self.fingerprint, "records": records}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+
+def unresolved_positions(universities: List[Dict], candidates: Optional[Iterable[Dict]] = None) -> Set[int]:
+    """
+    Positions of the candidates (all records by default) still without a
+    state after a run: lookups that were deferred, throttled or failed.
+    Saved as stale, they are retried by the next delta run.
+    """
+    pending = {id(university) for university in (universities if candidates is None else candidates)
+               if not university.get("state")}
+    return {position for position, university in enumerate(universities) if id(university) in pending}
+
+
+def manifest_fingerprint(path: str) -> Optional[str]:
+    """The fingerprint of the manifest at path, or None if there is no usable one."""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return data.get("fingerprint", "") if data.get("version") == MANIFEST_VERSION else None
+
+
+def manifest_path_for(output_file: str) -> str:
+    return f"{output_file}.manifest.json"
+
+
+def patch_path_for(output_file: str) -> str:
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"{output_file}.{timestamp}.patch.json"
+
+
+def write_patch(delta: Delta, patch_file: str) -> int:
+    """Write the added, changed and removed records; returns the number of changes."""
+    patch = {
+        "added": [{"key": list(key), "record": university} for key, university in delta.added],
+        "changed": [{"key": list(key), "record": university} for key, university in delta.changed],
+        "removed": [{"key": list(key)} for key in delta.removed],
+    }
+    with open(patch_file, 'w', encoding='utf-8') as f:
+        json.dump(patch, f, indent=2, ensure_ascii=False)
+    return len(delta.added) + len(delta.changed) + len(delta.removed)
+
+
+def apply_patch(universities: List[Dict], patch: Dict) -> List[Dict]:
+    """
+    Apply a patch to a full output list.
+
+    Changed records are replaced in place, removed ones dropped and added
+    ones appended at the end.
+    """
+    replacements = {tuple(entry["key"]): entry["record"] for entry in patch.get("changed", ())}
+    removed = {tuple(entry["key"]) for entry in patch.get("removed", ())}
+    patched = [
+        replacements.get(key, university)
+        for key, university in zip(record_keys(universities), universities)
+        if key not in removed
+    ]
+    patched.extend(entry["record"] for entry in patch.get("added", ()))
+    return patched
+
+
+def apply_patch_file(output_file: str, patch_file: str) -> int:
+    """Fold a patch file into an output file; returns the number of records written."""
+    with open(patch_file, 'r', encoding='utf-8') as f:
+        patch = json.load(f)
+    return write_universities(apply_patch(list(iter_universities(output_file)), patch), output_file)
+
+
+def plan_delta(manifest: DeltaManifest, universities: List[Dict]) -> Optional[Delta]:
+    """
+    Load the manifest and diff the records against it, restoring the
+    previous results of the unchanged ones. Returns None when there is no
+    usable manifest, in which case the caller does a full run.
+    """
+    if not manifest.load():
+        return None
+    delta = manifest.diff(universities)
+    for university, fields in delta.unchanged:
+        university.update(fields)
+    return delta
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3:
+        print("Usage: python delta_manifest.py <output.json> <patch.json>")
+        sys.exit(2)
+    count = apply_patch_file(sys.argv[1], sys.argv[2])
+    print(f"✅ Applied {sys.argv[2]}: {count} universities in {sys.argv[1]}")
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Reverse-label suffix index from email domains to universities.
+
+Every entry in each record's "domains" is split into labels and inserted
+into a trie from the last label inwards ("stanford.edu" is stored under
+"edu" -> "stanford"). Resolving an email domain walks the same path, so
+"cs.mail.stanford.edu" finds Stanford by longest-suffix match in as many
+steps as the domain has labels, without scanning the list. Matches are on
+whole labels: "notstanford.edu" does not match "stanford.edu".
+
+A domain listed by several records is reported as shared, so the caller
+can ask the user to pick instead of guessing.
+
+The index file stores a hash of the records' domains. Loading it against
+a universities list it was not built from warns and rebuilds the index
+in memory, since its positions would point at the wrong records.
+"""
+
+import argparse
+import hashlib
+import json
+from typing import Dict, List, Optional
+
+from university_store import normalize_domain
+
+# Key under which a trie node stores the positions of the records claiming
+# the domain that ends there; "#" cannot appear in a domain label
+RECORDS_KEY = "#"
+
+INDEX_VERSION = 2
+
+
+def domain_labels(domain: str) -> List[str]:
+    """Labels of a domain or email address, last label first."""
+    domain = normalize_domain(domain.rpartition("@")[2])
+    return [label for label in reversed(domain.split(".")) if label]
+
+
+def source_hash(universities: List[Dict]) -> str:
+    """Fingerprint of every record's domains, in dataset order, to detect an index built from another file."""
+    digest = hashlib.blake2b(digest_size=8)
+    for university in universities:
+        for domain in university.get("domains") or ():
+            digest.update(normalize_domain(domain).encode("utf-8") + b"\0")
+        digest.update(b"\1")
+    return digest.hexdigest()
+
+
+def build_domain_trie(universities: List[Dict]) -> Dict:
+    """Nested {label: node} dicts; a node's RECORDS_KEY lists the records claiming that domain."""
+    trie: Dict = {}
+    for position, university in enumerate(universities):
+        for domain in university.get("domains") or ():
+            labels = domain_labels(domain)
+            if not labels:
+                continue
+            node = trie
+            for label in labels:
+                node = node.setdefault(label, {})
+            positions = node.setdefault(RECORDS_KEY, [])
+            if position not in positions:
+                positions.append(position)
+    return trie
+
+
+class DomainMatch:
+    """The longest registered suffix of a looked-up domain and the records claiming it."""
+
+    def __init__(self, domain: str, positions: List[int]):
+        self.domain = domain
+        self.positions = positions
+
+    @property
+    def shared(self) -> bool:
+        return len(self.positions) > 1
+
+    def __repr__(self) -> str:
+        return f"DomainMatch({self.domain!r}, {self.positions})"
+
+
+class DomainIndex:
+    """Longest-suffix lookups from email domains to record positions."""
+
+    def __init__(self, trie: Dict, records: int, source: str):
+        self.trie = trie
+        self.records = records  # size of the list the positions refer to
+        self.source = source  # source_hash of that list
+
+    @classmethod
+    def from_universities(cls, universities: List[Dict]) -> "DomainIndex":
+        return cls(build_domain_trie(universities), len(universities), source_hash(universities))
+
+    @classmethod
+    def load(cls, index_file: str, universities: List[Dict]) -> "DomainIndex":
+        """The saved index, or one rebuilt from universities when it was built from another list."""
+        with open(index_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("version") != INDEX_VERSION:
+            raise ValueError("Unsupported domain index format")
+        if data.get("records") != len(universities) or data.get("source_hash") != source_hash(universities):
+            print(f"⚠️  {index_file} was built from a different universities file; rebuilding it in memory")
+            return cls.from_universities(universities)
+        return cls(data["trie"], data["records"], data["source_hash"])
+
+    def save(self, index_file: str):
+        with open(index_file, 'w', encoding='utf-8') as f:
+            json.dump({"version": INDEX_VERSION, "records": self.records, "source_hash": self.source,
+                       "trie": self.trie}, f, ensure_ascii=False, separators=(",", ":"))
+
+    def lookup(self, domain: str) -> Optional[DomainMatch]:
+        """Match a domain (or a whole email address) to its longest registered suffix."""
+        labels = domain_labels(domain)
+        node = self.trie
+        best = None
+        for depth, label in enumerate(labels, start=1):
+            node = node.get(label)
+            if node is None:
+                break
+            if RECORDS_KEY in node:
+                best = (depth, node[RECORDS_KEY])
+        if best is None:
+            return None
+        depth, positions = best
+        return DomainMatch(".".join(reversed(labels[:depth])), positions)
+
+    def shared_domains(self) -> Dict[str, List[int]]:
+        """Domains claimed by more than one record, with the records claiming them."""
+        shared = {}
+        stack = [(self.trie, [])]
+        while stack:
+            node, labels = stack.pop()
+            for label, child in node.items():
+                if label == RECORDS_KEY:
+                    if len(child) > 1:
+                        shared[".".join(reversed(labels))] = child
+                else:
+                    stack.append((child, labels + [label]))
+        return dict(sorted(shared.items()))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build the email domain index for the universities list.")
+    parser.add_argument("--input", default="app/assets/world_universities_and_domains.json",
+                        help="universities JSON file to index")
+    parser.add_argument("--output", default="app/assets/university_domain_index.json",
+                        help="where to write the index")
+    parser.add_argument("--lookup", nargs="+", default=(),
+                        help="email addresses or domains to resolve after building")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    print(f"Reading universities from {args.input}...")
+    with open(args.input, 'r', encoding='utf-8') as f:
+        universities = json.load(f)
+
+    index = DomainIndex.from_universities(universities)
+    index.save(args.output)
+    shared = index.shared_domains()
+    print(f"Indexed the domains of {len(universities)} universities into {args.output}")
+    print(f"{len(shared)} domains are claimed by more than one university")
+
+    for query in args.lookup:
+        match = index.lookup(query)
+        if match is None:
+            print(f"❌ {query}: no university")
+            continue
+        names = ", ".join(universities[position]["name"] for position in match.positions)
+        note = " (shared)" if match.shared else ""
+        print(f"✅ {query} -> {match.domain}{note}: {names}")
+
+
+if __name__ == "__main__":
+    main()
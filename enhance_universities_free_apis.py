@@ -4,56 +4,174 @@ Free API script for on-demand university state fetching.
 Uses OpenStreetMap/Nominatim API which is completely free.
 """
 
+import argparse
 import json
-import requests
+import os
 import time
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 
+from dataset_shards import DEFAULT_SHARD_DIR, load_manifest, load_shards, resolve_countries, shard_output_path
+from delta_manifest import (
+    DeltaManifest, manifest_path_for, patch_path_for, plan_delta, unresolved_positions, write_patch
+)
+from enrichment_journal import EnrichmentJournal, journal_path_for
+from enrichment_metrics import Metrics, add_metrics_arguments, collecting_metrics, profiling
+from enrichment_scheduler import (
+    DEFAULT_MAX_ATTEMPTS, AdaptiveRate, DemandSignals, Throttled, TransientError, add_scheduler_arguments,
+    enrich_groups, load_demand, parse_retry_after
+)
+from gazetteer import DEFAULT_GAZETTEER_PATH, Gazetteer, apply_gazetteer
+from geocoding_cache import GeocodingCache, entry_results, results_entry
+from http_session import (
+    DEFAULT_POOL_SIZE, DEFAULT_RETRIES, REQUEST_TIMEOUT, RETRY_STATUSES, add_session_arguments, is_timeout,
+    is_transient, shared_session
+)
+from place_matcher import DEFAULT_MATCH_THRESHOLD, MATCH_CANDIDATES, PlaceMatcher
+from query_planner import QueryGroup, agreeing_members, plan_queries, single_queries
+from university_store import UniversityStore
+from university_stream import write_universities
+
+# Nominatim's usage policy allows one request per second; stay just under it
+NOMINATIM_RATE = 1 / 1.1
+
 class FreeGeocodingAPI:
-    def __init__(self):
-        self.base_url = "https://nominatim.openstreetmap.org"
+    provider = "nominatim"
+    
+    def __init__(
+        self,
+        cache: Optional[GeocodingCache] = None,
+        base_url: str = "https://nominatim.openstreetmap.org",
+        metrics: Optional[Metrics] = None,
+        verbose: bool = False,
+        matcher: Optional[PlaceMatcher] = None,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        http_retries: int = DEFAULT_RETRIES
+    ):
+        self.base_url = base_url
         self.requests_made = 0
         self.max_requests_per_second = 1  # Nominatim allows 1 request per second
+        self.cache = cache
+        self.metrics = metrics
+        self.verbose = verbose  # one line per record instead of just the counters
+        self.matcher = matcher  # checks results against the university name
+        self.pool_size = pool_size  # keep-alive connections per host, shared with other clients
+        self.http_retries = http_retries  # retried by the scheduler, through the rate limit and quota
+        self._session = None
+    
+    @property
+    def session(self):
+        """The shared keep-alive session for this pool size, created on first use"""
+        if self._session is None:
+            self._session = shared_session(self.pool_size)
+        return self._session
         
-    def search_place(self, query: str) -> Optional[Dict]:
+    def lookup_cached(self, query: str, name: Optional[str] = None) -> Tuple[bool, Optional[Dict]]:
+        """Look the query up in the cache only; returns (found, place)"""
+        if not self.cache:
+            return False, None
+        start = time.perf_counter()
+        found, entry = self.cache.lookup(self.provider, query)
+        if found and self.metrics:
+            self.metrics.observe_request(self.provider, "cache", time.perf_counter() - start)
+        return found, self.pick_result(entry_results(entry), name) if found else None
+    
+    def store_results(self, query: str, results: List[Dict]):
+        """Cache the raw results of a query; an empty list is cached as a "no results" answer"""
+        if self.cache:
+            self.cache.store(self.provider, query, results_entry(results))
+    
+    def search_place(self, query: str, name: Optional[str] = None) -> Optional[Dict]:
         """Search for a place using OpenStreetMap/Nominatim API"""
+        found, place = self.lookup_cached(query, name)
+        if found:
+            return place
+        
         if self.requests_made > 0:
             # Respect rate limit
             time.sleep(1.1)  # Wait slightly more than 1 second
-            
+        
+        try:
+            results, cacheable = self.fetch_results(query)
+        except Throttled as throttled:
+            print(f"⚠️  Nominatim is throttling requests ({throttled}). Please try again later.")
+            return None
+        except TransientError:
+            return None  # already reported; not cached, so the next run asks again
+        if cacheable:
+            # "No results" is cached as well, errors are not
+            self.store_results(query, results)
+        return self.pick_result(results, name)
+    
+    def fetch_results(self, query: str) -> Tuple[Optional[List[Dict]], bool]:
+        """
+        Send one search request, bypassing the cache and the rate limit.
+        
+        Returns (results, cacheable), where results is every place found,
+        [] for no results, and cacheable is False when the request failed
+        rather than got an answer. Raises Throttled on HTTP 429 or 503,
+        with the server's Retry-After if it sent one, and TransientError
+        on a timeout, a lost connection or HTTP 500/502/504.
+        """
         search_url = f"{self.base_url}/search"
         params = {
             "q": query,
             "format": "json",
             "addressdetails": 1,
-            "limit": 1,
+            # Always several candidates, so the cached results serve runs with or without a matcher
+            "limit": MATCH_CANDIDATES,
             "countrycodes": "",  # Will be set based on country
             "accept-language": "en"
         }
         
+        import requests  # on first use, so offline runs never load the HTTP stack
+
+        start = time.perf_counter()
+        status = "error"
         try:
-            response = requests.get(search_url, params=params, timeout=10)
+            response = self.session.get(search_url, params=params, timeout=REQUEST_TIMEOUT)
             self.requests_made += 1
+            status = str(response.status_code)
             
             if response.status_code == 200:
                 data = response.json()
                 
-                if data and len(data) > 0:
-                    return data[0]  # Return first result
-                else:
+                if not data and self.verbose:
                     print(f"⚠️  No results found for: {query}")
-                    return None
+                return data or [], True
+            elif response.status_code in (429, 503):
+                raise Throttled(f"HTTP {response.status_code}",
+                                parse_retry_after(response.headers.get("Retry-After")))
+            elif response.status_code in RETRY_STATUSES:
+                raise TransientError(f"HTTP {response.status_code}")
             else:
                 print(f"❌ HTTP error: {response.status_code}")
-                return None
+                return None, False
                 
-        except requests.exceptions.Timeout:
-            print("⏰ Request timeout")
-            return None
         except requests.exceptions.RequestException as e:
-            print(f"❌ Request error: {e}")
+            if is_timeout(e):
+                status = "timeout"
+                print("⏰ Request timeout")
+            else:
+                print(f"❌ Request error: {e}")
+            if is_transient(e):
+                raise TransientError(str(e)) from e
+            return None, False
+        finally:
+            if self.metrics:
+                self.metrics.observe_request(self.provider, status, time.perf_counter() - start)
+    
+    def pick_result(self, results: Optional[List[Dict]], name: Optional[str]) -> Optional[Dict]:
+        """The result that matches the university name, or the first result without a matcher"""
+        if not results:
             return None
+        if not (self.matcher and name):
+            return results[0]
+        place = self.matcher.choose(name, results)
+        if self.metrics:
+            outcome = "rejected" if place is None else "first" if place is results[0] else "reranked"
+            self.metrics.count(f"{self.provider}.match.{outcome}")
+        return place
     
     def extract_state_from_place(self, place: Dict, country: str) -> Optional[str]:
         """Extract state/province from Nominatim result"""
@@ -178,7 +296,8 @@ class FreeGeocodingAPI:
 def test_free_api():
     """Test the free API with sample universities"""
     
-    api = FreeGeocodingAPI()
+    cache = GeocodingCache()
+    api = FreeGeocodingAPI(cache=cache, verbose=True)
     
     test_universities = [
         {"name": "Stanford University", "country": "United States"},
@@ -215,11 +334,235 @@ def test_free_api():
         # Small delay between requests
         time.sleep(1.1)
     
+    print(f"\n📦 Cache hit rate: {cache.hit_rate()*100:.1f}% ({api.requests_made} remote requests)")
+    cache.close()
+    
     print("\n✅ Test completed!")
     print("\nTo use this in your app:")
     print("1. Import the FreeGeocodingAPI class")
     print("2. Call it when users select universities")
     print("3. Cache the results in your universities list")
 
+def record_free_result(
+    api: FreeGeocodingAPI,
+    store: UniversityStore,
+    group: QueryGroup,
+    place: Optional[Dict],
+    stats: Dict[str, int],
+    journal: Optional[EnrichmentJournal] = None
+):
+    """Apply one search result to every university in its query group and update the stats"""
+    members = agreeing = group.members
+    outcome = "failed"
+    if place:
+        state = api.extract_state_from_place(place, members[0]["country"])
+        
+        if state:
+            agreeing = agreeing_members(members, state)
+            for university in agreeing:
+                store.update(university, {"state": state})
+                if journal:
+                    journal.append(university, {"state": state})
+            stats["states_added"] += len(agreeing)
+            # Members whose own state-province names another state keep theirs unresolved
+            stats["failed"] += len(members) - len(agreeing)
+            outcome = "states_added"
+            if api.verbose:
+                print(f"    ✅ Added state: {state}")
+        else:
+            if api.verbose:
+                print(f"    ⚠️  Could not extract state from place data")
+            stats["failed"] += len(members)
+            outcome = "no_state_in_place"
+    else:
+        if api.verbose:
+            print(f"    ❌ Could not find place data")
+        stats["failed"] += len(members)
+        outcome = "no_place"
+    
+    stats["total_processed"] += len(members)
+    if api.metrics:
+        api.metrics.count(f"records.{outcome}", len(agreeing))
+        if len(agreeing) < len(members):
+            api.metrics.count("records.conflicting_state", len(members) - len(agreeing))
+        api.metrics.count("records.processed", len(members))
+        api.metrics.count("lookups.processed")
+
+def enhance_universities_with_free_api(
+    universities: List[Dict],
+    cache: Optional[GeocodingCache] = None,
+    base_url: str = "https://nominatim.openstreetmap.org",
+    coalesce: bool = True,
+    journal: Optional[EnrichmentJournal] = None,
+    candidates: Optional[List[Dict]] = None,
+    metrics: Optional[Metrics] = None,
+    verbose: bool = False,
+    matcher: Optional[PlaceMatcher] = None,
+    demand: Optional[DemandSignals] = None,
+    quota: Optional[int] = None,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    rate: float = NOMINATIM_RATE,
+    pool_size: int = 1,
+    http_retries: int = DEFAULT_RETRIES
+) -> Dict[str, int]:
+    """
+    Enhance universities (or just the candidates) with missing state info using OpenStreetMap/Nominatim.
+    
+    Requests go out one at a time at no more than `rate` per second, the
+    schools in `demand` first. When Nominatim answers 429/503 the rate
+    drops and the lookup is retried after its Retry-After; lookups that
+    exhaust `max_attempts` or the `quota` are counted as deferred. All
+    requests reuse one keep-alive connection unless `pool_size` says otherwise.
+    """
+    
+    metrics = metrics or Metrics()
+    api = FreeGeocodingAPI(cache=cache, base_url=base_url, metrics=metrics, verbose=verbose, matcher=matcher,
+                           pool_size=pool_size, http_retries=http_retries)
+    store = UniversityStore(universities)
+    
+    universities_needing_state = [
+        uni for uni in (universities if candidates is None else candidates)
+        if not uni.get("state") and uni.get("country")
+    ]
+    with metrics.timer("plan"):
+        plan = plan_queries(universities_needing_state) if coalesce else single_queries(universities_needing_state)
+    stats = {
+        "total_processed": 0,
+        "states_added": 0,
+        "failed": 0,
+        "already_had_state": len(universities) - len(universities_needing_state),
+        "requests_saved": plan.requests_saved,
+        "deferred": 0
+    }
+    
+    print(f"🎯 Found {len(universities_needing_state)} universities needing state info")
+    print(f"🧮 {plan.summary()}")
+    
+    def record(group: QueryGroup, place: Optional[Dict]):
+        if verbose:
+            print(f"  {stats['total_processed'] + 1}/{len(universities_needing_state)}: {group.members[0]['name']}")
+        record_free_result(api, store, group, place, stats, journal)
+    
+    with metrics.timer("lookups"):
+        schedule = enrich_groups(api, plan.groups, record, AdaptiveRate(rate), quota=quota,
+                                 max_attempts=max_attempts, demand=demand)
+    stats["deferred"] = schedule.deferred_records
+    
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Add missing states using OpenStreetMap/Nominatim.")
+    parser.add_argument("--input", default=None,
+                        help="universities JSON file to enhance (default: run the API test, unless --country is given)")
+    parser.add_argument("--output", default="app/assets/world_universities_enhanced.json",
+                        help="where to write the enhanced universities")
+    parser.add_argument("--no-coalesce", dest="coalesce", action="store_false",
+                        help="send one lookup per university instead of one per query/domain group")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="print how many lookups would be sent, then exit")
+    parser.add_argument("--resume", action="store_true",
+                        help="replay the journal of an interrupted run and skip what it already resolved")
+    parser.add_argument("--delta", action="store_true",
+                        help="only look up records changed since the last --delta run and write a patch file")
+    parser.add_argument("--country", nargs="+", default=None,
+                        help="only load these countries (codes or names) from the per-country shards")
+    parser.add_argument("--shards", default=DEFAULT_SHARD_DIR,
+                        help="directory written by dataset_shards.py (default: %(default)s)")
+    parser.add_argument("--gazetteer", default=DEFAULT_GAZETTEER_PATH,
+                        help="compiled gazetteer tried before the API (default: %(default)s, "
+                             "or the built-in tables if it does not exist)")
+    parser.add_argument("--no-gazetteer", dest="gazetteer", action="store_const", const=None,
+                        help="send every lookup to the API")
+    parser.add_argument("--match-threshold", type=float, default=DEFAULT_MATCH_THRESHOLD,
+                        help="minimum name similarity for a result to be used (default: %(default)s)")
+    parser.add_argument("--no-match", dest="match", action="store_false",
+                        help="take the first result without checking its name")
+    add_scheduler_arguments(parser)
+    add_session_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    
+    if not args.input and not args.country:
+        test_free_api()
+        return
+    
+    if args.country:
+        try:
+            keys = resolve_countries(load_manifest(args.shards), args.country)
+            args.output = shard_output_path(args.output, keys)
+            print(f"📖 Loading shards {', '.join(keys)} from {args.shards}...")
+            universities = load_shards(args.shards, keys)
+        except FileNotFoundError:
+            print(f"❌ No shards found in {args.shards}. Run dataset_shards.py first.")
+            return
+        except KeyError as e:
+            print(f"❌ Incomplete shard manifest in {args.shards} (no {e}). Run dataset_shards.py again.")
+            return
+        except ValueError as e:
+            print(f"❌ {e}")
+            return
+    else:
+        with open(args.input, 'r', encoding='utf-8') as f:
+            universities = json.load(f)
+    
+    manifest = DeltaManifest(manifest_path_for(args.output), fingerprint=FreeGeocodingAPI.provider)
+    changes = None
+    if args.delta and os.path.exists(args.output):
+        changes = plan_delta(manifest, universities)
+        if changes is None:
+            print(f"🧾 No usable manifest at {manifest.path}, doing a full run")
+        else:
+            print(f"🧾 Delta against {manifest.path}: {changes.summary()}")
+    candidates = changes.pending if changes is not None else universities
+    
+    journal = EnrichmentJournal(journal_path_for(args.output))
+    if args.resume:
+        replayed = journal.replay(UniversityStore(universities))
+        print(f"♻️  Resumed: {replayed} universities restored from {journal.path}")
+    
+    if args.gazetteer is not None:
+        gazetteer = Gazetteer.load(args.gazetteer)
+        offline = apply_gazetteer(candidates, gazetteer, UniversityStore(universities))
+        print(f"🗺️  Resolved {offline} universities offline with the gazetteer")
+    
+    if args.dry_run:
+        needing_state = [uni for uni in candidates if not uni.get("state") and uni.get("country")]
+        plan = plan_queries(needing_state) if args.coalesce else single_queries(needing_state)
+        print(f"🧮 Dry run: {plan.summary()}")
+        return
+    
+    matcher = PlaceMatcher.from_universities(universities, args.match_threshold) if args.match else None
+    journal.start(resume=args.resume)
+    try:
+        with GeocodingCache() as cache, collecting_metrics(args) as metrics:
+            with profiling(args.profile, args.profile_mode):
+                stats = enhance_universities_with_free_api(
+                    universities, cache=cache, coalesce=args.coalesce, journal=journal,
+                    candidates=candidates, metrics=metrics, verbose=args.verbose, matcher=matcher,
+                    demand=load_demand(args.demand), quota=args.quota, max_attempts=args.max_attempts,
+                    pool_size=1 if args.pool_size is None else args.pool_size, http_retries=args.http_retries
+                )
+            print(f"\n📊 States added: {stats['states_added']}, failed: {stats['failed']}, "
+                  f"deferred: {stats['deferred']}, cache hit rate: {cache.hit_rate()*100:.1f}%")
+            if metrics.requests:
+                print(f"⏱️  Lookup latency by outcome:\n{metrics.summary()}")
+    finally:
+        journal.close()
+    
+    if changes is not None:
+        patch_file = patch_path_for(args.output)
+        change_count = write_patch(changes, patch_file)
+        manifest.save(universities, stale=unresolved_positions(universities, candidates))
+        journal.discard()
+        print(f"🧾 Wrote {change_count} changes to {patch_file} ({args.output} left unchanged)")
+        return
+    
+    # Fold the journal into the output with a single write
+    count = write_universities(universities, args.output)
+    journal.discard()
+    if args.delta:
+        manifest.save(universities, stale=unresolved_positions(universities, candidates))
+    print(f"✅ Saved {count} universities to {args.output}")
+
 if __name__ == "__main__":
-    test_free_api()
+    main()
@@ -4,25 +4,123 @@ Enhanced script to add state/province information using Google Places API.
 This script will process universities that don't have state info and fetch it from Google.
 """
 
+import argparse
 import json
-import requests
+import threading
 import time
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 import os
-from datetime import datetime
+
+from dataset_shards import DEFAULT_SHARD_DIR, load_manifest, load_shards, resolve_countries, shard_output_path
+from delta_manifest import (
+    DeltaManifest, manifest_path_for, patch_path_for, plan_delta, unresolved_positions, write_patch
+)
+from enrichment_journal import EnrichmentJournal, journal_path_for
+from enrichment_metrics import Metrics, add_metrics_arguments, collecting_metrics, profiling
+from enrichment_scheduler import (
+    DEFAULT_MAX_ATTEMPTS, AdaptiveRate, DemandSignals, Throttled, TransientError, add_scheduler_arguments,
+    enrich_groups, load_demand, parse_retry_after
+)
+from gazetteer import DEFAULT_GAZETTEER_PATH, Gazetteer, apply_gazetteer
+from geocoding_cache import GeocodingCache, entry_results, results_entry
+from http_session import (
+    DEFAULT_POOL_SIZE, DEFAULT_RETRIES, REQUEST_TIMEOUT, RETRY_STATUSES, add_session_arguments, is_timeout,
+    is_transient, shared_session
+)
+from place_matcher import DEFAULT_MATCH_THRESHOLD, PlaceMatcher
+from query_planner import QueryGroup, QueryPlan, agreeing_members, plan_queries, single_queries
+from university_store import UniversityStore
+from university_stream import iter_universities, write_universities
+
+GOOGLE_PLACES_BASE_URL = "https://maps.googleapis.com/maps/api/place"
+GOOGLE_DAILY_QUOTA = 100000  # Google Places API daily limit
 
 class GooglePlacesAPI:
-    def __init__(self, api_key: str):
+    provider = "google_places"
+    
+    def __init__(
+        self,
+        api_key: str,
+        cache: Optional[GeocodingCache] = None,
+        base_url: str = GOOGLE_PLACES_BASE_URL,
+        metrics: Optional[Metrics] = None,
+        verbose: bool = False,
+        matcher: Optional[PlaceMatcher] = None,
+        quota: int = GOOGLE_DAILY_QUOTA,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        http_retries: int = DEFAULT_RETRIES
+    ):
         self.api_key = api_key
-        self.base_url = "https://maps.googleapis.com/maps/api/place"
+        self.base_url = base_url
         self.requests_made = 0
-        self.max_requests = 100000  # Google Places API daily limit
+        self.max_requests = quota  # requests this run may send
+        self.cache = cache
+        self.metrics = metrics
+        self.verbose = verbose  # one line per record instead of just the counters
+        self.matcher = matcher  # checks results against the university name
+        self._lock = threading.Lock()  # guards requests_made across worker threads
+        self.pool_size = pool_size  # keep-alive connections per host, shared with other clients
+        self.http_retries = http_retries  # retried by the scheduler, through the rate limit and quota
+        self._session = None
+    
+    @property
+    def session(self):
+        """The shared keep-alive session for this pool size, created on first use"""
+        if self._session is None:
+            self._session = shared_session(self.pool_size)
+        return self._session
         
-    def search_place(self, query: str) -> Optional[Dict]:
+    def lookup_cached(self, query: str, name: Optional[str] = None) -> Tuple[bool, Optional[Dict]]:
+        """Look the query up in the cache only; returns (found, place)"""
+        if not self.cache:
+            return False, None
+        start = time.perf_counter()
+        found, entry = self.cache.lookup(self.provider, query)
+        if found and self.metrics:
+            self.metrics.observe_request(self.provider, "cache", time.perf_counter() - start)
+        return found, self.pick_result(entry_results(entry), name) if found else None
+    
+    def store_results(self, query: str, results: List[Dict]):
+        """Cache the raw results of a query; an empty list is cached as a "no results" answer"""
+        if self.cache:
+            self.cache.store(self.provider, query, results_entry(results))
+    
+    def search_place(self, query: str, name: Optional[str] = None) -> Optional[Dict]:
         """Search for a place using Google Places API"""
-        if self.requests_made >= self.max_requests:
-            print("⚠️  API request limit reached!")
+        found, place = self.lookup_cached(query, name)
+        if found:
+            return place
+        
+        try:
+            results, cacheable = self.fetch_results(query)
+        except Throttled:
+            print("⚠️  API quota exceeded. Please try again later.")
             return None
+        except TransientError:
+            return None  # already reported; not cached, so the next run asks again
+        if cacheable:
+            # Results and "no results" answers are cached; errors are never cached
+            self.store_results(query, results)
+        return self.pick_result(results, name)
+    
+    def fetch_results(self, query: str) -> Tuple[Optional[List[Dict]], bool]:
+        """
+        Send one Text Search request, bypassing the cache.
+        
+        Safe to call from several threads. Returns (results, cacheable),
+        where results is every place the API returned, [] for no results,
+        and cacheable is False when the request failed rather than got an
+        answer. Raises Throttled on OVER_QUERY_LIMIT or HTTP 429, so the
+        scheduler can slow down and send the lookup again later, and
+        TransientError on a timeout, a lost connection or HTTP
+        500/502/504, which the scheduler retries. pick_result() chooses
+        the place for a university from the results.
+        """
+        with self._lock:
+            if self.requests_made >= self.max_requests:
+                print("⚠️  API request limit reached!")
+                return None, False
+            self.requests_made += 1
             
         search_url = f"{self.base_url}/textsearch/json"
         params = {
@@ -30,34 +128,63 @@ class GooglePlacesAPI:
             "key": self.api_key
         }
         
+        import requests  # on first use, so offline runs never load the HTTP stack
+
+        start = time.perf_counter()
+        status = "error"
         try:
-            response = requests.get(search_url, params=params, timeout=10)
-            self.requests_made += 1
+            response = self.session.get(search_url, params=params, timeout=REQUEST_TIMEOUT)
+            status = str(response.status_code)
             
             if response.status_code == 200:
                 data = response.json()
+                if self.metrics:
+                    self.metrics.count(f"{self.provider}.api_status.{data.get('status')}")
                 
                 if data.get("status") == "OK" and data.get("results"):
-                    return data["results"][0]  # Return first result
+                    return data["results"], True
+                elif data.get("status") == "ZERO_RESULTS":
+                    return [], True
                 elif data.get("status") == "OVER_QUERY_LIMIT":
-                    print("⚠️  API quota exceeded. Please try again later.")
-                    return None
+                    raise Throttled("OVER_QUERY_LIMIT", parse_retry_after(response.headers.get("Retry-After")))
                 elif data.get("status") == "REQUEST_DENIED":
                     print("❌ API request denied. Check your API key and billing.")
-                    return None
+                    return None, False
                 else:
                     print(f"⚠️  API returned status: {data.get('status')}")
-                    return None
+                    return None, False
+            elif response.status_code == 429:
+                raise Throttled("HTTP 429", parse_retry_after(response.headers.get("Retry-After")))
+            elif response.status_code in RETRY_STATUSES:
+                raise TransientError(f"HTTP {response.status_code}")
             else:
                 print(f"❌ HTTP error: {response.status_code}")
-                return None
+                return None, False
                 
-        except requests.exceptions.Timeout:
-            print("⏰ Request timeout")
-            return None
         except requests.exceptions.RequestException as e:
-            print(f"❌ Request error: {e}")
+            if is_timeout(e):
+                status = "timeout"
+                print("⏰ Request timeout")
+            else:
+                print(f"❌ Request error: {e}")
+            if is_transient(e):
+                raise TransientError(str(e)) from e
+            return None, False
+        finally:
+            if self.metrics:
+                self.metrics.observe_request(self.provider, status, time.perf_counter() - start)
+    
+    def pick_result(self, results: Optional[List[Dict]], name: Optional[str]) -> Optional[Dict]:
+        """The result that matches the university name, or the first result without a matcher"""
+        if not results:
             return None
+        if not (self.matcher and name):
+            return results[0]
+        place = self.matcher.choose(name, results)
+        if self.metrics:
+            outcome = "rejected" if place is None else "first" if place is results[0] else "reranked"
+            self.metrics.count(f"{self.provider}.match.{outcome}")
+        return place
     
     def extract_state_from_place(self, place: Dict) -> Optional[str]:
         """Extract state/province from Google Places result"""
@@ -104,121 +231,311 @@ def load_universities(file_path: str) -> List[Dict]:
         print(f"❌ Invalid JSON in file: {file_path}")
         return []
 
-def save_universities(universities: List[Dict], file_path: str):
-    """Save universities to JSON file"""
+def stream_universities(file_path: str) -> Iterator[Dict]:
+    """Yield universities from JSON file one at a time, without loading it all"""
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(universities, f, indent=2, ensure_ascii=False)
-        print(f"✅ Saved {len(universities)} universities to {file_path}")
+        yield from iter_universities(file_path)
+    except FileNotFoundError:
+        print(f"❌ File not found: {file_path}")
+    except (json.JSONDecodeError, ValueError):
+        print(f"❌ Invalid JSON in file: {file_path}")
+
+def save_universities(universities: Iterable[Dict], file_path: str) -> bool:
+    """Save universities to JSON file, writing records as they are produced"""
+    try:
+        count = write_universities(universities, file_path)
+        print(f"✅ Saved {count} universities to {file_path}")
+        return True
     except Exception as e:
         print(f"❌ Error saving file: {e}")
+        return False
+
+def record_place_result(
+    api: GooglePlacesAPI,
+    store: UniversityStore,
+    group: QueryGroup,
+    place: Optional[Dict],
+    stats: Dict[str, int],
+    journal: Optional[EnrichmentJournal] = None
+):
+    """Apply one search result to every university in its query group and update the stats"""
+    members = agreeing = group.members
+    outcome = "failed"
+    if place:
+        # Extract state from the place result
+        state = api.extract_state_from_place(place)
+        
+        if state:
+            agreeing = agreeing_members(members, state)
+            for university in agreeing:
+                store.update(university, {"state": state})
+                if journal:
+                    journal.append(university, {"state": state})
+            stats["states_added"] += len(agreeing)
+            # Members whose own state-province names another state keep theirs unresolved
+            stats["failed"] += len(members) - len(agreeing)
+            outcome = "states_added"
+            if api.verbose:
+                shared = f" (shared by {len(agreeing)} universities)" if len(agreeing) > 1 else ""
+                print(f"    ✅ Added state: {state}{shared}")
+        else:
+            if api.verbose:
+                print(f"    ⚠️  Could not extract state from place data")
+            stats["failed"] += len(members)
+            outcome = "no_state_in_place"
+    else:
+        if api.verbose:
+            print(f"    ❌ Could not find place data")
+        stats["failed"] += len(members)
+        outcome = "no_place"
+    
+    stats["total_processed"] += len(members)
+    if api.metrics:
+        api.metrics.count(f"records.{outcome}", len(agreeing))
+        if len(agreeing) < len(members):
+            api.metrics.count("records.conflicting_state", len(members) - len(agreeing))
+        api.metrics.count("records.processed", len(members))
+        api.metrics.count("lookups.processed")
+
+def plan_enhancement(
+    universities: List[Dict],
+    coalesce: bool = True,
+    candidates: Optional[List[Dict]] = None
+) -> QueryPlan:
+    """Plan the lookups for the universities (or just the candidates) that still need state info"""
+    universities_needing_state = [
+        uni for uni in (universities if candidates is None else candidates)
+        if not uni.get("state") and uni.get("country")
+    ]
+    if coalesce:
+        return plan_queries(universities_needing_state)
+    return single_queries(universities_needing_state)
+
+def new_enhancement_stats(universities: List[Dict], plan: QueryPlan) -> Dict[str, int]:
+    return {
+        "total_processed": 0,
+        "states_added": 0,
+        "failed": 0,
+        "already_had_state": len(universities) - plan.records,
+        "requests_saved": plan.requests_saved,
+        "deferred": 0
+    }
 
 def enhance_universities_with_google_api(
     universities: List[Dict], 
     api_key: str, 
     batch_size: int = 10, 
-    delay: float = 1.0
+    delay: float = 1.0,
+    cache: Optional[GeocodingCache] = None,
+    base_url: Optional[str] = None,
+    coalesce: bool = True,
+    journal: Optional[EnrichmentJournal] = None,
+    candidates: Optional[List[Dict]] = None,
+    metrics: Optional[Metrics] = None,
+    verbose: bool = False,
+    matcher: Optional[PlaceMatcher] = None,
+    demand: Optional[DemandSignals] = None,
+    quota: int = GOOGLE_DAILY_QUOTA,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    pool_size: Optional[int] = None,
+    http_retries: int = DEFAULT_RETRIES
 ) -> Dict[str, int]:
-    """Enhance universities with missing state info using Google Places API"""
+    """
+    Enhance universities with missing state info using Google Places API.
     
-    api = GooglePlacesAPI(api_key)
-    stats = {
-        "total_processed": 0,
-        "states_added": 0,
-        "failed": 0,
-        "already_had_state": 0
-    }
+    One request at a time, at the pace of the original batches: 0.1 s per
+    request plus `delay` after every `batch_size` requests.
+    """
+    rate = batch_size / (batch_size * 0.1 + delay)
+    return enhance_universities_concurrently(
+        universities, api_key, concurrency=1, rate=rate, cache=cache, base_url=base_url,
+        coalesce=coalesce, journal=journal, candidates=candidates, metrics=metrics, verbose=verbose,
+        matcher=matcher, demand=demand, quota=quota, max_attempts=max_attempts,
+        pool_size=pool_size, http_retries=http_retries
+    )
+
+def enhance_universities_concurrently(
+    universities: List[Dict],
+    api_key: str,
+    concurrency: int = 8,
+    rate: float = 10.0,
+    cache: Optional[GeocodingCache] = None,
+    base_url: Optional[str] = None,
+    coalesce: bool = True,
+    journal: Optional[EnrichmentJournal] = None,
+    candidates: Optional[List[Dict]] = None,
+    metrics: Optional[Metrics] = None,
+    verbose: bool = False,
+    matcher: Optional[PlaceMatcher] = None,
+    demand: Optional[DemandSignals] = None,
+    quota: int = GOOGLE_DAILY_QUOTA,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    pool_size: Optional[int] = None,
+    http_retries: int = DEFAULT_RETRIES
+) -> Dict[str, int]:
+    """
+    Enhance universities with missing state info, keeping up to `concurrency`
+    requests in flight at no more than `rate` requests per second.
     
-    # Filter universities that need state info
-    universities_needing_state = [
-        uni for uni in universities 
-        if not uni.get("state") and uni.get("country")
-    ]
+    Lookups for the schools in `demand` are sent first. The rate backs off
+    when Google throttles and recovers as requests succeed; lookups still
+    throttled after `max_attempts` tries, or not sent within `quota`, are
+    counted as deferred and left for the next run. Each group's state does
+    not depend on the order the answers arrive in. Requests reuse up to
+    `pool_size` keep-alive connections, one per request in flight by default.
+    """
+    
+    metrics = metrics or Metrics()
+    api = GooglePlacesAPI(api_key, cache=cache, base_url=base_url or GOOGLE_PLACES_BASE_URL,
+                          metrics=metrics, verbose=verbose, matcher=matcher, quota=quota,
+                          pool_size=concurrency if pool_size is None else pool_size, http_retries=http_retries)
+    store = UniversityStore(universities)
+    with metrics.timer("plan"):
+        plan = plan_enhancement(universities, coalesce, candidates)
+    stats = new_enhancement_stats(universities, plan)
+    groups = plan.groups
     
-    print(f"🎯 Found {len(universities_needing_state)} universities needing state info")
+    print(f"🎯 Found {plan.records} universities needing state info")
     print(f"📊 Total universities: {len(universities)}")
+    print(f"🧮 {plan.summary()}")
     
-    if not universities_needing_state:
+    if not groups:
         print("✅ All universities already have state information!")
         return stats
+    print(f"⚡ {concurrency} requests in flight, at most {rate:g} requests/second")
     
-    # Process in batches
-    for i in range(0, len(universities_needing_state), batch_size):
-        batch = universities_needing_state[i:i + batch_size]
-        batch_num = (i // batch_size) + 1
-        total_batches = (len(universities_needing_state) + batch_size - 1) // batch_size
-        
-        print(f"\n🔄 Processing batch {batch_num}/{total_batches}")
-        
-        for j, university in enumerate(batch):
-            university_name = university["name"]
-            country = university["country"]
-            
-            print(f"  {i + j + 1}/{len(universities_needing_state)}: {university_name}")
-            
-            # Search for the university
-            query = f"{university_name} {country}"
-            place = api.search_place(query)
-            
-            if place:
-                # Extract state from the place result
-                state = api.extract_state_from_place(place)
-                
-                if state:
-                    # Find the university in the original list and update it
-                    for orig_uni in universities:
-                        if (orig_uni["name"] == university_name and 
-                            orig_uni["country"] == country):
-                            orig_uni["state"] = state
-                            stats["states_added"] += 1
-                            print(f"    ✅ Added state: {state}")
-                            break
-                else:
-                    print(f"    ⚠️  Could not extract state from place data")
-                    stats["failed"] += 1
-            else:
-                print(f"    ❌ Could not find place data")
-                stats["failed"] += 1
-            
-            stats["total_processed"] += 1
-            
-            # Small delay between individual requests
-            time.sleep(0.1)
-        
-        # Delay between batches
-        if i + batch_size < len(universities_needing_state):
-            print(f"  ⏳ Waiting {delay} seconds before next batch...")
-            time.sleep(delay)
+    def record(group: QueryGroup, place: Optional[Dict]):
+        if verbose:
+            print(f"  {stats['total_processed'] + 1}/{plan.records}: {group.members[0]['name']}")
+        record_place_result(api, store, group, place, stats, journal)
     
-    # Count universities that already had state info
-    stats["already_had_state"] = len(universities) - len(universities_needing_state)
+    with metrics.timer("lookups"):
+        schedule = enrich_groups(
+            api, groups, record, AdaptiveRate(rate, capacity=concurrency), concurrency,
+            quota=api.max_requests - api.requests_made, max_attempts=max_attempts, demand=demand
+        )
+    stats["deferred"] = schedule.deferred_records
     
     return stats
 
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Add missing states using the Google Places API.")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="requests kept in flight (default: 1, the original serial loop)")
+    parser.add_argument("--rate", type=float, default=10.0,
+                        help="maximum requests per second when --concurrency > 1 (default: 10)")
+    parser.add_argument("--base-url", default=None,
+                        help="Places API base URL, e.g. a local fake_geocoding_server.py")
+    parser.add_argument("--no-coalesce", dest="coalesce", action="store_false",
+                        help="send one lookup per university instead of one per query/domain group")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="print how many lookups would be sent, then exit without calling the API")
+    parser.add_argument("--resume", action="store_true",
+                        help="replay the journal of an interrupted run and skip what it already resolved")
+    parser.add_argument("--delta", action="store_true",
+                        help="only look up records changed since the last --delta run and write a patch file")
+    parser.add_argument("--country", nargs="+", default=None,
+                        help="only load these countries (codes or names) from the per-country shards")
+    parser.add_argument("--shards", default=DEFAULT_SHARD_DIR,
+                        help="directory written by dataset_shards.py (default: %(default)s)")
+    parser.add_argument("--gazetteer", default=DEFAULT_GAZETTEER_PATH,
+                        help="compiled gazetteer tried before the API (default: %(default)s, "
+                             "or the built-in tables if it does not exist)")
+    parser.add_argument("--no-gazetteer", dest="gazetteer", action="store_const", const=None,
+                        help="send every lookup to the API")
+    parser.add_argument("--match-threshold", type=float, default=DEFAULT_MATCH_THRESHOLD,
+                        help="minimum name similarity for a result to be used (default: %(default)s)")
+    parser.add_argument("--no-match", dest="match", action="store_false",
+                        help="take the first result without checking its name")
+    add_scheduler_arguments(parser)
+    add_session_arguments(parser)
+    add_metrics_arguments(parser)
+    return parser.parse_args()
+
+def run_enhancement(
+    args: argparse.Namespace,
+    universities: List[Dict],
+    api_key: str,
+    cache: GeocodingCache,
+    journal: EnrichmentJournal,
+    candidates: Optional[List[Dict]] = None,
+    metrics: Optional[Metrics] = None
+) -> Dict[str, int]:
+    """Run the serial or concurrent enhancement loop selected on the command line"""
+    matcher = PlaceMatcher.from_universities(universities, args.match_threshold) if args.match else None
+    demand = load_demand(args.demand)
+    quota = args.quota if args.quota is not None else GOOGLE_DAILY_QUOTA
+    if args.concurrency > 1:
+        return enhance_universities_concurrently(
+            universities=universities,
+            api_key=api_key,
+            concurrency=args.concurrency,
+            rate=args.rate,
+            cache=cache,
+            base_url=args.base_url,
+            coalesce=args.coalesce,
+            journal=journal,
+            candidates=candidates,
+            metrics=metrics,
+            verbose=args.verbose,
+            matcher=matcher,
+            demand=demand,
+            quota=quota,
+            max_attempts=args.max_attempts,
+            pool_size=args.pool_size,
+            http_retries=args.http_retries
+        )
+    return enhance_universities_with_google_api(
+        universities=universities,
+        api_key=api_key,
+        batch_size=10,  # Process 10 at a time
+        delay=1.0,      # Wait 1 second between batches
+        cache=cache,    # Answers from earlier runs skip the API entirely
+        base_url=args.base_url,
+        coalesce=args.coalesce,
+        journal=journal,
+        candidates=candidates,
+        metrics=metrics,
+        verbose=args.verbose,
+        matcher=matcher,
+        demand=demand,  # schools users picked are looked up first
+        quota=quota,
+        max_attempts=args.max_attempts,
+        pool_size=args.pool_size,  # keep-alive connections reused across requests
+        http_retries=args.http_retries
+    )
+
 def main():
     """Main function to enhance universities with Google Places API"""
     
+    args = parse_args()
+    
     # Configuration
     input_file = "app/assets/world_universities_and_domains.json"
     output_file = "app/assets/world_universities_enhanced.json"
     
-    # Get API key from environment variable or user input
-    api_key = os.getenv("GOOGLE_PLACES_API_KEY")
-    if not api_key:
-        print("🔑 Google Places API Key not found in environment variables.")
-        print("Please set GOOGLE_PLACES_API_KEY environment variable or enter it below:")
-        api_key = input("Enter your Google Places API key: ").strip()
-        
-        if not api_key:
-            print("❌ No API key provided. Exiting.")
-            return
-    
     print("🚀 Starting university state enhancement with Google Places API")
     print("=" * 70)
     
-    # Load universities
-    print(f"📖 Loading universities from {input_file}...")
-    universities = load_universities(input_file)
+    # Load universities: only the requested countries' shards, or the whole file
+    if args.country:
+        try:
+            keys = resolve_countries(load_manifest(args.shards), args.country)
+            output_file = shard_output_path(output_file, keys)
+            print(f"📖 Loading shards {', '.join(keys)} from {args.shards}...")
+            universities = load_shards(args.shards, keys)
+        except FileNotFoundError:
+            print(f"❌ No shards found in {args.shards}. Run dataset_shards.py first.")
+            return
+        except KeyError as e:
+            print(f"❌ Incomplete shard manifest in {args.shards} (no {e}). Run dataset_shards.py again.")
+            return
+        except ValueError as e:
+            print(f"❌ {e}")
+            return
+    else:
+        print(f"📖 Loading universities from {input_file}...")
+        universities = load_universities(input_file)
     
     if not universities:
         print("❌ No universities loaded. Exiting.")
@@ -226,18 +543,63 @@ def main():
     
     print(f"✅ Loaded {len(universities)} universities")
     
+    # Restore the results of records that did not change since the last delta run
+    manifest = DeltaManifest(manifest_path_for(output_file), fingerprint=GooglePlacesAPI.provider)
+    changes = None
+    if args.delta and os.path.exists(output_file):
+        changes = plan_delta(manifest, universities)
+        if changes is None:
+            print(f"🧾 No usable manifest at {manifest.path}, doing a full run")
+        else:
+            print(f"🧾 Delta against {manifest.path}: {changes.summary()}")
+    candidates = changes.pending if changes is not None else None
+    
+    # Replay what an interrupted run already resolved
+    journal = EnrichmentJournal(journal_path_for(output_file))
+    replayed = 0
+    if args.resume:
+        replayed = journal.replay(UniversityStore(universities))
+        print(f"♻️  Resumed: {replayed} universities restored from {journal.path}")
+    
+    # Resolve what the offline gazetteer can before anything is sent to the API
+    offline = 0
+    if args.gazetteer is not None:
+        gazetteer = Gazetteer.load(args.gazetteer)
+        pending = candidates if candidates is not None else universities
+        offline = apply_gazetteer(pending, gazetteer, UniversityStore(universities))
+        print(f"🗺️  Resolved {offline} universities offline with the gazetteer")
+    
     # Check current state coverage
     universities_with_state = sum(1 for uni in universities if uni.get("state"))
     print(f"📊 Current state coverage: {universities_with_state}/{len(universities)} ({universities_with_state/len(universities)*100:.1f}%)")
     
+    if args.dry_run:
+        plan = plan_enhancement(universities, args.coalesce, candidates)
+        print(f"\n🧮 Dry run: {plan.summary()}")
+        return
+    
+    # Get API key from environment variable or user input
+    api_key = os.getenv("GOOGLE_PLACES_API_KEY")
+    if not api_key:
+        print("🔑 Google Places API Key not found in environment variables.")
+        print("Please set GOOGLE_PLACES_API_KEY environment variable or enter it below:")
+        api_key = input("Enter your Google Places API key: ").strip()
+        
+        if not api_key:
+            print("❌ No API key provided. Exiting.")
+            return
+    
     # Enhance universities
     print("\n🔍 Enhancing universities with missing state information...")
-    stats = enhance_universities_with_google_api(
-        universities=universities,
-        api_key=api_key,
-        batch_size=10,  # Process 10 at a time
-        delay=1.0       # Wait 1 second between batches
-    )
+    cache = GeocodingCache()
+    journal.start(resume=args.resume)
+    try:
+        with collecting_metrics(args) as metrics, profiling(args.profile, args.profile_mode):
+            stats = run_enhancement(args, universities, api_key, cache, journal, candidates, metrics)
+    finally:
+        # Whatever was resolved before a crash or Ctrl+C is on disk for --resume
+        journal.close()
+        cache.close()
     
     # Print results
     print("\n" + "=" * 70)
@@ -247,22 +609,31 @@ def main():
     print(f"Already had state: {stats['already_had_state']}")
     print(f"States added: {stats['states_added']}")
     print(f"Failed: {stats['failed']}")
+    print(f"Deferred to the next run: {stats['deferred']}")
     print(f"Total processed: {stats['total_processed']}")
+    print(f"Requests saved by coalescing: {stats['requests_saved']}")
+    print(f"Cache hit rate: {cache.hit_rate()*100:.1f}%")
+    if metrics.requests:
+        print(f"\n⏱️  Lookup latency by outcome:\n{metrics.summary()}")
     
     # Calculate new coverage
     new_coverage = stats['already_had_state'] + stats['states_added']
     print(f"\n📈 New state coverage: {new_coverage}/{len(universities)} ({new_coverage/len(universities)*100:.1f}%)")
     
-    # Save enhanced data
-    if stats['states_added'] > 0:
+    # Delta runs write only the changes; the manifest is updated once they are on disk
+    if changes is not None:
+        patch_file = patch_path_for(output_file)
+        change_count = write_patch(changes, patch_file)
+        manifest.save(universities, stale=unresolved_positions(universities, candidates))
+        journal.discard()
+        print(f"\n🧾 Wrote {change_count} changes to {patch_file} ({output_file} left unchanged)")
+    # Save enhanced data: fold the journal into the output with a single write
+    elif stats['states_added'] > 0 or replayed > 0 or offline > 0:
         print(f"\n💾 Saving enhanced universities to {output_file}...")
-        save_universities(universities, output_file)
-        
-        # Also save a backup with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_file = f"app/assets/world_universities_backup_{timestamp}.json"
-        save_universities(universities, backup_file)
-        print(f"💾 Backup saved to {backup_file}")
+        if save_universities(universities, output_file):
+            journal.discard()
+            if args.delta:
+                manifest.save(universities, stale=unresolved_positions(universities, candidates))
     else:
         print("\n💡 No new states added. Original file unchanged.")
     
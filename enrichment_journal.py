@@ -0,0 +1,84 @@
+"""
+Append-only checkpoint journal for long-running enrichment jobs.
+
+Every resolved university is appended as one JSON line, and the file is
+fsynced every few entries, so a crash or a quota stop loses at most the
+last unsynced batch. A rerun with --resume replays the journal onto the
+freshly loaded dataset and only looks up what is still missing. Once the
+run finishes, the journal is folded into the output file with a single
+write and deleted.
+"""
+
+import json
+import os
+from typing import Dict, Iterator
+
+from university_store import UniversityStore
+
+
+class EnrichmentJournal:
+    """JSON-lines journal of {"name", "country", **fields} entries."""
+
+    def __init__(self, path: str, fsync_every: int = 50):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.entries_written = 0
+        self._unsynced = 0
+        self._file = None
+
+    def entries(self) -> Iterator[Dict]:
+        """Entries already in the journal; a line cut short by a crash is skipped."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+    def replay(self, store: UniversityStore) -> int:
+        """Apply the journal to a freshly loaded dataset; returns how many records it updated."""
+        applied = 0
+        for entry in self.entries():
+            fields = {key: value for key, value in entry.items() if key not in ("name", "country")}
+            for university in store.find_all(entry.get("name"), entry.get("country")):
+                store.update(university, fields)
+                applied += 1
+        return applied
+
+    def start(self, resume: bool = False):
+        """Open the journal for appending; without resume any old journal is discarded."""
+        self._file = open(self.path, 'a' if resume else 'w', encoding='utf-8')
+
+    def append(self, university: Dict, fields: Dict):
+        """Record resolved fields for one university."""
+        entry = {"name": university.get("name"), "country": university.get("country"), **fields}
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.entries_written += 1
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        if self._file and self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def close(self):
+        if self._file:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def discard(self):
+        """Delete the journal once it has been folded into the output file."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def journal_path_for(output_file: str) -> str:
+    return f"{output_file}.journal"
+
@@ -0,0 +1,258 @@
+"""
+Counters, stage timers and request latency histograms for enrichment runs.
+
+The enhancers count what happens to each record and time each
+search_place call per provider and outcome: HTTP status, "cache",
+"timeout" or "error". A run can write periodic JSON snapshots of these
+numbers, one per line, so that a long run can be followed with tail -f or
+graphed afterwards without any per-record terminal output. The profiling
+hook wraps the hot loop in cProfile, or in a low-overhead stack sampler
+that writes collapsed stacks for flame graph tools.
+"""
+
+import argparse
+import bisect
+import cProfile
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+# Upper bounds of the latency buckets, in milliseconds; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+DEFAULT_SNAPSHOT_INTERVAL = 10.0
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram; percentiles are reported as bucket upper bounds."""
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, seconds: float):
+        ms = seconds * 1000
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, fraction: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                if index < len(LATENCY_BUCKETS_MS):
+                    return round(min(float(LATENCY_BUCKETS_MS[index]), self.max_ms), 3)
+                break
+        return round(self.max_ms, 3)
+
+    def snapshot(self) -> Dict:
+        bounds = [str(bound) for bound in LATENCY_BUCKETS_MS] + ["inf"]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": self.percentile(0.50),
+            "p90_ms": self.percentile(0.90),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": {bound: count for bound, count in zip(bounds, self.buckets) if count},
+        }
+
+
+class Metrics:
+    """Thread-safe counters, stage timers and per-provider request histograms for one run."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.counters: Counter = Counter()
+        self.timers: Dict[str, Dict[str, float]] = {}
+        self.requests: Dict[str, Dict[str, LatencyHistogram]] = {}
+        self._lock = threading.Lock()
+
+    def count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def observe_request(self, provider: str, status: str, seconds: float):
+        """Record one search_place call; status is the HTTP status, "cache", "timeout" or "error"."""
+        with self._lock:
+            by_status = self.requests.setdefault(provider, {})
+            by_status.setdefault(str(status), LatencyHistogram()).observe(seconds)
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                timer = self.timers.setdefault(stage, {"count": 0, "seconds": 0.0})
+                timer["count"] += 1
+                timer["seconds"] += elapsed
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "time": round(time.time(), 3),
+                "elapsed": round(time.time() - self.started, 3),
+                "counters": dict(sorted(self.counters.items())),
+                "timers": {
+                    stage: {"count": timer["count"], "seconds": round(timer["seconds"], 6)}
+                    for stage, timer in sorted(self.timers.items())
+                },
+                "requests": {
+                    provider: {status: histogram.snapshot() for status, histogram in sorted(by_status.items())}
+                    for provider, by_status in sorted(self.requests.items())
+                },
+            }
+
+    def summary(self) -> str:
+        """One line per provider and status, for the end of a run."""
+        lines = []
+        for provider, by_status in sorted(self.requests.items()):
+            for status, histogram in sorted(by_status.items()):
+                lines.append(f"{provider} {status}: {histogram.count} calls, "
+                             f"p50 {histogram.percentile(0.5):g} ms, p90 {histogram.percentile(0.9):g} ms, "
+                             f"max {histogram.max_ms:.0f} ms")
+        return "\n".join(lines)
+
+
+class SnapshotWriter:
+    """Appends a JSON snapshot of the metrics to a file every `interval` seconds, and once at the end."""
+
+    def __init__(self, metrics: Metrics, path: str, interval: float = DEFAULT_SNAPSHOT_INTERVAL):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-snapshots", daemon=True)
+
+    def _write(self, final: bool = False):
+        snapshot = self.metrics.snapshot()
+        if final:
+            snapshot["final"] = True
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(snapshot, ensure_ascii=False) + "\n")
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self._write()
+
+    def start(self) -> "SnapshotWriter":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self._write(final=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+class StackSampler:
+    """Samples every thread's stack at a fixed interval and counts the collapsed stacks."""
+
+    def __init__(self, interval: float = DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if thread_id not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def write(self, path: str):
+        """Collapsed stacks ("frame;frame;frame count"), as read by flamegraph.pl and speedscope."""
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+@contextmanager
+def profiling(path: Optional[str], mode: str = "cprofile") -> Iterator[None]:
+    """Profile the enclosed block into path with cProfile or the stack sampler; no-op without a path."""
+    if not path:
+        yield
+        return
+    if mode == "sample":
+        sampler = StackSampler()
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            sampler.write(path)
+            print(f"🔬 Wrote {sum(sampler.samples.values())} stack samples to {path}")
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(f"🔬 Wrote cProfile stats to {path} (python -m pstats {path})")
+
+
+def add_metrics_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--verbose", action="store_true",
+                        help="print a line for every record looked up")
+    parser.add_argument("--metrics", default=None, metavar="PATH",
+                        help="append JSON metrics snapshots (counters, timers, latency histograms) to PATH")
+    parser.add_argument("--metrics-interval", type=float, default=DEFAULT_SNAPSHOT_INTERVAL,
+                        help="seconds between metrics snapshots (default: %(default)s)")
+    parser.add_argument("--profile", default=None, metavar="PATH",
+                        help="profile the lookup loop and write the result to PATH")
+    parser.add_argument("--profile-mode", choices=("cprofile", "sample"), default="cprofile",
+                        help="cProfile stats, or collapsed stacks from a sampling profiler (default: %(default)s)")
+
+
+@contextmanager
+def collecting_metrics(args: argparse.Namespace) -> Iterator[Metrics]:
+    """Metrics for one run, written to --metrics periodically and when the block exits."""
+    metrics = Metrics()
+    writer = SnapshotWriter(metrics, args.metrics, args.metrics_interval).start() if args.metrics else None
+    try:
+        yield metrics
+    finally:
+        if writer:
+            writer.stop()
+            print(f"📈 Metrics written to {args.metrics}")
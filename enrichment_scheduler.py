@@ -0,0 +1,425 @@
+"""
+Quota-aware scheduling of remote geocoding lookups.
+
+Lookups are taken from a priority queue: the query groups whose schools
+users actually pick (the demand signals exported from the server's
+education records) go first, the rest keep their plan order. So when
+the daily quota runs out, it has been spent on the records that matter.
+
+The request rate adapts AIMD-style: every answered request raises it a
+little, up to the configured maximum, and every throttled one (HTTP 429,
+Google's OVER_QUERY_LIMIT) halves it. A Retry-After from the provider
+pauses all sending for that long. Throttled lookups are requeued with a
+backoff instead of being counted as failed; one throttled too often, or
+still queued when the quota is spent, is left for the next run
+("deferred"), not cached as a miss.
+
+Timeouts, connection errors and HTTP 500/502/504 (TransientError) are
+retried here as well, after http_session.retry_backoff(). So every retry
+waits for the rate limiter and counts against the quota. A lookup that
+still fails after its retries is recorded as failed.
+"""
+
+import argparse
+import heapq
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from enrichment_metrics import Metrics
+from http_session import DEFAULT_RETRIES, retry_backoff
+from query_planner import QueryGroup
+from rate_limiter import TokenBucket
+
+DEFAULT_DEMAND_PATH = "school_demand.json"
+DEMAND_VERSION = 1
+
+DEFAULT_MAX_ATTEMPTS = 5
+
+# Backoff for a throttled lookup when the provider did not send Retry-After
+BASE_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+
+
+class Throttled(Exception):
+    """The provider asked for fewer requests; retry_after is in seconds when it said how long."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TransientError(Exception):
+    """The request failed in a way that sending it again may fix: a timeout, a lost connection or a 5xx."""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header, given as seconds or as an HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _school_key(name: str) -> str:
+    return " ".join(name.casefold().split())
+
+
+class DemandSignals:
+    """How often each school was picked in the app, by name (and country) and by domain."""
+
+    def __init__(self, schools: Iterable[Dict]):
+        self._by_name: Dict[Tuple[str, str], int] = {}
+        self._by_domain: Dict[str, int] = {}
+        for school in schools:
+            selections = int(school.get("selections") or 0)
+            if not selections:
+                continue
+            if school.get("name"):
+                key = (_school_key(school["name"]), (school.get("country") or "").casefold())
+                self._by_name[key] = self._by_name.get(key, 0) + selections
+            for domain in school.get("domains") or ():
+                domain = domain.strip().lower()
+                self._by_domain[domain] = self._by_domain.get(domain, 0) + selections
+
+    def __len__(self) -> int:
+        return len(self._by_name) + len(self._by_domain)
+
+    def score(self, university: Dict) -> int:
+        """Selections of one university; a school without a country matches any country."""
+        name = _school_key(university.get("name") or "")
+        score = self._by_name.get((name, (university.get("country") or "").casefold()), 0)
+        score += self._by_name.get((name, ""), 0)
+        if not score:
+            score = max((self._by_domain.get(domain.strip().lower(), 0)
+                         for domain in university.get("domains") or ()), default=0)
+        return score
+
+    def priority(self, group: QueryGroup) -> int:
+        return sum(self.score(member) for member in group.members)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_DEMAND_PATH) -> Optional["DemandSignals"]:
+        """The demand file written by server/export-school-demand.js, or None if there is none."""
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("version") != DEMAND_VERSION:
+            raise ValueError(f"Unsupported demand format in {path}")
+        return cls(data.get("schools") or ())
+
+
+class AdaptiveRate:
+    """AIMD control of a TokenBucket's rate, plus a global pause for Retry-After."""
+
+    def __init__(
+        self,
+        rate: float,
+        max_rate: Optional[float] = None,
+        min_rate: Optional[float] = None,
+        increase: Optional[float] = None,
+        decrease: float = 0.5,
+        capacity: float = 1.0
+    ):
+        self.max_rate = max_rate if max_rate is not None else rate
+        self.min_rate = min_rate if min_rate is not None else min(rate, self.max_rate) / 50
+        # A few dozen answered requests win back what one throttle took
+        self.increase = increase if increase is not None else self.max_rate / 50
+        self.decrease = decrease
+        self.bucket = TokenBucket(min(rate, self.max_rate), capacity=capacity)
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        return self.bucket.rate
+
+    def acquire(self):
+        """Wait out any pause, then for a token at the current rate."""
+        while True:
+            with self._lock:
+                wait_for = self.paused_until - time.monotonic()
+            if wait_for <= 0:
+                break
+            time.sleep(wait_for)
+        self.bucket.acquire()
+
+    def on_success(self):
+        with self._lock:
+            self.bucket.set_rate(min(self.max_rate, self.bucket.rate + self.increase))
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        with self._lock:
+            self.bucket.set_rate(max(self.min_rate, self.bucket.rate * self.decrease))
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+
+class _Entry:
+    __slots__ = ("priority", "sequence", "group", "attempts", "failures", "ready_at")
+
+    def __init__(self, priority: int, sequence: int, group: QueryGroup):
+        self.priority = priority
+        self.sequence = sequence
+        self.group = group
+        self.attempts = 0
+        self.failures = 0
+        self.ready_at = 0.0
+
+    def __lt__(self, other: "_Entry") -> bool:
+        # Highest demand first, then plan order
+        return (-self.priority, self.sequence) < (-other.priority, other.sequence)
+
+
+class EnrichmentQueue:
+    """Priority queue of query groups; requeued groups wait until their backoff has passed."""
+
+    def __init__(self):
+        self._ready: List[_Entry] = []
+        self._waiting: List[Tuple[float, int, _Entry]] = []
+        self._sequence = 0
+
+    def push(self, group: QueryGroup, priority: int = 0):
+        heapq.heappush(self._ready, _Entry(priority, self._sequence, group))
+        self._sequence += 1
+
+    def requeue(self, entry: _Entry, delay: float):
+        entry.ready_at = time.monotonic() + delay
+        heapq.heappush(self._waiting, (entry.ready_at, entry.sequence, entry))
+
+    def pop(self) -> Optional[_Entry]:
+        """The most important group that is ready to be sent, if any."""
+        now = time.monotonic()
+        while self._waiting and self._waiting[0][0] <= now:
+            heapq.heappush(self._ready, heapq.heappop(self._waiting)[2])
+        return heapq.heappop(self._ready) if self._ready else None
+
+    def next_ready_in(self) -> Optional[float]:
+        """Seconds until a requeued group becomes ready (0 if one is), None when empty."""
+        if self._ready:
+            return 0.0
+        if self._waiting:
+            return max(0.0, self._waiting[0][0] - time.monotonic())
+        return None
+
+    def drain(self) -> List[QueryGroup]:
+        groups = [entry.group for entry in sorted(self._ready)]
+        groups += [entry.group for _, _, entry in sorted(self._waiting)]
+        self._ready, self._waiting = [], []
+        return groups
+
+    def __len__(self) -> int:
+        return len(self._ready) + len(self._waiting)
+
+
+class SchedulerStats:
+    def __init__(self):
+        self.sent = 0
+        self.answered = 0
+        self.throttled = 0
+        self.requeued = 0
+        self.retried = 0
+        self.deferred: List[QueryGroup] = []
+        self.quota_exhausted = False
+
+    @property
+    def deferred_records(self) -> int:
+        return sum(len(group.members) for group in self.deferred)
+
+    def summary(self) -> str:
+        text = (f"{self.sent} requests sent, {self.throttled} throttled and requeued {self.requeued} times, "
+                f"{self.retried} retried after an error, "
+                f"{len(self.deferred)} lookups ({self.deferred_records} universities) deferred to the next run")
+        return text + (" (quota spent)" if self.quota_exhausted else "")
+
+
+class EnrichmentScheduler:
+    """
+    Sends the lookups of a plan in priority order at an adaptive rate.
+
+    fetch(group) returns (answer, cacheable) or raises Throttled or
+    TransientError; it runs on up to `concurrency` worker threads.
+    on_result(group, answer, cacheable) runs on the calling thread, so it
+    may use the cache. A lookup failing with TransientError is sent up to
+    `retries` more times and then recorded as (None, False).
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[QueryGroup], Tuple[Any, bool]],
+        rate: AdaptiveRate,
+        concurrency: int = 1,
+        quota: Optional[int] = None,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        metrics: Optional[Metrics] = None,
+        provider: str = "",
+        retries: int = DEFAULT_RETRIES
+    ):
+        self.fetch = fetch
+        self.rate = rate
+        self.concurrency = max(1, concurrency)
+        self.quota = quota
+        self.max_attempts = max_attempts
+        self.metrics = metrics
+        self.provider = provider
+        self.retries = retries
+
+    def _send(self, group: QueryGroup) -> Tuple[Any, bool]:
+        self.rate.acquire()
+        return self.fetch(group)
+
+    def _count(self, name: str, amount: int = 1):
+        if self.metrics:
+            self.metrics.count(f"{self.provider}.scheduler.{name}", amount)
+
+    def run(
+        self,
+        groups: List[QueryGroup],
+        on_result: Callable[[QueryGroup, Any, bool], None],
+        demand: Optional[DemandSignals] = None
+    ) -> SchedulerStats:
+        stats = SchedulerStats()
+        queue = EnrichmentQueue()
+        for group in groups:
+            queue.push(group, demand.priority(group) if demand else 0)
+
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while queue or in_flight:
+                while len(in_flight) < self.concurrency:
+                    if self.quota is not None and stats.sent >= self.quota:
+                        stats.quota_exhausted = True
+                        break
+                    entry = queue.pop()
+                    if entry is None:
+                        break
+                    stats.sent += 1
+                    in_flight[executor.submit(self._send, entry.group)] = entry
+
+                if not in_flight:
+                    if stats.quota_exhausted:
+                        stats.deferred.extend(queue.drain())
+                        break
+                    time.sleep(queue.next_ready_in() or 0.0)
+                    continue
+
+                # Wake up for a requeued group only while one could still be sent
+                can_submit = len(in_flight) < self.concurrency and not stats.quota_exhausted
+                timeout = queue.next_ready_in() if can_submit else None
+                done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    entry = in_flight.pop(future)
+                    try:
+                        answer, cacheable = future.result()
+                    except Throttled as throttled:
+                        stats.throttled += 1
+                        self._count("throttled")
+                        self.rate.on_throttle(throttled.retry_after)
+                        entry.attempts += 1
+                        if entry.attempts >= self.max_attempts:
+                            stats.deferred.append(entry.group)
+                            continue
+                        backoff = min(MAX_BACKOFF, BASE_BACKOFF * 2 ** (entry.attempts - 1))
+                        queue.requeue(entry, max(backoff, throttled.retry_after or 0.0))
+                        stats.requeued += 1
+                        continue
+                    except TransientError:
+                        entry.failures += 1
+                        if entry.failures <= self.retries:
+                            stats.retried += 1
+                            self._count("retried")
+                            queue.requeue(entry, retry_backoff(entry.failures))
+                            continue
+                        on_result(entry.group, None, False)
+                        continue
+                    stats.answered += 1
+                    self.rate.on_success()
+                    on_result(entry.group, answer, cacheable)
+
+        self._count("sent", stats.sent)
+        self._count("deferred", stats.deferred_records)
+        if self.metrics:
+            self.metrics.count(f"{self.provider}.scheduler.final_rate_millis", int(self.rate.rate * 1000))
+        return stats
+
+
+def enrich_groups(
+    api,
+    groups: List[QueryGroup],
+    record: Callable[[QueryGroup, Optional[Dict]], None],
+    rate: AdaptiveRate,
+    concurrency: int = 1,
+    quota: Optional[int] = None,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    demand: Optional[DemandSignals] = None
+) -> SchedulerStats:
+    """
+    Answer the groups from the api's cache, then schedule the rest.
+    Failed requests are retried api.http_retries times.
+
+    api is a GooglePlacesAPI or FreeGeocodingAPI. Cache lookups and stores
+    stay on this thread (SQLite connections are per-thread); record(group,
+    place) is called for every answered group, cached ones first, with
+    the result picked for the group's first university. The raw results
+    are cached, so the pick is made again on every read. Deferred groups
+    are neither recorded nor cached.
+    """
+    pending = []
+    cached = 0
+    for group in groups:
+        found, place = api.lookup_cached(group.query, group.members[0]["name"])
+        if found:
+            cached += 1
+            record(group, place)
+        else:
+            pending.append(group)
+    print(f"📦 {cached} answered from cache, {len(pending)} to fetch")
+    if demand is not None:
+        wanted = sum(1 for group in pending if demand.priority(group))
+        print(f"📈 {wanted} lookups for schools users picked go first")
+
+    def fetch(group: QueryGroup) -> Tuple[Optional[List[Dict]], bool]:
+        return api.fetch_results(group.query)
+
+    def on_result(group: QueryGroup, results: Optional[List[Dict]], cacheable: bool):
+        if cacheable:
+            # Results and "no results" answers are cached unpicked; errors are never cached
+            api.store_results(group.query, results)
+        record(group, api.pick_result(results, group.members[0]["name"]))
+
+    scheduler = EnrichmentScheduler(fetch, rate, concurrency, quota, max_attempts, api.metrics, api.provider,
+                                    api.http_retries)
+    stats = scheduler.run(pending, on_result, demand)
+    if stats.throttled or stats.retried or stats.deferred:
+        print(f"🚦 {stats.summary()}")
+    return stats
+
+
+def add_scheduler_arguments(parser: argparse.ArgumentParser):
+    """--demand, --quota and --max-attempts, shared by the enhancer scripts."""
+    parser.add_argument("--demand", default=DEFAULT_DEMAND_PATH,
+                        help="school selections exported by server/export-school-demand.js; their "
+                             "lookups are sent first (default: %(default)s, ignored if missing)")
+    parser.add_argument("--quota", type=int, default=None,
+                        help="most API requests this run may send; the rest is left for the next run")
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS,
+                        help="throttled requests per lookup before it is left for the next run "
+                             "(default: %(default)s)")
+
+
+def load_demand(path: Optional[str]) -> Optional[DemandSignals]:
+    """The demand signals at path, announced on the console, or None."""
+    demand = DemandSignals.load(path) if path else None
+    if demand is not None:
+        print(f"📈 Loaded demand signals for {len(demand)} schools from {path}")
+    return demand
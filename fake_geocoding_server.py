@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Google Places and Nominatim HTTP APIs.
+
+Answers are derived deterministically from the query text, with a
+configurable latency, so the enhancer scripts can be exercised and timed
+without an API key, quota or network access. Point a client at it with
+base_url=server.google_base_url / server.nominatim_base_url.
+
+With throttle_rate set, requests beyond that many per second are refused
+the way the real APIs refuse them: Google answers OVER_QUERY_LIMIT,
+Nominatim answers HTTP 429 with a Retry-After header.
+
+handshake_latency is added once to every new connection, standing in for
+the TCP and TLS handshakes of the real HTTPS endpoints. With error_every
+set, every n-th request gets a transient HTTP 502. Answers are
+gzip-compressed when the client accepts it.
+"""
+
+import gzip
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+from add_states_to_universities import US_STATES
+from rate_limiter import TokenBucket
+
+# (name, abbreviation) pairs a fake answer can land in
+FAKE_STATES = sorted(US_STATES.items())
+
+
+def fake_state_for_query(query: str) -> Optional[tuple]:
+    """Deterministic (state name, abbreviation) for a query; None means no results."""
+    digest = zlib.crc32(" ".join(query.casefold().split()).encode("utf-8"))
+    if digest % 10 == 0:
+        return None
+    return FAKE_STATES[digest % len(FAKE_STATES)]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+    # Headers and body go out in separate writes; without this, Nagle's
+    # algorithm and delayed ACKs stall every reused connection by ~40 ms
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        if self.server.handshake_latency:
+            time.sleep(self.server.handshake_latency)
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        number = server.record_request()
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        if server.error_every and number % server.error_every == 0:
+            server.record_error()
+            self.send_response(502)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        throttled = server.limiter is not None and not server.limiter.try_acquire()
+        if throttled:
+            server.record_throttle()
+
+        if url.path.endswith("/textsearch/json"):
+            body = {"status": "OVER_QUERY_LIMIT", "results": []} if throttled else \
+                self._google_textsearch(params.get("query", ""))
+        elif throttled:
+            self.send_response(429)
+            self.send_header("Retry-After", str(server.retry_after))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        elif url.path.endswith("/search"):
+            body = self._nominatim_search(params.get("q", ""))
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            payload = gzip.compress(payload)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _google_textsearch(self, query: str) -> Dict:
+        state = fake_state_for_query(query)
+        if state is None:
+            return {"status": "ZERO_RESULTS", "results": []}
+        name, code = state
+        return {
+            "status": "OK",
+            "results": [{
+                "name": query,
+                "formatted_address": f"1 Campus Drive, Springfield, {code} 00000, USA",
+                "address_components": [
+                    {"long_name": name, "short_name": code,
+                     "types": ["administrative_area_level_1", "political"]},
+                    {"long_name": "United States", "short_name": "US",
+                     "types": ["country", "political"]}
+                ]
+            }]
+        }
+
+    def _nominatim_search(self, query: str) -> list:
+        state = fake_state_for_query(query)
+        if state is None:
+            return []
+        name, _ = state
+        return [{"display_name": f"{query}, {name}", "address": {"state": name}}]
+
+
+class FakeGeocodingServer(ThreadingHTTPServer):
+    """Threaded local HTTP server; counts requests, throttled and failed requests and TCP connections."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        port: int = 0,
+        throttle_rate: Optional[float] = None,
+        retry_after: int = 1,
+        handshake_latency: float = 0.0,
+        error_every: Optional[int] = None
+    ):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency
+        self.limiter = TokenBucket(throttle_rate) if throttle_rate else None
+        self.retry_after = retry_after
+        self.handshake_latency = handshake_latency
+        self.error_every = error_every
+        self.requests_served = 0
+        self.requests_throttled = 0
+        self.requests_failed = 0
+        self.connections_accepted = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def record_request(self) -> int:
+        with self._lock:
+            self.requests_served += 1
+            return self.requests_served
+
+    def record_throttle(self):
+        with self._lock:
+            self.requests_throttled += 1
+
+    def record_error(self):
+        with self._lock:
+            self.requests_failed += 1
+
+    def get_request(self):
+        conn = super().get_request()
+        with self._lock:
+            self.connections_accepted += 1
+        return conn
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def google_base_url(self) -> str:
+        return f"{self.base_url}/maps/api/place"
+
+    @property
+    def nominatim_base_url(self) -> str:
+        return self.base_url
+
+    def start(self) -> "FakeGeocodingServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+if __name__ == "__main__":
+    server = FakeGeocodingServer(latency=0.05, port=8765).start()
+    print(f"🧪 Fake geocoding server on {server.base_url} (Ctrl+C to stop)")
+    print(f"   Google Places base URL: {server.google_base_url}")
+    print(f"   Nominatim base URL:     {server.nominatim_base_url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
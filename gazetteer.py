@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Offline gazetteer: place names -> state/province, with no network calls.
+
+Place names are kept per country (alpha_two_code) in a hash of normalized
+word phrases, so resolving a university is a few dozen dict lookups over
+the word n-grams of its name and of its web page / domain hostnames.
+Matches are on whole words ("Bath" does not match "Bathurst"), and a
+phrase inside a longer matched one does not count ("West Virginia" does
+not also match "Virginia"). When a name mentions several places the one
+with the best priority wins: admin-1 names first, then cities, larger
+cities before smaller ones, and names shared by places in different
+states after all of those.
+
+Without a compiled gazetteer the engine is seeded from the state and city
+tables in add_states_to_universities.py, which cover five countries. To
+cover every country, download cities15000.txt (or cities5000.txt) and
+admin1CodesASCII.txt from https://download.geonames.org/export/dump/ and
+compile them once:
+
+    python gazetteer.py --cities cities15000.txt --admin1 admin1CodesASCII.txt
+
+States come back in the same form as elsewhere: the abbreviation for the
+countries with a state table ("CA", "ON", "NSW"), otherwise the admin-1
+name, like FreeGeocodingAPI's generic fallback.
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from add_states_to_universities import (
+    AUSTRALIAN_CITY_STATES,
+    AUSTRALIAN_STATES,
+    CANADIAN_CITY_PROVINCES,
+    CANADIAN_PROVINCES,
+    GERMAN_STATES,
+    INDIA_STATES,
+    US_CITY_STATES,
+    US_STATES,
+)
+from university_store import UniversityStore
+
+DEFAULT_GAZETTEER_PATH = "gazetteer.json"
+GAZETTEER_VERSION = 1
+
+# Admin-1 tables whose abbreviations are returned instead of the admin-1 name
+STATE_TABLES = {
+    "US": US_STATES,
+    "CA": CANADIAN_PROVINCES,
+    "AU": AUSTRALIAN_STATES,
+    "DE": GERMAN_STATES,
+    "IN": INDIA_STATES,
+}
+
+SEED_CITY_TABLES = {
+    "US": US_CITY_STATES,
+    "CA": CANADIAN_CITY_PROVINCES,
+    "AU": AUSTRALIAN_CITY_STATES,
+}
+
+# Shorter city names ("Ede", "Oss") match ordinary words too often
+MIN_CITY_NAME_LENGTH = 4
+
+# Longest place name considered, in words
+MAX_PHRASE_WORDS = 5
+
+# Letters only, so "univ-paris1" gives "univ", "paris"
+_WORD = re.compile(r"[^\W\d_]+")
+
+# Spellings normalized to one form, so "Saint Louis" matches "St. Louis"
+_ABBREVIATIONS = {"saint": "st"}
+
+# Hostname labels that never name a place
+_HOST_NOISE = {"www", "http", "https", "edu", "ac", "com", "org", "net", "gov", "uni", "univ"}
+
+
+def phrase_words(text: str) -> List[str]:
+    return [_ABBREVIATIONS.get(word, word) for word in _WORD.findall(text.casefold())]
+
+
+def normalize_phrase(text: str) -> str:
+    return " ".join(phrase_words(text))
+
+
+def host_words(url_or_domain: str) -> List[str]:
+    """Words of a hostname, e.g. "http://www.uni-hamburg.de/" -> ["hamburg", "de"]."""
+    host = urlparse(url_or_domain).hostname if "//" in url_or_domain else url_or_domain
+    return [word for word in phrase_words(host or "") if word not in _HOST_NOISE]
+
+
+class Gazetteer:
+    """Per-country {phrase: (priority, state)} hashes."""
+
+    def __init__(self, countries: Dict[str, List[Tuple[str, str]]]):
+        """countries maps alpha_two_code to (place name, state) pairs, best first."""
+        self._places: Dict[str, Dict[str, Tuple[int, str]]] = {}
+        for code, entries in countries.items():
+            places: Dict[str, Tuple[int, str]] = {}
+            ambiguous = set()
+            for name, state in entries:
+                phrase = normalize_phrase(name)
+                if not phrase or len(phrase.split(" ")) > MAX_PHRASE_WORDS:
+                    continue
+                if phrase not in places:
+                    places[phrase] = (len(places), state)
+                elif places[phrase][1] != state:
+                    ambiguous.add(phrase)
+            # A phrase naming places in different states ("Washington" is a state
+            # and a city in DC) ranks after every unambiguous one
+            for phrase in ambiguous:
+                priority, state = places[phrase]
+                places[phrase] = (len(places) + priority, state)
+            self._places[code.upper()] = places
+
+    def __contains__(self, alpha_two_code: str) -> bool:
+        return alpha_two_code in self._places
+
+    @property
+    def countries(self) -> List[str]:
+        return sorted(self._places)
+
+    def _best(self, places: Dict[str, Tuple[int, str]], words: List[str]) -> Optional[Tuple[int, str]]:
+        matches = []
+        for start in range(len(words)):
+            for end in range(start + 1, min(start + MAX_PHRASE_WORDS, len(words)) + 1):
+                found = places.get(" ".join(words[start:end]))
+                if found:
+                    matches.append((start, end, found))
+
+        # A phrase inside a longer matched one is not a place of its own:
+        # "West Virginia" is not "Virginia", "Kansas City" is not "Kansas"
+        taken = bytearray(len(words))
+        best = None
+        for start, end, found in sorted(matches, key=lambda match: (match[0] - match[1], match[2][0])):
+            if not any(taken[start:end]):
+                taken[start:end] = b"\x01" * (end - start)
+                if best is None or found[0] < best[0]:
+                    best = found
+        return best
+
+    def resolve_text(self, text: str, alpha_two_code: str) -> Optional[str]:
+        places = self._places.get(alpha_two_code)
+        if not places:
+            return None
+        best = self._best(places, phrase_words(text))
+        return best[1] if best else None
+
+    def resolve(self, university: Dict) -> Optional[str]:
+        """State for a university from its name, else from its web page and domain hostnames."""
+        places = self._places.get(university.get("alpha_two_code") or "")
+        if not places:
+            return None
+        best = self._best(places, phrase_words(university.get("name") or ""))
+        if best:
+            return best[1]
+        for host in list(university.get("web_pages") or ()) + list(university.get("domains") or ()):
+            best = self._best(places, host_words(host))
+            if best:
+                return best[1]
+        return None
+
+    @classmethod
+    def seed(cls) -> "Gazetteer":
+        """Gazetteer built from the hand-written state and city tables."""
+        countries = {}
+        for code, states in STATE_TABLES.items():
+            entries = [(name, abbreviation) for name, abbreviation in states.items()]
+            entries += list(SEED_CITY_TABLES.get(code, {}).items())
+            countries[code] = entries
+        return cls(countries)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_GAZETTEER_PATH) -> "Gazetteer":
+        """The compiled gazetteer at path, or the seed tables if it does not exist."""
+        if not os.path.exists(path):
+            return cls.seed()
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("version") != GAZETTEER_VERSION:
+            raise ValueError(f"Unsupported gazetteer format in {path}")
+        return cls({
+            code: [(name, country["states"][index]) for name, index in country["places"]]
+            for code, country in data["countries"].items()
+        })
+
+
+def _state_for_admin1(code: str, admin1_name: str) -> str:
+    table = STATE_TABLES.get(code)
+    return table.get(admin1_name, admin1_name) if table else admin1_name
+
+
+def compile_geonames(cities_file: str, admin1_file: str, countries: Optional[Iterable[str]] = None) -> Dict:
+    """
+    Compile GeoNames dumps into the gazetteer artifact.
+
+    Per country the places are: the state table names, admin-1 names, the
+    seed cities, then the GeoNames cities by descending population. Each
+    place name points into a per-country table of states, which keeps the
+    file compact.
+    """
+    wanted = {code.upper() for code in countries} if countries else None
+
+    admin1: Dict[Tuple[str, str], Tuple[str, str]] = {}
+    with open(admin1_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 3 or "." not in fields[0]:
+                continue
+            code, admin1_code = fields[0].split(".", 1)
+            admin1[(code, admin1_code)] = (fields[1], fields[2])
+
+    cities: Dict[str, List[Tuple[int, str, str, str]]] = {}
+    with open(cities_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 15:
+                continue
+            code, admin1_code = fields[8], fields[10]
+            if (wanted and code not in wanted) or (code, admin1_code) not in admin1:
+                continue
+            population = int(fields[14] or 0)
+            cities.setdefault(code, []).append((population, fields[1], fields[2], admin1_code))
+
+    # The state tables come first, so a compiled gazetteer covers at least the seed
+    entries: Dict[str, List[Tuple[str, str]]] = {
+        code: list(states.items()) for code, states in STATE_TABLES.items() if not wanted or code in wanted
+    }
+    for (code, admin1_code), (name, ascii_name) in sorted(admin1.items()):
+        if wanted and code not in wanted:
+            continue
+        state = _state_for_admin1(code, name)
+        entries.setdefault(code, []).extend([(name, state), (ascii_name, state)])
+    for code, seed_cities in SEED_CITY_TABLES.items():
+        if not wanted or code in wanted:
+            entries.setdefault(code, []).extend(seed_cities.items())
+    for code, country_cities in cities.items():
+        for population, name, ascii_name, admin1_code in sorted(country_cities, key=lambda city: -city[0]):
+            state = _state_for_admin1(code, admin1[(code, admin1_code)][0])
+            for city_name in (name, ascii_name):
+                if len(normalize_phrase(city_name)) >= MIN_CITY_NAME_LENGTH:
+                    entries.setdefault(code, []).append((city_name, state))
+
+    compiled = {}
+    for code, places in sorted(entries.items()):
+        states: Dict[str, int] = {}
+        seen = set()
+        compact = []
+        for name, state in places:
+            phrase = normalize_phrase(name)
+            # A phrase is kept once per state, so Gazetteer sees which ones are ambiguous
+            if not phrase or (phrase, state) in seen:
+                continue
+            seen.add((phrase, state))
+            compact.append([phrase, states.setdefault(state, len(states))])
+        compiled[code] = {"states": list(states), "places": compact}
+    return {"version": GAZETTEER_VERSION, "countries": compiled}
+
+
+def apply_gazetteer(universities: List[Dict], gazetteer: Gazetteer, store: UniversityStore) -> int:
+    """Set the state of universities the gazetteer can resolve; returns how many it set."""
+    resolved = 0
+    for university in universities:
+        if university.get("state") or not university.get("country"):
+            continue
+        state = gazetteer.resolve(university)
+        if state:
+            store.update(university, {"state": state})
+            resolved += 1
+    return resolved
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Compile or try out the offline gazetteer.")
+    parser.add_argument("--cities", help="GeoNames cities file (e.g. cities15000.txt)")
+    parser.add_argument("--admin1", help="GeoNames admin1CodesASCII.txt")
+    parser.add_argument("--countries", nargs="+", default=None,
+                        help="only compile these alpha_two_codes (default: all)")
+    parser.add_argument("--output", default=DEFAULT_GAZETTEER_PATH,
+                        help="where to write (or read) the compiled gazetteer")
+    parser.add_argument("--input", default="app/assets/world_universities_and_domains.json",
+                        help="universities JSON file to report coverage on")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if args.cities or args.admin1:
+        if not (args.cities and args.admin1):
+            print("❌ --cities and --admin1 must be given together")
+            return
+        compiled = compile_geonames(args.cities, args.admin1, args.countries)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(compiled, f, ensure_ascii=False, separators=(",", ":"))
+        places = sum(len(country["places"]) for country in compiled["countries"].values())
+        print(f"✅ Compiled {places} places in {len(compiled['countries'])} countries into {args.output}")
+
+    gazetteer = Gazetteer.load(args.output)
+    source = args.output if os.path.exists(args.output) else "the built-in seed tables"
+    with open(args.input, 'r', encoding='utf-8') as f:
+        universities = json.load(f)
+
+    start = time.perf_counter()
+    resolved = sum(1 for university in universities if gazetteer.resolve(university))
+    seconds = time.perf_counter() - start
+    print(f"🗺️  Gazetteer from {source}: {len(gazetteer.countries)} countries")
+    print(f"   Resolved {resolved}/{len(universities)} universities offline "
+          f"({seconds / len(universities) * 1e6:.1f} µs per university)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Persistent on-disk cache for geocoding lookups.
+
+Shared by FreeGeocodingAPI (Nominatim) and GooglePlacesAPI so that a query
+answered once is never sent to a remote API again until it expires. Entries
+are keyed by provider and normalized query and stored in SQLite. "No results"
+answers are cached too (negative caching) with their own, shorter TTL, while
+errors such as timeouts or quota problems are never cached.
+"""
+
+import json
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_CACHE_PATH = "geocoding_cache.sqlite3"
+
+DAY = 24 * 60 * 60
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query so trivially different spellings share a cache entry."""
+    return " ".join(query.casefold().split())
+
+
+def results_entry(results: Optional[List[Dict]]) -> Optional[Dict]:
+    """
+    The cache entry for a provider's raw results, or None for "no results".
+
+    The clients cache every result and check them against the university
+    name when they read the entry, so a changed matcher or threshold
+    applies to answers cached before it.
+    """
+    return {"results": results} if results else None
+
+
+def entry_results(entry: Optional[Dict]) -> List[Dict]:
+    """The results of a cache entry; older entries hold the one place that was picked."""
+    if entry is None:
+        return []
+    return entry["results"] if "results" in entry else [entry]
+
+
+class GeocodingCache:
+    """SQLite-backed geocoding cache with TTLs, negative caching and LRU eviction."""
+
+    def __init__(
+        self,
+        db_path: str = DEFAULT_CACHE_PATH,
+        ttl: float = 90 * DAY,
+        negative_ttl: float = 14 * DAY,
+        max_entries: int = 200000
+    ):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.stats = {
+            "hits": 0,
+            "negative_hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "stores": 0,
+            "evictions": 0
+        }
+
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS geocode_cache (
+                provider TEXT NOT NULL,
+                query TEXT NOT NULL,
+                result TEXT,
+                expires_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (provider, query)
+            )
+            """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_geocode_cache_last_used ON geocode_cache (last_used)"
+        )
+        self.conn.commit()
+        self._size = self.conn.execute("SELECT COUNT(*) FROM geocode_cache").fetchone()[0]
+
+    def lookup(self, provider: str, query: str) -> Tuple[bool, Optional[Dict]]:
+        """
+        Look up a query.
+
+        Returns (found, result). found is False on a miss; on a hit, result is
+        the cached place, or None for a cached "no results" answer.
+        """
+        key = normalize_query(query)
+        row = self.conn.execute(
+            "SELECT result, expires_at FROM geocode_cache WHERE provider = ? AND query = ?",
+            (provider, key)
+        ).fetchone()
+
+        now = time.time()
+        if row is None:
+            self.stats["misses"] += 1
+            return False, None
+        if row[1] <= now:
+            self.conn.execute(
+                "DELETE FROM geocode_cache WHERE provider = ? AND query = ?", (provider, key)
+            )
+            self._size -= 1
+            self.stats["expired"] += 1
+            self.stats["misses"] += 1
+            return False, None
+
+        self.conn.execute(
+            "UPDATE geocode_cache SET last_used = ? WHERE provider = ? AND query = ?",
+            (now, provider, key)
+        )
+        if row[0] is None:
+            self.stats["negative_hits"] += 1
+            return True, None
+        self.stats["hits"] += 1
+        return True, json.loads(row[0])
+
+    def store(self, provider: str, query: str, result: Optional[Dict]):
+        """Cache a place for a query; pass None to cache a "no results" answer."""
+        now = time.time()
+        ttl = self.ttl if result is not None else self.negative_ttl
+        payload = json.dumps(result, ensure_ascii=False) if result is not None else None
+
+        key = normalize_query(query)
+        exists = self.conn.execute(
+            "SELECT 1 FROM geocode_cache WHERE provider = ? AND query = ?", (provider, key)
+        ).fetchone()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO geocode_cache (provider, query, result, expires_at, last_used) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (provider, key, payload, now + ttl, now)
+        )
+        if not exists:
+            self._size += 1
+        self.stats["stores"] += 1
+
+        if self._size > self.max_entries:
+            self._evict()
+        self.conn.commit()
+
+    def _evict(self):
+        """Drop expired entries, then the least recently used ones, down to 90% of max_entries."""
+        now = time.time()
+        removed = self.conn.execute(
+            "DELETE FROM geocode_cache WHERE expires_at <= ?", (now,)
+        ).rowcount
+        size = self.conn.execute("SELECT COUNT(*) FROM geocode_cache").fetchone()[0]
+
+        target = int(self.max_entries * 0.9)
+        if size > target:
+            removed += self.conn.execute(
+                "DELETE FROM geocode_cache WHERE rowid IN "
+                "(SELECT rowid FROM geocode_cache ORDER BY last_used LIMIT ?)",
+                (size - target,)
+            ).rowcount
+            size = target
+
+        self._size = size
+        self.stats["evictions"] += removed
+
+    def hit_rate(self) -> float:
+        """Fraction of lookups answered from the cache."""
+        hits = self.stats["hits"] + self.stats["negative_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    def close(self):
+        """Flush pending last-used updates and close the database."""
+        self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,103 @@
+"""
+Pooled keep-alive HTTP sessions for the geocoding clients.
+
+A bare requests.get() opens a new connection for every lookup, and the
+TCP and TLS handshakes then cost about as much as the API call itself.
+The clients instead share one requests.Session per pool size, which
+keeps up to that many connections per host open and reuses them. A run
+then does at most pool-size handshakes per provider instead of one per
+request. The pool blocks instead of opening extra connections, so the
+pool size should be at least the number of requests in flight.
+
+The session itself never retries. A retry hidden inside it would skip
+the rate limiter and the request quota, and could break Nominatim's one
+request per second. The clients instead raise TransientError on HTTP
+500, 502 and 504, connection errors and timeouts, and the scheduler
+sends the lookup again after retry_backoff(): an exponential backoff plus
+a random jitter, so parallel workers do not retry in lockstep. Each
+retry takes a rate token and counts against the quota. Responses are
+requested gzip-compressed and decoded by requests.
+
+A pool size of 0 sends "Connection: close", so every request opens its
+own connection. That is how the clients behaved before sessions were
+pooled, and it is kept for comparison in benchmarks.
+
+requests is imported when the first session is created, so the scripts
+can import this module without loading the HTTP stack on offline runs.
+"""
+
+import argparse
+import random
+import threading
+from typing import TYPE_CHECKING, Dict
+
+if TYPE_CHECKING:
+    import requests
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_RETRIES = 2  # further attempts of a lookup that failed with a TransientError
+REQUEST_TIMEOUT = 10  # seconds, per attempt
+
+# Backoff before retry n is RETRY_BACKOFF * 2 ** (n - 1) seconds, plus up to RETRY_JITTER
+RETRY_BACKOFF = 0.5
+RETRY_JITTER = 0.5
+RETRY_STATUSES = (500, 502, 504)
+
+_sessions: Dict[int, "requests.Session"] = {}
+_sessions_lock = threading.Lock()
+
+
+def retry_backoff(retry: int) -> float:
+    """Seconds to wait before retry number `retry` (from 1) of a transient failure."""
+    return RETRY_BACKOFF * 2 ** (retry - 1) + random.uniform(0, RETRY_JITTER)
+
+
+def pooled_session(pool_size: int = DEFAULT_POOL_SIZE) -> "requests.Session":
+    """A new session keeping up to pool_size connections per host alive (none with 0)."""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    # pool_connections is the number of hosts kept pooled, pool_maxsize the connections per host;
+    # without keep-alive nothing is reused, so nothing needs to wait for a free connection
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(pool_size, 1), pool_block=pool_size > 0,
+                          max_retries=0)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["Accept-Encoding"] = "gzip, deflate"
+    if pool_size == 0:
+        session.headers["Connection"] = "close"
+    return session
+
+
+def shared_session(pool_size: int = DEFAULT_POOL_SIZE) -> "requests.Session":
+    """The process-wide session for this pool size, created on first use."""
+    with _sessions_lock:
+        session = _sessions.get(pool_size)
+        if session is None:
+            session = _sessions[pool_size] = pooled_session(pool_size)
+        return session
+
+
+def is_timeout(error: Exception) -> bool:
+    """Whether the request timed out, connecting or reading."""
+    import requests
+
+    return isinstance(error, requests.exceptions.Timeout)
+
+
+def is_transient(error: Exception) -> bool:
+    """Whether sending the request again may succeed: a timeout or a failed connection."""
+    import requests
+
+    return isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError))
+
+
+def add_session_arguments(parser: argparse.ArgumentParser):
+    """--pool-size and --http-retries, shared by the enhancer scripts."""
+    parser.add_argument("--pool-size", type=int, default=None,
+                        help="keep-alive connections per host (default: one per request in flight; "
+                             "0 opens a new connection for every request)")
+    parser.add_argument("--http-retries", type=int, default=DEFAULT_RETRIES,
+                        help="retries of a lookup that timed out or got HTTP 500/502/504; each one waits for "
+                             "the rate limit and counts against the quota (default: %(default)s)")
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Prebuilt substring-search index for the app's school pickers.
+
+The pickers filter the universities list with
+name.toLowerCase().includes(query.toLowerCase()) on every keystroke. This
+script builds trigram postings for the lowercased names (and countries)
+once, so a query of three or more characters looks up the postings of its
+trigrams and checks only the records listed under the rarest one, instead
+of scanning every record.
+
+Postings are record positions in the dataset file, delta-encoded and
+written as comma-separated base-36 numbers to keep the artifact small.
+NameSearchIndex gives the same results, in the same (dataset) order, as
+linear_search; run with --verify to compare the two.
+
+The index also carries a checksum of the lowercased values it was built
+from, which the app recomputes from its own copy of the list at startup.
+If the list was edited without rebuilding the index, the checksums differ
+and the app falls back to scanning rather than miss matches.
+"""
+
+import argparse
+import hashlib
+import json
+import struct
+import sys
+from typing import Dict, Iterable, List, Optional
+
+GRAM = 3
+INDEX_VERSION = 2
+INDEXED_FIELDS = ("name", "country")
+
+_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+# 32-bit FNV-1a, which the app can compute with Math.imul
+_FNV_OFFSET = 0x811C9DC5
+_FNV_PRIME = 0x01000193
+
+
+def _to_base36(number: int) -> str:
+    digits = ""
+    while True:
+        number, digit = divmod(number, 36)
+        digits = _DIGITS[digit] + digits
+        if not number:
+            return digits
+
+
+def encode_postings(positions: List[int]) -> str:
+    """Sorted positions -> "first,gap,gap,..." in base 36."""
+    previous = 0
+    encoded = []
+    for position in positions:
+        encoded.append(_to_base36(position - previous))
+        previous = position
+    return ",".join(encoded)
+
+
+def decode_postings(encoded: str) -> List[int]:
+    positions = []
+    position = 0
+    for gap in encoded.split(","):
+        position += int(gap, 36)
+        positions.append(position)
+    return positions
+
+
+def trigrams(text: str) -> Iterable[str]:
+    return {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+
+def field_values(universities: List[Dict], field: str) -> List[str]:
+    """Lowercased field values, the same strings the app compares against."""
+    return [(university.get(field) or "").lower() for university in universities]
+
+
+def source_hash(universities: List[Dict]) -> str:
+    """Fingerprint of the indexed fields, to detect an index built from another file."""
+    digest = hashlib.blake2b(digest_size=8)
+    for field in INDEXED_FIELDS:
+        for value in field_values(universities, field):
+            digest.update(value.encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+
+def app_checksum(universities: List[Dict]) -> int:
+    """
+    FNV-1a over the UTF-16 code units of the lowercased indexed fields,
+    each value followed by a 0 unit; the same loop as in nameSearchIndex.ts.
+    """
+    checksum = _FNV_OFFSET
+    for field in INDEXED_FIELDS:
+        for value in field_values(universities, field):
+            data = value.encode("utf-16-le")
+            for unit in struct.unpack(f"<{len(data) // 2}H", data) + (0,):
+                checksum = ((checksum ^ unit) * _FNV_PRIME) & 0xFFFFFFFF
+    return checksum
+
+
+def build_index(universities: List[Dict]) -> Dict:
+    """Build the index artifact for a universities list."""
+    fields = {}
+    for field in INDEXED_FIELDS:
+        postings: Dict[str, List[int]] = {}
+        for position, value in enumerate(field_values(universities, field)):
+            for gram in trigrams(value):
+                postings.setdefault(gram, []).append(position)
+        fields[field] = {gram: encode_postings(positions) for gram, positions in sorted(postings.items())}
+    return {
+        "version": INDEX_VERSION,
+        "gram": GRAM,
+        "records": len(universities),
+        "source_hash": source_hash(universities),
+        "checksum": app_checksum(universities),
+        "fields": fields,
+    }
+
+
+def linear_search(universities: List[Dict], query: str, field: str = "name") -> List[int]:
+    """Reference implementation: the scan the app does today."""
+    query = query.lower()
+    return [
+        position for position, university in enumerate(universities)
+        if query in (university.get(field) or "").lower()
+    ]
+
+
+class NameSearchIndex:
+    """Substring search over the universities list, backed by a prebuilt index."""
+
+    def __init__(self, index: Dict, universities: List[Dict]):
+        if index.get("version") != INDEX_VERSION or index.get("gram") != GRAM:
+            raise ValueError("Unsupported name search index format")
+        if index.get("records") != len(universities) or index.get("source_hash") != source_hash(universities):
+            raise ValueError("Name search index was built from a different universities file")
+        self._encoded = index["fields"]
+        self._decoded: Dict[str, Dict[str, List[int]]] = {field: {} for field in self._encoded}
+        self._values = {field: field_values(universities, field) for field in self._encoded}
+
+    @classmethod
+    def load(cls, index_file: str, universities: List[Dict]) -> "NameSearchIndex":
+        with open(index_file, 'r', encoding='utf-8') as f:
+            return cls(json.load(f), universities)
+
+    def _postings(self, field: str, gram: str) -> Optional[List[int]]:
+        decoded = self._decoded[field]
+        if gram not in decoded:
+            encoded = self._encoded[field].get(gram)
+            decoded[gram] = decode_postings(encoded) if encoded is not None else None
+        return decoded[gram]
+
+    def search(self, query: str, field: str = "name", limit: Optional[int] = None) -> List[int]:
+        """Positions of records whose field contains query (case-insensitive), in dataset order."""
+        query = query.lower()
+        values = self._values[field]
+
+        if len(query) < GRAM:
+            # Too short for a trigram; the values are already lowercased, so this is a plain scan
+            matches = [position for position, value in enumerate(values) if query in value]
+            return matches[:limit] if limit is not None else matches
+
+        # Every match contains every trigram of the query, so the rarest
+        # trigram's postings are a complete candidate list
+        candidates = None
+        for gram in trigrams(query):
+            postings = self._postings(field, gram)
+            if postings is None:
+                return []
+            if candidates is None or len(postings) < len(candidates):
+                candidates = postings
+
+        matches = []
+        for position in candidates:
+            # Containing the trigram does not make the query a substring, so check each candidate
+            if query in values[position]:
+                matches.append(position)
+                if limit is not None and len(matches) >= limit:
+                    break
+        return matches
+
+
+def verify_index(index: NameSearchIndex, universities: List[Dict]) -> bool:
+    """Compare the index with linear_search for every prefix of a sample of names and countries."""
+    queries = set()
+    for university in universities[::25]:
+        for field in INDEXED_FIELDS:
+            value = university.get(field) or ""
+            queries.update(value[:length] for length in range(1, min(len(value), 12) + 1))
+            queries.update(value[start:start + 5] for start in range(0, len(value), 7))
+
+    mismatches = 0
+    for query in sorted(queries):
+        for field in INDEXED_FIELDS:
+            if index.search(query, field) != linear_search(universities, query, field):
+                mismatches += 1
+                print(f"❌ Mismatch for {field} query {query!r}")
+    print(f"{'✅' if not mismatches else '❌'} Checked {len(queries)} queries on "
+          f"{len(INDEXED_FIELDS)} fields: {mismatches} mismatches")
+    return not mismatches
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build the name search index for the school pickers.")
+    parser.add_argument("--input", default="app/assets/world_universities_and_domains.json",
+                        help="universities JSON file to index")
+    parser.add_argument("--output", default="app/assets/university_name_index.json",
+                        help="where to write the index")
+    parser.add_argument("--verify", action="store_true",
+                        help="check the index against a linear scan and exit non-zero on mismatch")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    print(f"Reading universities from {args.input}...")
+    with open(args.input, 'r', encoding='utf-8') as f:
+        universities = json.load(f)
+
+    index = build_index(universities)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+    grams = sum(len(postings) for postings in index["fields"].values())
+    print(f"Indexed {len(universities)} universities ({grams} trigrams) into {args.output}")
+
+    if args.verify:
+        sys.exit(0 if verify_index(NameSearchIndex(index, universities), universities) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Bulk load of the universities dataset into the server's Postgres.
+
+    python postgres_loader.py
+    python postgres_loader.py --input app/assets/world_universities_and_domains.ucol
+    python postgres_loader.py --input app/assets/universities_by_country --country US CA --prune
+
+The input is any of the scripts' outputs: a JSON list, the columnar file
+or a shard directory. Records stream from it into a temporary staging
+table through a single COPY. One INSERT ... ON CONFLICT statement then
+upserts the staging table into `universities`. The table is keyed like
+the delta runs on (name, country, occurrence). Rows whose values did not
+change are not rewritten, so a reload of an unchanged file writes
+nothing. With --prune, rows missing from the input are deleted, limited
+to the loaded countries when --country is given.
+Everything runs in one transaction, so a reload lands completely or not
+at all.
+
+The table and its indexes on domains and (country, state) are defined in
+server/migrations/create_universities_table.sql, which every run applies.
+The connection uses the server's settings (DB_HOST, DB_PORT, DB_USERNAME,
+DB_PASSWORD, DB_DATABASE) from the environment or server/.env, or --dsn.
+Needs psycopg 3: pip install "psycopg[binary]".
+"""
+
+import argparse
+import os
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import psycopg
+    from psycopg.types.json import Jsonb
+except ImportError:  # only needed to talk to the database
+    psycopg = None
+
+DEFAULT_INPUT = "app/assets/world_universities_with_states.json"
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "server", "migrations", "create_universities_table.sql")
+SERVER_ENV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server", ".env")
+
+# Record fields with a column of their own; anything else goes into `extra`
+COLUMN_FIELDS = {
+    "name": "name",
+    "country": "country",
+    "alpha_two_code": "alpha_two_code",
+    "state": "state",
+    "state-province": "state_province",
+    "domains": "domains",
+    "web_pages": "web_pages",
+}
+
+STAGING_COLUMNS = ("name", "country", "occurrence", "alpha_two_code", "state", "state_province",
+                   "domains", "web_pages", "extra")
+STAGING_TYPES = ("text", "text", "int4", "text", "text", "text", "text[]", "text[]", "jsonb")
+
+# Columns an upsert may change; the key columns never do
+VALUE_COLUMNS = STAGING_COLUMNS[3:]
+
+# The join finds new and changed rows in one hash join; ON CONFLICT is
+# left with those only instead of probing the key index for every row
+UPSERT_SQL = f"""
+WITH upserted AS (
+    INSERT INTO universities AS u ({", ".join(STAGING_COLUMNS)})
+    SELECT {", ".join(f"s.{column}" for column in STAGING_COLUMNS)}
+    FROM universities_staging AS s
+    LEFT JOIN universities AS current USING (name, country, occurrence)
+    WHERE current.name IS NULL
+        OR ({", ".join(f"s.{column}" for column in VALUE_COLUMNS)})
+            IS DISTINCT FROM ({", ".join(f"current.{column}" for column in VALUE_COLUMNS)})
+    ON CONFLICT (name, country, occurrence) DO UPDATE
+    SET {", ".join(f"{column} = EXCLUDED.{column}" for column in VALUE_COLUMNS)},
+        updated_at = CURRENT_TIMESTAMP
+    RETURNING xmax = 0 AS inserted
+)
+SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted) FROM upserted
+"""
+
+PRUNE_SQL = """
+DELETE FROM universities AS u
+WHERE NOT EXISTS (
+    SELECT 1 FROM universities_staging AS s
+    WHERE s.name = u.name AND s.country = u.country AND s.occurrence = u.occurrence
+)
+"""
+
+
+def iter_input(path: str, countries: Optional[List[str]] = None) -> Iterator[Dict]:
+    """Records of a JSON list, a columnar file or a shard directory (only `countries` if given)."""
+    if os.path.isdir(path):
+        from dataset_shards import load_manifest, load_shards, resolve_countries
+
+        manifest = load_manifest(path)
+        keys = resolve_countries(manifest, countries) if countries else sorted(manifest["shards"])
+        yield from load_shards(path, keys)
+    elif path.endswith(".ucol"):
+        from university_columnar import ColumnarUniversities
+
+        with ColumnarUniversities(path) as universities:
+            yield from universities
+    else:
+        from university_stream import iter_universities
+
+        yield from iter_universities(path)
+
+
+def staging_rows(universities: Iterable[Dict], counts: Dict[str, int]) -> Iterator[Tuple]:
+    """One staging row per record, numbering records that share a name and country."""
+    seen: Dict[Tuple[str, str], int] = {}
+    for university in universities:
+        name_country = (university.get("name"), university.get("country"))
+        if None in name_country:
+            counts["skipped"] += 1
+            continue
+        occurrence = seen.get(name_country, 0)
+        seen[name_country] = occurrence + 1
+        extra = {key: value for key, value in university.items() if key not in COLUMN_FIELDS}
+        counts["copied"] += 1
+        yield (
+            name_country[0], name_country[1], occurrence,
+            university.get("alpha_two_code"), university.get("state"), university.get("state-province"),
+            university.get("domains") or [], university.get("web_pages") or [],
+            Jsonb(extra) if extra else None,
+        )
+
+
+def apply_schema(conn):
+    with open(SCHEMA_FILE, 'r', encoding='utf-8') as f:
+        conn.execute(f.read())
+
+
+def load_universities(
+    conn,
+    universities: Iterable[Dict],
+    prune: bool = False,
+    countries_only: bool = False
+) -> Dict[str, int]:
+    """
+    COPY the records into staging and upsert them into universities in one transaction.
+
+    Returns counts of copied, skipped (no name or country), inserted,
+    updated and deleted rows; rows whose values are unchanged are not
+    counted as updated. With countries_only, pruning keeps rows of
+    countries that are not in the input.
+    """
+    counts = {"copied": 0, "skipped": 0, "inserted": 0, "updated": 0, "deleted": 0}
+    with conn.transaction():
+        apply_schema(conn)
+        conn.execute("CREATE TEMP TABLE universities_staging "
+                      "(LIKE universities INCLUDING DEFAULTS) ON COMMIT DROP")
+        with conn.cursor() as cur:
+            with cur.copy(f"COPY universities_staging ({', '.join(STAGING_COLUMNS)}) FROM STDIN") as copy:
+                copy.set_types(STAGING_TYPES)
+                for row in staging_rows(universities, counts):
+                    copy.write_row(row)
+            cur.execute("ANALYZE universities_staging")
+
+            cur.execute(UPSERT_SQL)
+            counts["inserted"], counts["updated"] = cur.fetchone()
+
+            if prune:
+                scope = " AND u.country IN (SELECT country FROM universities_staging)" if countries_only else ""
+                cur.execute(PRUNE_SQL + scope)
+                counts["deleted"] = cur.rowcount
+
+            # Fresh statistics, so the next reload's join is planned for the new size
+            if counts["inserted"] or counts["updated"] or counts["deleted"]:
+                cur.execute("ANALYZE universities")
+    return counts
+
+
+def server_settings(env_file: str = SERVER_ENV_FILE) -> Dict[str, str]:
+    """The server's DB_* settings: the environment first, then server/.env."""
+    settings = {}
+    if os.path.exists(env_file):
+        with open(env_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                key, separator, value = line.strip().partition("=")
+                if separator and not key.startswith("#"):
+                    settings[key.strip()] = value.strip().strip("'\"")
+    settings.update({key: value for key, value in os.environ.items() if key.startswith("DB_")})
+    return settings
+
+
+def connect(dsn: Optional[str] = None):
+    """A connection from --dsn, DATABASE_URL or the server's DB_* settings."""
+    dsn = dsn or os.getenv("DATABASE_URL")
+    if dsn:
+        return psycopg.connect(dsn)
+    settings = server_settings()
+    return psycopg.connect(
+        host=settings.get("DB_HOST"),
+        port=settings.get("DB_PORT", "5432"),
+        user=settings.get("DB_USERNAME"),
+        password=settings.get("DB_PASSWORD"),
+        dbname=settings.get("DB_DATABASE"),
+    )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load the universities dataset into the server's Postgres.")
+    parser.add_argument("--input", default=DEFAULT_INPUT,
+                        help="JSON file, .ucol columnar file or shard directory (default: %(default)s)")
+    parser.add_argument("--country", nargs="+", default=None,
+                        help="with a shard directory, only load these countries (codes or names)")
+    parser.add_argument("--prune", action="store_true",
+                        help="delete rows that are not in the input (within the loaded countries with --country)")
+    parser.add_argument("--dsn", default=None,
+                        help="connection string (default: DATABASE_URL, or the server's DB_* settings)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if psycopg is None:
+        print('❌ psycopg is not installed. Run: pip install "psycopg[binary]"')
+        return
+
+    print(f"📖 Loading universities from {args.input}...")
+    start = time.perf_counter()
+    try:
+        with connect(args.dsn) as conn:
+            counts = load_universities(conn, iter_input(args.input, args.country), args.prune,
+                                       countries_only=bool(args.country))
+    except psycopg.OperationalError as e:
+        print(f"❌ Could not connect to the database: {e}")
+        return
+    except (FileNotFoundError, ValueError) as e:
+        print(f"❌ {e}")
+        return
+    seconds = time.perf_counter() - start
+
+    print(f"🐘 Copied {counts['copied']} universities into staging"
+          + (f" ({counts['skipped']} without a name or country skipped)" if counts["skipped"] else ""))
+    print(f"✅ {counts['inserted']} inserted, {counts['updated']} updated, "
+          f"{counts['copied'] - counts['inserted'] - counts['updated']} unchanged"
+          + (f", {counts['deleted']} deleted" if args.prune else "")
+          + f" in {seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Planning stage for remote geocoding lookups.
+
+Records that would send the same query, or that share a registrable domain
+within one country (e.g. sub-campuses under one .edu), are grouped so that
+one lookup answers the whole group. The plan is built before any request is
+made, which also makes it cheap to report how many calls a run will cost.
+
+Grouping by domain is kept conservative, because one wrong answer is
+copied to every member:
+
+- Records are first grouped by query. A query group joins a domain group
+  only when all its members share that one domain, so groups never chain
+  from one domain to another through same-named schools.
+- Domains of national or state-wide networks (NETWORK_SUFFIXES, e.g.
+  ernet.in or mass.edu) are treated as public suffixes.
+- A domain group is not formed when its members name different states,
+  or when it would exceed MAX_DOMAIN_GROUP records.
+
+A result is still only applied to the members whose own state-province
+does not name another state; see agreeing_members().
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from add_states_to_universities import COUNTRY_STATE_TABLES, extract_state_from_name
+from geocoding_cache import normalize_query
+
+# Second-level labels that sit under a two-letter country TLD, as in
+# ox.ac.uk, wtu.edu.cn or eit.edu.au, where the registrable part is three labels
+SECOND_LEVEL_LABELS = {
+    "ac", "co", "com", "edu", "gob", "gov", "go", "mil", "ne", "net", "nic", "or", "org", "res", "sch"
+}
+
+# Shared domains of academic networks and college systems whose members are
+# separate schools, often in different states; nothing under them is grouped
+NETWORK_SUFFIXES = {
+    "asso.fr", "commnet.edu", "ernet.in", "mass.edu", "rnu.tn",
+}
+
+# Above this many records a shared domain is a system of schools, not one campus
+MAX_DOMAIN_GROUP = 8
+
+# Each country's state names and codes, casefolded; the first table is the admin-1 one
+_STATE_NAMES = {
+    country: {key.casefold(): code for name, code in tables[0].items() for key in (name, code)}
+    for country, tables in COUNTRY_STATE_TABLES.items()
+}
+
+
+def registrable_domain(domain: str) -> Optional[str]:
+    """
+    The part of a domain an institution actually registered, e.g.
+    "student.eit.edu.au" -> "eit.edu.au" and "cs.stanford.edu" -> "stanford.edu".
+
+    Returns None when nothing is left besides a public suffix.
+    """
+    labels = [label for label in domain.strip().lower().rstrip(".").split(".") if label]
+    if len(labels) >= 2 and len(labels[-1]) == 2 and labels[-2] in SECOND_LEVEL_LABELS:
+        registrable = ".".join(labels[-3:]) if len(labels) >= 3 else None
+    else:
+        registrable = ".".join(labels[-2:]) if len(labels) >= 2 else None
+    return None if registrable in NETWORK_SUFFIXES else registrable
+
+
+def university_query(university: Dict) -> str:
+    return f"{university['name']} {university['country']}"
+
+
+def province_state(university: Dict) -> Optional[str]:
+    """The state a record's own state-province names, if it names one we know."""
+    province = university.get("state-province")
+    if not province:
+        return None
+    country = university.get("country")
+    # "West Virginia" is a state of its own, not Virginia found inside it
+    state = _STATE_NAMES.get(country, {}).get(province.strip().casefold())
+    return state or extract_state_from_name(province, country)
+
+
+def agreeing_members(members: List[Dict], state: str) -> List[Dict]:
+    """The members a looked-up state may be applied to: those not naming another state."""
+    return [university for university in members if province_state(university) in (None, state)]
+
+
+def _province_key(university: Dict) -> Optional[str]:
+    # Provinces we cannot map to a state are compared as written
+    province = university.get("state-province")
+    if not province:
+        return None
+    return province_state(university) or province.strip().casefold()
+
+
+def _domain_keys(university: Dict) -> set:
+    keys = set()
+    for domain in university.get("domains") or ():
+        registrable = registrable_domain(domain)
+        if registrable:
+            keys.add((university.get("country"), registrable))
+    return keys
+
+
+class QueryGroup:
+    """One planned lookup and the records its answer applies to."""
+
+    def __init__(self, query: str, members: List[Dict]):
+        self.query = query
+        self.members = members
+
+    def __repr__(self) -> str:
+        return f"QueryGroup({self.query!r}, {len(self.members)} members)"
+
+
+class QueryPlan:
+    """Lookups to send for a list of records, in dataset order."""
+
+    def __init__(self, groups: List[QueryGroup], records: int, distinct_queries: int):
+        self.groups = groups
+        self.records = records
+        self.distinct_queries = distinct_queries
+
+    @property
+    def requests_saved(self) -> int:
+        return self.records - len(self.groups)
+
+    @property
+    def saved_by_query(self) -> int:
+        return self.records - self.distinct_queries
+
+    @property
+    def saved_by_domain(self) -> int:
+        return self.requests_saved - self.saved_by_query
+
+    def summary(self) -> str:
+        return (
+            f"{len(self.groups)} lookups planned for {self.records} universities "
+            f"({self.requests_saved} saved: {self.saved_by_query} by identical query, "
+            f"{self.saved_by_domain} by shared domain)"
+        )
+
+
+def plan_queries(universities: List[Dict], group_by_domain: bool = True) -> QueryPlan:
+    """Group records by normalized query and, optionally, registrable domain."""
+    # Records sending the same query always share its answer
+    by_query: Dict[str, List[int]] = {}
+    for i, university in enumerate(universities):
+        by_query.setdefault(normalize_query(university_query(university)), []).append(i)
+    query_groups = list(by_query.values())  # in order of first record
+
+    # A query group whose records span several domains joins none of them
+    root = list(range(len(query_groups)))
+    if group_by_domain:
+        by_domain: Dict[Tuple, List[int]] = {}
+        for g, positions in enumerate(query_groups):
+            keys = set().union(*(_domain_keys(universities[i]) for i in positions))
+            if len(keys) == 1:
+                by_domain.setdefault(keys.pop(), []).append(g)
+
+        for groups in by_domain.values():
+            if len(groups) < 2:
+                continue
+            positions = [i for g in groups for i in query_groups[g]]
+            if len(positions) > MAX_DOMAIN_GROUP:
+                continue
+            states = {_province_key(universities[i]) for i in positions} - {None}
+            if len(states) > 1:
+                continue
+            # The earliest query group represents the domain group
+            for g in groups:
+                root[g] = groups[0]
+
+    merged: Dict[int, List[int]] = {}
+    for g, positions in enumerate(query_groups):
+        merged.setdefault(root[g], []).extend(positions)
+    groups = []
+    for positions in merged.values():
+        positions.sort()
+        members = [universities[i] for i in positions]
+        groups.append(QueryGroup(university_query(members[0]), members))
+
+    return QueryPlan(groups, len(universities), len(query_groups))
+
+
+def single_queries(universities: List[Dict]) -> QueryPlan:
+    """A plan with one lookup per record, i.e. no coalescing."""
+    groups = [QueryGroup(university_query(university), [university]) for university in universities]
+    return QueryPlan(groups, len(universities), len(universities))
@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""
+Tiered state resolution in a single pass over the universities list.
+
+Every record without a state runs through the tiers in order and stops at
+the first one that answers:
+
+    rules      the name rules of add_states_to_universities.py
+    domains    state labels inside the domain (glenoaks.cc.mi.us, cstj.qc.ca,
+               nims.ap.nic.in)
+    gazetteer  the offline place-name gazetteer
+    cache      answers already in the geocoding cache, from either provider
+    nominatim  OpenStreetMap/Nominatim (free, 1 request per second)
+    google     Google Places (billed)
+
+Only the records the local tiers could not resolve are planned into
+remote lookups. At the end the pipeline reports how many records each tier
+saw, how many it resolved and how long it took.
+"""
+
+import argparse
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+from add_states_to_universities import (
+    AUSTRALIAN_STATES,
+    CANADIAN_PROVINCES,
+    INDIA_STATES,
+    US_STATES,
+    extract_state_from_name,
+)
+from enhance_universities_free_apis import FreeGeocodingAPI, enhance_universities_with_free_api
+from enhance_universities_with_google_api import (
+    GOOGLE_DAILY_QUOTA,
+    GOOGLE_PLACES_BASE_URL,
+    GooglePlacesAPI,
+    enhance_universities_concurrently,
+    enhance_universities_with_google_api,
+)
+from enrichment_metrics import Metrics, add_metrics_arguments, collecting_metrics, profiling
+from enrichment_scheduler import DEFAULT_MAX_ATTEMPTS, DemandSignals, add_scheduler_arguments, load_demand
+from gazetteer import DEFAULT_GAZETTEER_PATH, Gazetteer
+from geocoding_cache import DEFAULT_CACHE_PATH, GeocodingCache
+from http_session import DEFAULT_RETRIES, add_session_arguments
+from place_matcher import DEFAULT_MATCH_THRESHOLD, PlaceMatcher
+from query_planner import agreeing_members, plan_queries, single_queries, university_query
+from university_store import UniversityStore
+from university_stream import write_universities
+
+NOMINATIM_BASE_URL = "https://nominatim.openstreetmap.org"
+
+# Remote providers, cheapest first
+PROVIDERS = ("nominatim", "google")
+
+US_STATE_LABELS = {abbreviation.lower(): abbreviation for abbreviation in US_STATES.values()}
+CANADIAN_PROVINCE_LABELS = {abbreviation.lower(): abbreviation for abbreviation in CANADIAN_PROVINCES.values()}
+AUSTRALIAN_STATE_LABELS = {abbreviation.lower(): abbreviation for abbreviation in AUSTRALIAN_STATES.values()}
+
+# State labels under nic.in, as in ntruhs.ap.nic.in or jpv.bih.nic.in
+INDIA_NIC_LABELS = {
+    "ap": "AP", "bih": "BR", "guj": "GJ", "hp": "HP", "kar": "KA", "ker": "KL", "mah": "MH",
+    "mp": "MP", "ori": "OD", "raj": "RJ", "tn": "TN", "up": "UP", "wb": "WB",
+}
+
+# State names under gov.in, as in knruhs.telangana.gov.in
+INDIA_GOV_LABELS = {name.lower().replace(" ", ""): abbreviation for name, abbreviation in INDIA_STATES.items()}
+
+
+def state_from_domain(domain: str, alpha_two_code: str) -> Optional[str]:
+    """State encoded in a domain's labels, e.g. "lakeland.cc.il.us" in the US -> "IL"."""
+    labels = [label for label in domain.strip().lower().rstrip(".").split(".") if label]
+    if len(labels) < 3:
+        return None
+    if alpha_two_code == "US" and labels[-1] == "us":
+        return US_STATE_LABELS.get(labels[-2])
+    if alpha_two_code == "CA" and labels[-1] == "ca":
+        return CANADIAN_PROVINCE_LABELS.get(labels[-2])
+    if len(labels) < 4:
+        return None
+    if alpha_two_code == "AU" and labels[-1] == "au" and labels[-2] in ("edu", "gov"):
+        return AUSTRALIAN_STATE_LABELS.get(labels[-3])
+    if alpha_two_code == "IN" and labels[-1] == "in":
+        if labels[-2] == "nic":
+            return INDIA_NIC_LABELS.get(labels[-3])
+        if labels[-2] == "gov":
+            return INDIA_GOV_LABELS.get(labels[-3])
+    return None
+
+
+class Tier(ABC):
+    """One stage of the pipeline."""
+    name = ""
+
+    @abstractmethod
+    def run(self, universities: List[Dict], pending: List[Dict], store: UniversityStore):
+        """Set the state of the pending records this tier can answer."""
+
+
+class LocalTier(Tier):
+    """A tier that answers one record at a time, without a network call."""
+
+    @abstractmethod
+    def resolve(self, university: Dict) -> Optional[str]:
+        """The state of one record, or None."""
+
+    def run(self, universities: List[Dict], pending: List[Dict], store: UniversityStore):
+        for university in pending:
+            state = self.resolve(university)
+            if state:
+                store.update(university, {"state": state})
+
+
+class RulesTier(LocalTier):
+    name = "rules"
+
+    def resolve(self, university: Dict) -> Optional[str]:
+        return extract_state_from_name(university.get("name") or "", university["country"])
+
+
+class DomainTier(LocalTier):
+    name = "domains"
+
+    def resolve(self, university: Dict) -> Optional[str]:
+        code = university.get("alpha_two_code") or ""
+        for domain in university.get("domains") or ():
+            state = state_from_domain(domain, code)
+            if state:
+                return state
+        return None
+
+
+class GazetteerTier(LocalTier):
+    name = "gazetteer"
+
+    def __init__(self, gazetteer: Gazetteer):
+        self.gazetteer = gazetteer
+
+    def resolve(self, university: Dict) -> Optional[str]:
+        return self.gazetteer.resolve(university)
+
+
+class CacheTier(LocalTier):
+    """
+    Answers an earlier run already paid for, without sending a request.
+
+    A remote tier caches each answer under its group's query only, so the
+    records are grouped here the same way. A record takes the answer cached
+    under its own query, or else the one cached for any query of its
+    group, as long as its state-province does not name another state.
+    The cached results are checked against the university name with the
+    same matcher the remote tiers use.
+    """
+    name = "cache"
+
+    def __init__(self, cache: GeocodingCache, coalesce: bool = True, matcher: Optional[PlaceMatcher] = None):
+        self.cache = cache
+        self.coalesce = coalesce
+        self.google = GooglePlacesAPI(api_key="", cache=cache, matcher=matcher)
+        self.nominatim = FreeGeocodingAPI(cache=cache, matcher=matcher)
+
+    def cached_state(self, query: str, country: str, name: Optional[str] = None) -> Optional[str]:
+        found, place = self.nominatim.lookup_cached(query, name)
+        if found and place:
+            state = self.nominatim.extract_state_from_place(place, country)
+            if state:
+                return state
+        found, place = self.google.lookup_cached(query, name)
+        if found and place:
+            return self.google.extract_state_from_place(place)
+        return None
+
+    def resolve(self, university: Dict) -> Optional[str]:
+        return self.cached_state(university_query(university), university["country"], university["name"])
+
+    def run(self, universities: List[Dict], pending: List[Dict], store: UniversityStore):
+        plan = plan_queries(pending) if self.coalesce else single_queries(pending)
+        for group in plan.groups:
+            states: Dict[str, Optional[str]] = {}
+            for university in group.members:
+                query = university_query(university)
+                if query not in states:
+                    states[query] = self.cached_state(query, university["country"], university["name"])
+            for university in group.members:
+                state = states[university_query(university)]
+                if state:
+                    store.update(university, {"state": state})
+
+            # The group's own query comes first, as it is the one the remote tiers cache
+            shared = next((state for state in states.values() if state), None)
+            if shared:
+                unresolved = [university for university in group.members if not university.get("state")]
+                for university in agreeing_members(unresolved, shared):
+                    store.update(university, {"state": shared})
+
+
+class NominatimTier(Tier):
+    name = "nominatim"
+
+    def __init__(
+        self,
+        cache: GeocodingCache,
+        base_url: str = NOMINATIM_BASE_URL,
+        coalesce: bool = True,
+        metrics: Optional[Metrics] = None,
+        verbose: bool = False,
+        matcher: Optional[PlaceMatcher] = None,
+        demand: Optional[DemandSignals] = None,
+        quota: Optional[int] = None,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        pool_size: Optional[int] = None,
+        http_retries: int = DEFAULT_RETRIES
+    ):
+        self.cache = cache
+        self.base_url = base_url
+        self.coalesce = coalesce
+        self.metrics = metrics
+        self.verbose = verbose
+        self.matcher = matcher
+        self.demand = demand
+        self.quota = quota
+        self.max_attempts = max_attempts
+        self.pool_size = pool_size
+        self.http_retries = http_retries
+
+    def run(self, universities: List[Dict], pending: List[Dict], store: UniversityStore):
+        enhance_universities_with_free_api(
+            universities, cache=self.cache, base_url=self.base_url, coalesce=self.coalesce,
+            candidates=pending, metrics=self.metrics, verbose=self.verbose, matcher=self.matcher,
+            demand=self.demand, quota=self.quota, max_attempts=self.max_attempts,
+            pool_size=1 if self.pool_size is None else self.pool_size, http_retries=self.http_retries
+        )
+
+
+class GoogleTier(Tier):
+    name = "google"
+
+    def __init__(
+        self,
+        api_key: str,
+        cache: GeocodingCache,
+        base_url: str = GOOGLE_PLACES_BASE_URL,
+        coalesce: bool = True,
+        concurrency: int = 1,
+        rate: float = 10.0,
+        metrics: Optional[Metrics] = None,
+        verbose: bool = False,
+        matcher: Optional[PlaceMatcher] = None,
+        demand: Optional[DemandSignals] = None,
+        quota: int = GOOGLE_DAILY_QUOTA,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        pool_size: Optional[int] = None,
+        http_retries: int = DEFAULT_RETRIES
+    ):
+        self.api_key = api_key
+        self.cache = cache
+        self.base_url = base_url
+        self.coalesce = coalesce
+        self.concurrency = concurrency
+        self.rate = rate
+        self.metrics = metrics
+        self.verbose = verbose
+        self.matcher = matcher
+        self.demand = demand
+        self.quota = quota
+        self.max_attempts = max_attempts
+        self.pool_size = pool_size
+        self.http_retries = http_retries
+
+    def run(self, universities: List[Dict], pending: List[Dict], store: UniversityStore):
+        scheduling = {"demand": self.demand, "quota": self.quota, "max_attempts": self.max_attempts,
+                      "pool_size": self.pool_size, "http_retries": self.http_retries}
+        if self.concurrency > 1:
+            enhance_universities_concurrently(
+                universities, self.api_key, concurrency=self.concurrency, rate=self.rate,
+                cache=self.cache, base_url=self.base_url, coalesce=self.coalesce, candidates=pending,
+                metrics=self.metrics, verbose=self.verbose, matcher=self.matcher, **scheduling
+            )
+        else:
+            enhance_universities_with_google_api(
+                universities, self.api_key, cache=self.cache, base_url=self.base_url,
+                coalesce=self.coalesce, candidates=pending, metrics=self.metrics, verbose=self.verbose,
+                matcher=self.matcher, **scheduling
+            )
+
+
+class TierStats:
+    """How many records reached a tier, how many it resolved, and the time it took."""
+
+    def __init__(self, name: str, attempted: int):
+        self.name = name
+        self.attempted = attempted
+        self.resolved = 0
+        self.seconds = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.resolved / self.attempted if self.attempted else 0.0
+
+    def __repr__(self) -> str:
+        return f"TierStats({self.name!r}, {self.resolved}/{self.attempted}, {self.seconds:.3f}s)"
+
+
+class ResolutionPipeline:
+    """Runs the records still missing a state through the tiers, first answer wins."""
+
+    def __init__(self, tiers: List[Tier], metrics: Optional[Metrics] = None):
+        self.tiers = tiers
+        self.metrics = metrics or Metrics()
+
+    def run(self, universities: List[Dict]) -> List[TierStats]:
+        store = UniversityStore(universities)
+        pending = [uni for uni in universities if not uni.get("state") and uni.get("country")]
+        report = []
+        for tier in self.tiers:
+            stats = TierStats(tier.name, len(pending))
+            if pending:
+                start = time.perf_counter()
+                with self.metrics.timer(f"tier.{tier.name}"):
+                    tier.run(universities, pending, store)
+                stats.seconds = time.perf_counter() - start
+                remaining = [uni for uni in pending if not uni.get("state")]
+                stats.resolved = len(pending) - len(remaining)
+                pending = remaining
+            self.metrics.count(f"tier.{tier.name}.attempted", stats.attempted)
+            self.metrics.count(f"tier.{tier.name}.resolved", stats.resolved)
+            report.append(stats)
+        return report
+
+
+def local_tiers(
+    gazetteer: Optional[Gazetteer],
+    cache: Optional[GeocodingCache],
+    coalesce: bool = True,
+    matcher: Optional[PlaceMatcher] = None
+) -> List[Tier]:
+    tiers: List[Tier] = [RulesTier(), DomainTier()]
+    if gazetteer is not None:
+        tiers.append(GazetteerTier(gazetteer))
+    if cache is not None:
+        tiers.append(CacheTier(cache, coalesce, matcher))
+    return tiers
+
+
+def print_report(report: List[TierStats]):
+    print(f"\n📊 {'Tier':<10} {'Records':>8} {'Resolved':>9} {'Hit rate':>9} {'Time':>10}")
+    for stats in report:
+        print(f"   {stats.name:<10} {stats.attempted:>8} {stats.resolved:>9} "
+              f"{stats.hit_rate * 100:>8.1f}% {stats.seconds:>9.3f}s")
+
+
+def add_pipeline_arguments(parser: argparse.ArgumentParser):
+    """Tier and provider options, shared with the enrich stage of campusly_data.py."""
+    parser.add_argument("--providers", nargs="*", choices=PROVIDERS, default=list(PROVIDERS),
+                        help="remote providers to try, in this order (default: %(default)s); "
+                             "google needs GOOGLE_PLACES_API_KEY")
+    parser.add_argument("--offline", dest="providers", action="store_const", const=[],
+                        help="stop after the local tiers")
+    parser.add_argument("--no-coalesce", dest="coalesce", action="store_false",
+                        help="send one lookup per university instead of one per query/domain group")
+    parser.add_argument("--gazetteer", default=DEFAULT_GAZETTEER_PATH,
+                        help="compiled gazetteer (default: %(default)s, or the built-in tables if it does not exist)")
+    parser.add_argument("--no-gazetteer", dest="gazetteer", action="store_const", const=None,
+                        help="skip the gazetteer tier")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH,
+                        help="geocoding cache used by the cache tier and the providers (default: %(default)s)")
+    parser.add_argument("--nominatim-base-url", default=NOMINATIM_BASE_URL,
+                        help="Nominatim base URL, e.g. a local fake_geocoding_server.py")
+    parser.add_argument("--google-base-url", default=GOOGLE_PLACES_BASE_URL,
+                        help="Places API base URL, e.g. a local fake_geocoding_server.py")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Google requests kept in flight (default: 1)")
+    parser.add_argument("--rate", type=float, default=10.0,
+                        help="maximum Google requests per second when --concurrency > 1 (default: 10)")
+    parser.add_argument("--match-threshold", type=float, default=DEFAULT_MATCH_THRESHOLD,
+                        help="minimum name similarity for a provider result to be used (default: %(default)s)")
+    parser.add_argument("--no-match", dest="match", action="store_false",
+                        help="take the first provider result without checking its name")
+    add_scheduler_arguments(parser)
+    add_session_arguments(parser)
+    add_metrics_arguments(parser)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Resolve missing states through local tiers, then remote providers.")
+    parser.add_argument("--input", default="app/assets/world_universities_and_domains.json",
+                        help="universities JSON file to resolve")
+    parser.add_argument("--output", default="app/assets/world_universities_enhanced.json",
+                        help="where to write the universities with states added")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="run the local tiers and print the remote lookups that would be sent, without saving")
+    add_pipeline_arguments(parser)
+    return parser.parse_args()
+
+
+def resolve_states(universities: List[Dict], args: argparse.Namespace, remote: bool = True) -> List[TierStats]:
+    """Run the pipeline configured by add_pipeline_arguments over universities, printing its report."""
+    gazetteer = Gazetteer.load(args.gazetteer) if args.gazetteer is not None else None
+    matcher = PlaceMatcher.from_universities(universities, args.match_threshold) if args.match else None
+    with GeocodingCache(args.cache) as cache, collecting_metrics(args) as metrics:
+        tiers = local_tiers(gazetteer, cache, args.coalesce, matcher)
+        if remote:
+            demand = load_demand(args.demand) if args.providers else None
+            for provider in args.providers:
+                if provider == "nominatim":
+                    tiers.append(NominatimTier(cache, args.nominatim_base_url, args.coalesce,
+                                               metrics, args.verbose, matcher, demand, args.quota,
+                                               args.max_attempts, args.pool_size, args.http_retries))
+                    continue
+                api_key = os.getenv("GOOGLE_PLACES_API_KEY")
+                if not api_key:
+                    print("🔑 GOOGLE_PLACES_API_KEY is not set, skipping the google tier")
+                    continue
+                tiers.append(GoogleTier(api_key, cache, args.google_base_url, args.coalesce,
+                                        args.concurrency, args.rate, metrics, args.verbose, matcher, demand,
+                                        args.quota if args.quota is not None else GOOGLE_DAILY_QUOTA,
+                                        args.max_attempts, args.pool_size, args.http_retries))
+
+        with profiling(args.profile, args.profile_mode):
+            report = ResolutionPipeline(tiers, metrics).run(universities)
+    print_report(report)
+    if metrics.requests:
+        print(f"\n⏱️  Lookup latency by outcome:\n{metrics.summary()}")
+    return report
+
+
+def main():
+    args = parse_args()
+
+    print(f"📖 Loading universities from {args.input}...")
+    with open(args.input, 'r', encoding='utf-8') as f:
+        universities = json.load(f)
+    already = sum(1 for uni in universities if uni.get("state"))
+    print(f"✅ Loaded {len(universities)} universities, {already} already have a state")
+
+    report = resolve_states(universities, args, remote=not args.dry_run)
+
+    unresolved = [uni for uni in universities if not uni.get("state") and uni.get("country")]
+    if args.dry_run:
+        plan = plan_queries(unresolved) if args.coalesce else single_queries(unresolved)
+        print(f"\n🧮 Dry run: {plan.summary()}")
+        return
+
+    resolved = sum(stats.resolved for stats in report)
+    print(f"\n✅ Resolved {resolved} universities, {len(unresolved)} still without a state")
+    if resolved:
+        count = write_universities(universities, args.output)
+        print(f"✅ Saved {count} universities to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import fs from "fs";
+import pool from "./db.js";
+
+// Demand signals for the dataset scripts: how many users picked each school.
+// enrichment_scheduler.py geocodes the most picked schools first, so a
+// limited API quota goes to the records people actually use.
+const outputFile = process.argv[2] || "../school_demand.json";
+
+async function exportSchoolDemand() {
+  try {
+    console.log("Counting school selections in education entries...");
+
+    const result = await pool.query(`
+      SELECT school::text AS school, COUNT(DISTINCT user_id) AS selections
+      FROM education
+      WHERE school IS NOT NULL
+      GROUP BY school::text
+      ORDER BY selections DESC;
+    `);
+
+    // The same school can be stored with its fields in a different order
+    const schools = new Map();
+    result.rows.forEach(row => {
+      let school;
+      try {
+        school = JSON.parse(row.school);
+      } catch (error) {
+        return;
+      }
+      if (!school || typeof school !== "object" || !school.name) {
+        return;
+      }
+      const key = `${school.name}\u0000${school.country || ""}`;
+      const entry = schools.get(key) || {
+        name: school.name,
+        country: school.country || "",
+        domains: school.domains || [],
+        selections: 0,
+      };
+      entry.selections += parseInt(row.selections, 10);
+      schools.set(key, entry);
+    });
+
+    const demand = { version: 1, schools: [...schools.values()] };
+    fs.writeFileSync(outputFile, JSON.stringify(demand, null, 2));
+    console.log(`Wrote demand for ${demand.schools.length} schools to ${outputFile}`);
+  } catch (error) {
+    console.error("Error exporting school demand:", error.message);
+    process.exitCode = 1;
+  } finally {
+    await pool.end();
+  }
+}
+
+exportSchoolDemand();
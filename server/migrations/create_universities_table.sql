@@ -0,0 +1,35 @@
+-- Migration: Create the universities table
+-- Filled by postgres_loader.py from the enriched universities dataset;
+-- the loader applies this file itself, so running it by hand is optional
+
+CREATE TABLE IF NOT EXISTS universities (
+    name VARCHAR(255) NOT NULL,
+    country VARCHAR(100) NOT NULL,
+    -- Numbers the records that share a name and country, in dataset order
+    occurrence INTEGER NOT NULL DEFAULT 0,
+    alpha_two_code VARCHAR(2),
+    state VARCHAR(100),
+    state_province VARCHAR(100),
+    domains TEXT[] NOT NULL DEFAULT '{}',
+    web_pages TEXT[] NOT NULL DEFAULT '{}',
+    extra JSONB,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (name, country, occurrence)
+);
+
+-- Email domain lookups: WHERE domains @> ARRAY['mit.edu']
+CREATE INDEX IF NOT EXISTS idx_universities_domains ON universities USING GIN (domains);
+
+-- Schools by region: WHERE country = 'United States' AND state = 'CA'
+CREATE INDEX IF NOT EXISTS idx_universities_country_state ON universities (country, state);
+
+-- Add comments for documentation
+COMMENT ON TABLE universities IS 'Universities dataset with states added by the enrichment scripts';
+COMMENT ON COLUMN universities.occurrence IS 'Position among records with the same name and country';
+COMMENT ON COLUMN universities.state IS 'State/province code added by the enrichment scripts';
+COMMENT ON COLUMN universities.state_province IS 'Upstream state-province field';
+COMMENT ON COLUMN universities.extra IS 'Any other fields of the record';
+
+-- Rollback (if needed)
+-- To rollback this migration:
+-- DROP TABLE IF EXISTS universities;
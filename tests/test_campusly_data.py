@@ -0,0 +1,33 @@
+import pytest
+
+from campusly_data import STAGES, Stage, parse_args, split_stages
+
+
+def test_stage_names_start_new_stages():
+    global_argv, stages = split_stages(
+        ["--input", "big.json", "states", "--workers", "2", "export", "--format", "json", "columnar", "index"])
+    assert global_argv == ["--input", "big.json"]
+    assert stages == [("states", ["--workers", "2"]), ("export", ["--format", "json", "columnar"]),
+                      ("index", [])]
+
+
+def test_option_values_named_like_stages_stay_values():
+    global_argv, stages = split_stages(["--input", "states", "states", "export", "--output", "index"])
+    assert global_argv == ["--input", "states"]
+    assert stages == [("states", []), ("export", ["--output", "index"])]
+
+    # argparse abbreviations and --option=value take a value too
+    assert split_stages(["export", "--out", "index"])[1] == [("export", ["--out", "index"])]
+    assert split_stages(["export", "--output=index", "index"])[1] == [("export", ["--output=index"]), ("index", [])]
+
+
+def test_parsed_export_keeps_the_output():
+    args, stages = parse_args(["states", "export", "--output", "index"])
+    assert [stage.name for stage, _ in stages] == ["states", "export"]
+    assert stages[1][1].output == "index"
+
+
+def test_every_stage_implements_run():
+    with pytest.raises(TypeError):
+        Stage()
+    assert all(type(stage).run is not Stage.run for stage in STAGES.values())
@@ -0,0 +1,101 @@
+import json
+
+from dataset_merge import merge, merge_file, report_path_for
+from delta_manifest import DeltaManifest, manifest_path_for, plan_delta
+
+
+def university(name, domain, country="United States", code="US", **fields):
+    return {"name": name, "domains": [domain], "web_pages": [f"http://www.{domain}/"],
+            "country": country, "alpha_two_code": code, **fields}
+
+
+def previous():
+    return [
+        university("Bates College", "bates.edu", state="ME"),
+        university("Colby College", "colby.edu", state="ME"),
+        university("Western Sydney", "uws.edu.au", "Australia", "AU", state="NSW"),
+        university("Closed College", "closed.edu", state="VT"),
+        university("Unresolved College", "unresolved.edu"),
+    ]
+
+
+def names(records):
+    return [record["name"] for record in records]
+
+
+def test_merge_carries_states_by_domain_name_and_rename():
+    upstream = [
+        university("Colby College", "colby.edu"),                                 # same domain and name
+        university("Bates College", "bates.org"),                                 # same name, new domain
+        university("Western Sydney University", "uws.edu.au", "Australia", "AU"),  # renamed
+        university("New College", "new.edu"),
+        university("Unresolved College", "unresolved.edu", founded=1900),          # changed, nothing resolved
+    ]
+    result = merge(previous(), upstream)
+
+    assert [record.get("state") for record in result.records] == ["ME", "ME", "NSW", None, None]
+    assert result.counts["by_domain"] == 3 and result.counts["by_name"] == 1
+    assert result.counts["carried"] == 3
+    assert names(result.added) == ["New College"]
+    assert names(result.removed) == ["Closed College"]
+    assert result.pending == {3, 4}
+    assert not result.conflicts
+
+
+def test_each_previous_record_matches_once():
+    upstream = [university("Bates College", "bates.edu"), university("Bates College", "bates.edu")]
+    result = merge(previous(), upstream)
+    assert [record.get("state") for record in result.records] == ["ME", None]
+    assert result.pending == {1}
+
+
+def test_conflicts_are_not_carried():
+    upstream = [
+        university("Bates College", "bates.edu", "Canada", "CA"),              # moved country
+        university("Colby College", "colby.edu", state="NH"),                  # upstream has its own state
+        university("Western Sydney", "uws.edu.au", "Australia", "AU", **{"state-province": "Victoria"}),
+    ]
+    result = merge(previous(), upstream)
+
+    assert [conflict["reason"] for conflict in result.conflicts] == ["country", "upstream", "upstream"]
+    assert [record.get("state") for record in result.records] == [None, "NH", None]
+    assert result.pending == {0, 1, 2}
+    assert result.conflicts[0]["previous"]["state"] == "ME"
+
+
+def test_disagreeing_records_sharing_a_domain_are_ambiguous():
+    old = [university("North Campus", "system.edu", state="CA"), university("South Campus", "system.edu", state="NV")]
+    result = merge(old, [university("System University", "system.edu")])
+    assert result.conflicts == [{"name": "System University", "country": "United States", "reason": "ambiguous"}]
+    assert result.pending == {0}
+    assert len(result.removed) == 2
+
+
+def test_merge_file_rewrites_the_output_report_and_manifest(tmp_path):
+    previous_file = str(tmp_path / "world_universities_with_states.json")
+    upstream_file = str(tmp_path / "world_universities_and_domains.json")
+    old = previous()
+    with open(previous_file, "w", encoding="utf-8") as f:
+        json.dump(old, f)
+    DeltaManifest(manifest_path_for(previous_file), "tables").save(old)
+
+    upstream = [university("Colby College", "colby.edu"), university("New College", "new.edu")]
+    with open(upstream_file, "w", encoding="utf-8") as f:
+        json.dump(upstream, f)
+
+    assert merge_file(previous_file, upstream_file, dry_run=True).counts["added"] == 1
+    with open(previous_file, encoding="utf-8") as f:
+        assert json.load(f) == old
+
+    merge_file(previous_file, upstream_file)
+    with open(previous_file, encoding="utf-8") as f:
+        merged = json.load(f)
+    assert [record.get("state") for record in merged] == ["ME", None]
+    with open(report_path_for(previous_file), encoding="utf-8") as f:
+        report = json.load(f)
+    assert report["added"] == [["New College", "United States"]]
+    assert len(report["removed"]) == 4
+
+    # The next --delta run of the script that wrote the file only processes the added record
+    delta = plan_delta(DeltaManifest(manifest_path_for(previous_file), "tables"), merged)
+    assert names(delta.pending) == ["New College"]
@@ -0,0 +1,60 @@
+import json
+import os
+
+import pytest
+
+from dataset_shards import MANIFEST_NAME, UNKNOWN_SHARD, load_shards, write_shards
+
+
+def university(name, code, country):
+    return {"name": name, "alpha_two_code": code, "country": country, "domains": [], "web_pages": []}
+
+
+UNIVERSITIES = [
+    university("Bates College", "US", "United States"),
+    university("University of Toronto", "CA", "Canada"),
+    university("Colby College", "US", "United States"),
+    university("Nowhere Institute", None, None),
+]
+
+
+def test_shards_round_trip(tmp_path):
+    manifest = write_shards(UNIVERSITIES, str(tmp_path))
+    assert sorted(manifest["shards"]) == ["CA", "US", UNKNOWN_SHARD]
+    assert manifest["records"] == len(UNIVERSITIES)
+    assert load_shards(str(tmp_path), ["united states", "CA"]) == [UNIVERSITIES[0], UNIVERSITIES[2], UNIVERSITIES[1]]
+
+
+def test_load_rejects_a_modified_shard(tmp_path):
+    write_shards(UNIVERSITIES, str(tmp_path))
+    with open(tmp_path / "US.json", 'a', encoding='utf-8') as f:
+        f.write("\n")
+    with pytest.raises(ValueError):
+        load_shards(str(tmp_path), ["US"])
+
+
+def test_rewrite_only_removes_previous_shards(tmp_path):
+    write_shards(UNIVERSITIES, str(tmp_path))
+    # Unrelated datasets sharing the directory, as in app/assets
+    for file_name in ("world_universities_and_domains.json", "university_domain_index.json", "DE.json"):
+        (tmp_path / file_name).write_text("[]", encoding="utf-8")
+
+    manifest = write_shards(UNIVERSITIES[:1], str(tmp_path))
+    assert list(manifest["shards"]) == ["US"]
+    assert sorted(os.listdir(tmp_path)) == sorted([
+        "DE.json", "US.json", MANIFEST_NAME, "university_domain_index.json", "world_universities_and_domains.json",
+    ])
+
+
+def test_rewrite_ignores_paths_outside_the_directory(tmp_path):
+    shard_dir = tmp_path / "shards"
+    outside = tmp_path / "keep.json"
+    outside.write_text("[]", encoding="utf-8")
+    write_shards(UNIVERSITIES, str(shard_dir))
+    manifest_path = shard_dir / MANIFEST_NAME
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    manifest["shards"]["CA"]["file"] = "../keep.json"
+    manifest_path.write_text(json.dumps(manifest), encoding="utf-8")
+
+    write_shards(UNIVERSITIES[:1], str(shard_dir))
+    assert outside.exists()
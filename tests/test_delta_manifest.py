@@ -0,0 +1,25 @@
+from delta_manifest import DeltaManifest, plan_delta, unresolved_positions
+
+
+def universities():
+    return [
+        {"name": "Resolved University", "country": "United States", "state": "CA"},
+        {"name": "Deferred University", "country": "United States"},
+        {"name": "Untouched University", "country": "United States"},
+    ]
+
+
+def test_unresolved_positions_only_counts_candidates():
+    records = universities()
+    assert unresolved_positions(records) == {1, 2}
+    assert unresolved_positions(records, records[:2]) == {1}
+
+
+def test_stale_records_are_processed_again_by_the_next_delta_run(tmp_path):
+    path = str(tmp_path / "out.json.manifest.json")
+    records = universities()
+    DeltaManifest(path, "test").save(records, stale=unresolved_positions(records, records[:2]))
+
+    delta = plan_delta(DeltaManifest(path, "test"), universities())
+    assert [university["name"] for university in delta.pending] == ["Deferred University"]
+    assert not delta.added
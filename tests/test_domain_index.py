@@ -0,0 +1,41 @@
+import copy
+
+from domain_index import DomainIndex
+
+
+def universities():
+    return [
+        {"name": "Stanford University", "domains": ["stanford.edu"]},
+        {"name": "Example College", "domains": ["example.edu", "mail.example.edu"]},
+        {"name": "Example College Online", "domains": ["example.edu"]},
+    ]
+
+
+def test_lookup_matches_the_longest_suffix_on_whole_labels():
+    index = DomainIndex.from_universities(universities())
+    match = index.lookup("jane@cs.mail.stanford.edu")
+    assert (match.domain, match.positions) == ("stanford.edu", [0])
+    assert index.lookup("notstanford.edu") is None
+    assert index.lookup("x.example.edu").shared
+
+
+def test_saved_index_is_used_for_the_list_it_was_built_from(tmp_path, capsys):
+    path = str(tmp_path / "index.json")
+    DomainIndex.from_universities(universities()).save(path)
+    index = DomainIndex.load(path, universities())
+    assert index.lookup("stanford.edu").positions == [0]
+    assert "rebuilding" not in capsys.readouterr().out
+
+
+def test_index_of_another_list_is_rebuilt(tmp_path, capsys):
+    path = str(tmp_path / "index.json")
+    DomainIndex.from_universities(universities()).save(path)
+
+    reordered = list(reversed(universities()))
+    index = DomainIndex.load(path, reordered)
+    assert "rebuilding" in capsys.readouterr().out
+    assert index.lookup("stanford.edu").positions == [2]
+
+    changed = copy.deepcopy(universities())
+    changed[0]["domains"] = ["stanford.org"]
+    assert DomainIndex.load(path, changed).lookup("stanford.edu") is None
@@ -0,0 +1,89 @@
+import argparse
+import json
+import threading
+
+from enrichment_metrics import LatencyHistogram, Metrics, SnapshotWriter, add_metrics_arguments, collecting_metrics
+
+
+def test_histogram_percentiles_are_bucket_bounds_capped_at_the_max():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(0.5) == 0.0
+    for ms in (0.5, 3, 3, 4, 40, 12000):
+        histogram.observe(ms / 1000)
+    snapshot = histogram.snapshot()
+    assert snapshot["count"] == 6
+    assert snapshot["p50_ms"] == 5.0
+    assert snapshot["p90_ms"] == 12000.0  # open-ended bucket reports the max
+    assert snapshot["max_ms"] == 12000.0
+    assert snapshot["buckets"] == {"1": 1, "5": 3, "50": 1, "inf": 1}
+
+    single = LatencyHistogram()
+    single.observe(0.0031)
+    assert single.percentile(0.99) == 3.1
+
+
+def test_counters_timers_and_requests():
+    metrics = Metrics()
+    metrics.count("records")
+    metrics.count("records", 4)
+    with metrics.timer("lookup"):
+        pass
+    try:
+        with metrics.timer("lookup"):
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    metrics.observe_request("google", 200, 0.004)
+    metrics.observe_request("google", "cache", 0.0001)
+    metrics.observe_request("nominatim", "timeout", 5.5)
+
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"] == {"records": 5}
+    assert snapshot["timers"]["lookup"]["count"] == 2
+    assert list(snapshot["requests"]["google"]) == ["200", "cache"]
+    assert snapshot["requests"]["nominatim"]["timeout"]["count"] == 1
+    assert metrics.summary().splitlines() == [
+        "google 200: 1 calls, p50 4 ms, p90 4 ms, max 4 ms",
+        "google cache: 1 calls, p50 0.1 ms, p90 0.1 ms, max 0 ms",
+        "nominatim timeout: 1 calls, p50 5500 ms, p90 5500 ms, max 5500 ms",
+    ]
+
+
+def test_counts_from_many_threads():
+    metrics = Metrics()
+
+    def work():
+        for _ in range(1000):
+            metrics.count("records")
+            metrics.observe_request("google", 200, 0.001)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert metrics.counters["records"] == 8000
+    assert metrics.requests["google"]["200"].count == 8000
+
+
+def test_snapshot_writer_appends_a_final_line(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    metrics = Metrics()
+    with SnapshotWriter(metrics, str(path), interval=60):
+        metrics.count("records", 3)
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert len(lines) == 1
+    assert lines[0]["final"] is True
+    assert lines[0]["counters"] == {"records": 3}
+
+
+def test_collecting_metrics_follows_the_arguments(tmp_path):
+    parser = argparse.ArgumentParser()
+    add_metrics_arguments(parser)
+    with collecting_metrics(parser.parse_args([])) as metrics:
+        metrics.count("records")
+
+    path = tmp_path / "metrics.jsonl"
+    with collecting_metrics(parser.parse_args(["--metrics", str(path), "--metrics-interval", "60"])) as metrics:
+        metrics.count("records")
+    assert json.loads(path.read_text(encoding="utf-8"))["counters"] == {"records": 1}
@@ -0,0 +1,69 @@
+import time
+
+import http_session
+from enrichment_scheduler import AdaptiveRate, EnrichmentScheduler, TransientError
+from query_planner import QueryGroup
+
+
+def groups(count):
+    return [QueryGroup(f"University {i}", [{"name": f"University {i}"}]) for i in range(count)]
+
+
+def slow_fetch(group):
+    time.sleep(0.3)
+    return {"name": group.query}, True
+
+
+def test_quota_defers_the_rest_without_spinning():
+    scheduler = EnrichmentScheduler(slow_fetch, AdaptiveRate(1000.0, capacity=10), concurrency=4, quota=2)
+    answered = []
+    cpu = time.process_time()
+    stats = scheduler.run(groups(10), lambda group, place, cacheable: answered.append(group))
+    cpu = time.process_time() - cpu
+
+    assert stats.sent == 2 and len(answered) == 2
+    assert stats.quota_exhausted and len(stats.deferred) == 8
+    # Waiting on the two requests in flight must not busy-loop for 0.3 s
+    assert cpu < 0.1
+
+
+def failing_fetch(failures):
+    calls = []
+
+    def fetch(group):
+        calls.append(group.query)
+        if calls.count(group.query) <= failures:
+            raise TransientError("HTTP 502")
+        return {"name": group.query}, True
+    return fetch, calls
+
+
+def test_transient_errors_are_retried_through_the_limiter_and_quota(monkeypatch):
+    monkeypatch.setattr(http_session, "RETRY_BACKOFF", 0.01)
+    monkeypatch.setattr(http_session, "RETRY_JITTER", 0.0)
+    fetch, calls = failing_fetch(failures=1)
+    rate = AdaptiveRate(1000.0)
+    acquired = []
+    monkeypatch.setattr(rate, "acquire", lambda: acquired.append(1))
+    answers = []
+    stats = EnrichmentScheduler(fetch, rate, retries=2).run(
+        groups(3), lambda group, place, cacheable: answers.append((place, cacheable)))
+
+    assert stats.retried == 3 and stats.sent == 6 == len(calls) == len(acquired)
+    assert all(place and cacheable for place, cacheable in answers)
+
+    # The retries are paid from the quota too
+    fetch, calls = failing_fetch(failures=1)
+    stats = EnrichmentScheduler(fetch, AdaptiveRate(1000.0), quota=4, retries=2).run(groups(3), lambda *_: None)
+    assert stats.sent == 4 == len(calls) and stats.quota_exhausted and stats.deferred
+
+
+def test_lookup_failing_after_its_retries_is_recorded_as_failed(monkeypatch):
+    monkeypatch.setattr(http_session, "RETRY_BACKOFF", 0.01)
+    fetch, calls = failing_fetch(failures=10)
+    answers = []
+    stats = EnrichmentScheduler(fetch, AdaptiveRate(1000.0), retries=2).run(
+        groups(1), lambda group, place, cacheable: answers.append((place, cacheable)))
+
+    assert len(calls) == 3 and stats.retried == 2
+    assert answers == [(None, False)] and not stats.deferred
@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+from gazetteer import GAZETTEER_VERSION, Gazetteer, apply_gazetteer, compile_geonames, host_words
+from university_store import UniversityStore
+
+
+def university(name, code="US", country="United States", **fields):
+    return {"name": name, "alpha_two_code": code, "country": country, **fields}
+
+
+@pytest.fixture(scope="module")
+def seed():
+    return Gazetteer.seed()
+
+
+@pytest.mark.parametrize("name, state", [
+    ("West Virginia University", "WV"),
+    ("West Virginia State University", "WV"),
+    ("Virginia Tech", "VA"),
+    ("University of Missouri - Kansas City", "MO"),
+    ("Kansas State University", "KS"),
+    ("Washington University in St. Louis", "MO"),
+    ("Washington University, Saint Louis", "MO"),
+    ("Washington State University", "WA"),
+    ("University of California, Los Angeles", "CA"),
+])
+def test_resolves_state_from_name(seed, name, state):
+    assert seed.resolve(university(name)) == state
+
+
+def test_matches_whole_words_only(seed):
+    assert seed.resolve_text("Bathurst Institute", "AU") is None
+    assert seed.resolve_text("Charles Sturt University Bathurst", "AU") is None
+
+
+def test_unknown_country_resolves_nothing(seed):
+    assert "FR" not in seed
+    assert seed.resolve(university("Université de Paris", "FR", "France")) is None
+
+
+def test_falls_back_to_hostnames(seed):
+    assert host_words("http://www.uni-hamburg.de/") == ["hamburg", "de"]
+    record = university("Technische Universität", "DE", "Germany", web_pages=["http://www.tu-hamburg.de/"])
+    assert seed.resolve(record) == "HH"
+
+
+def test_ambiguous_phrase_ranks_after_unambiguous_ones():
+    gazetteer = Gazetteer({"US": [("Washington", "WA"), ("Springfield", "IL"), ("Washington", "DC")]})
+    assert gazetteer.resolve_text("Washington College", "US") == "WA"
+    assert gazetteer.resolve_text("Washington College of Springfield", "US") == "IL"
+
+
+def test_compiled_gazetteer_round_trips(tmp_path):
+    admin1 = tmp_path / "admin1CodesASCII.txt"
+    admin1.write_text("FR.11\tÎle-de-France\tIle-de-France\t3012874\n"
+                      "FR.84\tAuvergne-Rhône-Alpes\tAuvergne-Rhone-Alpes\t11071625\n", encoding="utf-8")
+    cities = tmp_path / "cities15000.txt"
+    rows = [("Paris", "Paris", "FR", "11", 2138551), ("Lyon", "Lyon", "FR", "84", 522969),
+            ("Saint-Étienne", "Saint-Etienne", "FR", "84", 172565)]
+    cities.write_text("".join(
+        "\t".join(["0", name, ascii_name, "", "0", "0", "P", "PPL", code, "", admin1_code, "", "", "", str(population)])
+        + "\n" for name, ascii_name, code, admin1_code, population in rows
+    ), encoding="utf-8")
+
+    compiled = compile_geonames(str(cities), str(admin1), ["FR"])
+    assert compiled["version"] == GAZETTEER_VERSION
+    path = tmp_path / "gazetteer.json"
+    path.write_text(json.dumps(compiled), encoding="utf-8")
+
+    gazetteer = Gazetteer.load(str(path))
+    assert gazetteer.countries == ["FR"]
+    assert gazetteer.resolve(university("Université Lumière Lyon 2", "FR", "France")) == "Auvergne-Rhône-Alpes"
+    assert gazetteer.resolve(university("Université Jean Monnet St Etienne", "FR", "France")) == "Auvergne-Rhône-Alpes"
+    assert gazetteer.resolve(university("Sorbonne Université", "FR", "France", domains=["paris.fr"])) == "Île-de-France"
+
+
+def test_load_rejects_unknown_version(tmp_path):
+    path = tmp_path / "gazetteer.json"
+    path.write_text(json.dumps({"version": GAZETTEER_VERSION + 1, "countries": {}}), encoding="utf-8")
+    with pytest.raises(ValueError):
+        Gazetteer.load(str(path))
+
+
+def test_apply_gazetteer_only_fills_missing_states(seed):
+    records = [university("West Virginia University"), university("Ohio University", state="XX"),
+               university("Sorbonne Université", "FR", "France")]
+    store = UniversityStore(records)
+    assert apply_gazetteer(records, seed, store) == 1
+    assert [record.get("state") for record in records] == ["WV", "XX", None]
@@ -0,0 +1,41 @@
+from enhance_universities_free_apis import FreeGeocodingAPI
+from enhance_universities_with_google_api import GooglePlacesAPI
+from geocoding_cache import GeocodingCache, entry_results, results_entry
+from place_matcher import PlaceMatcher
+
+NAMES = ["University of Maine", "Maine Medical Center", "Bates College", "Colby College"]
+QUERY = "Bates College United States"
+RESULTS = [{"name": "Maine Medical Center"}, {"name": "Bates College"}]
+
+
+def test_entries_round_trip(tmp_path):
+    with GeocodingCache(str(tmp_path / "cache.sqlite3")) as cache:
+        cache.store("google", QUERY, results_entry(RESULTS))
+        cache.store("google", "Nowhere", results_entry([]))
+        assert entry_results(cache.lookup("google", QUERY)[1]) == RESULTS
+        assert cache.lookup("google", "nowhere") == (True, None)
+        assert cache.lookup("google", "Elsewhere") == (False, None)
+    # Entries written before raw results were cached hold the picked place
+    assert entry_results({"name": "Bates College"}) == [{"name": "Bates College"}]
+    assert entry_results(None) == []
+
+
+def test_cached_results_are_matched_on_every_read(tmp_path):
+    with GeocodingCache(str(tmp_path / "cache.sqlite3")) as cache:
+        strict = GooglePlacesAPI(api_key="", cache=cache, matcher=PlaceMatcher(NAMES, threshold=1.1))
+        strict.store_results(QUERY, RESULTS)
+        # A rejected match is an answer for this matcher only, not "no results"
+        assert strict.lookup_cached(QUERY, "Bates College") == (True, None)
+
+        matching = GooglePlacesAPI(api_key="", cache=cache, matcher=PlaceMatcher(NAMES))
+        assert matching.lookup_cached(QUERY, "Bates College") == (True, RESULTS[1])
+        assert GooglePlacesAPI(api_key="", cache=cache).lookup_cached(QUERY, "Bates College") == (True, RESULTS[0])
+
+
+def test_both_clients_share_the_entry_format(tmp_path):
+    with GeocodingCache(str(tmp_path / "cache.sqlite3")) as cache:
+        api = FreeGeocodingAPI(cache=cache, matcher=PlaceMatcher(NAMES))
+        api.store_results(QUERY, RESULTS)
+        api.store_results("Nowhere", [])
+        assert api.lookup_cached(QUERY, "Bates College") == (True, RESULTS[1])
+        assert api.lookup_cached("Nowhere", "Nowhere") == (True, None)
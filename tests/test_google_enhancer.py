@@ -0,0 +1,59 @@
+import time
+
+import pytest
+
+pytest.importorskip("requests")
+
+from enhance_universities_with_google_api import enhance_universities_concurrently
+from fake_geocoding_server import FakeGeocodingServer, fake_state_for_query
+
+LOOKUPS = 120
+
+
+def universities():
+    return [{"name": f"Test University {i}", "country": "United States", "domains": [f"u{i}.edu"]}
+            for i in range(LOOKUPS)]
+
+
+def enhance(server, records, **options):
+    options.setdefault("rate", 1000.0)
+    start = time.perf_counter()
+    stats = enhance_universities_concurrently(records, "test-key", base_url=server.google_base_url, **options)
+    return stats, time.perf_counter() - start
+
+
+def expected_state(university):
+    found = fake_state_for_query(f"{university['name']} {university['country']}")
+    return found[1] if found else None
+
+
+def test_concurrent_run_matches_the_serial_one_and_is_faster():
+    with FakeGeocodingServer(latency=0.02) as server:
+        serial, serial_seconds = enhance(server, universities(), concurrency=1)
+        records = universities()
+        concurrent, concurrent_seconds = enhance(server, records, concurrency=8)
+
+    assert concurrent == serial
+    assert [university.get("state") for university in records] == [expected_state(u) for u in records]
+    assert concurrent["states_added"] + concurrent["failed"] == LOOKUPS
+    assert concurrent_seconds * 3 < serial_seconds
+
+
+def test_throttled_lookups_are_retried_not_failed():
+    records = universities()
+    with FakeGeocodingServer(throttle_rate=50.0, retry_after=0) as server:
+        stats, _ = enhance(server, records, concurrency=8, rate=2000.0, max_attempts=50)
+        assert server.requests_throttled > 0
+
+    assert stats["deferred"] == 0
+    assert [university.get("state") for university in records] == [expected_state(u) for u in records]
+
+
+def test_quota_leaves_the_rest_for_the_next_run():
+    records = universities()
+    with FakeGeocodingServer() as server:
+        stats, _ = enhance(server, records, concurrency=4, quota=50)
+        assert server.requests_served == 50
+
+    assert stats["total_processed"] == 50
+    assert stats["deferred"] == LOOKUPS - 50
@@ -0,0 +1,69 @@
+import gzip
+
+import pytest
+
+pytest.importorskip("requests")
+
+import http_session
+from enhance_universities_with_google_api import enhance_universities_concurrently
+from enrichment_metrics import Metrics
+from fake_geocoding_server import FakeGeocodingServer
+from http_session import pooled_session
+
+LOOKUPS = 60
+POOL_SIZE = 4
+
+
+def universities(count=LOOKUPS):
+    return [{"name": f"Test University {i}", "country": "United States", "domains": [f"u{i}.edu"]}
+            for i in range(count)]
+
+
+def run_lookups(server, pool_size, concurrency=POOL_SIZE, metrics=None, quota=None):
+    return enhance_universities_concurrently(
+        universities(), "test-key", concurrency=concurrency, rate=1000.0, base_url=server.google_base_url,
+        metrics=metrics, pool_size=pool_size, **({"quota": quota} if quota else {})
+    )
+
+
+@pytest.mark.parametrize("pool_size, expected", [(POOL_SIZE, None), (0, LOOKUPS)])
+def test_connections_opened(pool_size, expected):
+    with FakeGeocodingServer(handshake_latency=0.005) as server:
+        stats = run_lookups(server, pool_size)
+        assert stats["total_processed"] == LOOKUPS
+        assert server.requests_served == LOOKUPS
+        if expected is None:
+            assert server.connections_accepted <= POOL_SIZE
+        else:
+            assert server.connections_accepted == expected
+
+
+def test_answers_are_gzip_compressed():
+    with FakeGeocodingServer() as server:
+        response = pooled_session().get(f"{server.nominatim_base_url}/search",
+                                        params={"q": "Test University United States", "format": "json"},
+                                        stream=True)
+        raw = response.raw.read(decode_content=False)
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(raw).startswith(b"[")
+
+
+def test_transient_errors_are_retried_as_counted_requests(monkeypatch):
+    monkeypatch.setattr(http_session, "RETRY_BACKOFF", 0.01)
+    monkeypatch.setattr(http_session, "RETRY_JITTER", 0.0)
+    metrics = Metrics()
+    with FakeGeocodingServer(error_every=3) as server:
+        stats = run_lookups(server, POOL_SIZE, metrics=metrics)
+    retried = metrics.counters["google_places.scheduler.retried"]
+    assert server.requests_failed >= LOOKUPS // 3 and retried > 0
+    # Every retry is one more request the scheduler sent and counted
+    assert server.requests_served == LOOKUPS + retried == metrics.counters["google_places.scheduler.sent"]
+    assert stats["total_processed"] == LOOKUPS and stats["deferred"] == 0
+
+
+def test_retries_count_against_the_quota(monkeypatch):
+    monkeypatch.setattr(http_session, "RETRY_BACKOFF", 0.01)
+    with FakeGeocodingServer(error_every=2) as server:
+        stats = run_lookups(server, POOL_SIZE, quota=LOOKUPS)
+        assert server.requests_served == LOOKUPS
+        assert stats["deferred"] > 0
@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+from name_search_index import NameSearchIndex, app_checksum, build_index, linear_search
+
+DATASET = "app/assets/world_universities_and_domains.json"
+
+
+@pytest.fixture(scope="module")
+def universities():
+    with open(DATASET, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_search_matches_a_linear_scan(universities):
+    index = NameSearchIndex(build_index(universities), universities)
+    for query in ("uni", "state univ", "of m", "é", "xyzq", "united"):
+        for field in ("name", "country"):
+            assert index.search(query, field) == linear_search(universities, query, field)
+    assert index.search("university", limit=3) == linear_search(universities, "university")[:3]
+
+
+def test_checksum_matches_the_app():
+    # Computed with the loop in app/util/nameSearchIndex.ts
+    assert app_checksum([{"name": "Université 𝔘 İstanbul", "country": "Türkiye"}]) == 967553119
+
+
+def test_index_rejects_an_edited_list_of_the_same_length(universities):
+    index = build_index(universities)
+    edited = [dict(university) for university in universities]
+    edited[0]["name"] = edited[0]["name"][::-1]
+    assert app_checksum(edited) != index["checksum"]
+    with pytest.raises(ValueError):
+        NameSearchIndex(index, edited)
+
+
+def test_bundled_index_is_current(universities):
+    with open("app/assets/university_name_index.json", encoding="utf-8") as f:
+        index = json.load(f)
+    assert index["checksum"] == app_checksum(universities)
@@ -0,0 +1,22 @@
+from place_matcher import PlaceMatcher
+
+NAMES = ["University of Maine", "Maine Medical Center", "Bates College", "Colby College",
+         "University of Southern Maine"]
+
+
+def test_choose_reranks_to_the_named_result():
+    matcher = PlaceMatcher(NAMES)
+    places = [{"name": "Maine Medical Center"}, {"display_name": "University of Southern Maine, Portland, ME"}]
+    assert matcher.choose("University of Southern Maine", places) is places[1]
+
+
+def test_choose_rejects_results_below_the_threshold():
+    matcher = PlaceMatcher(NAMES)
+    assert matcher.choose("Bates College", [{"name": "Maine Medical Center"}]) is None
+
+
+def test_score_batch_scores_each_lookup_against_its_own_name():
+    matcher = PlaceMatcher(NAMES)
+    scores = matcher.score_batch(["Colby College", "Bates College"], [["Colby College"], ["Colby College", "Bates"]])
+    assert abs(scores[0][0] - 1.0) < 1e-9
+    assert len(scores[1]) == 2 and scores[1][1] > scores[1][0]
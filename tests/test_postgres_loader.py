@@ -0,0 +1,98 @@
+import copy
+import os
+import uuid
+
+import pytest
+
+psycopg = pytest.importorskip("psycopg")
+
+from dataset_shards import write_shards
+from postgres_loader import iter_input, load_universities
+
+DATASET = "app/assets/world_universities_and_domains.json"
+
+# Never a production database: every test works in a schema of its own and drops it
+DSN = os.getenv("TEST_DATABASE_URL")
+pytestmark = pytest.mark.skipif(not DSN, reason="TEST_DATABASE_URL is not set")
+
+
+@pytest.fixture
+def conn():
+    schema = f"test_loader_{uuid.uuid4().hex[:8]}"
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        conn.execute(f"CREATE SCHEMA {schema}")
+        conn.execute(f"SET search_path TO {schema}")
+        try:
+            yield conn
+        finally:
+            conn.execute(f"DROP SCHEMA {schema} CASCADE")
+
+
+@pytest.fixture(scope="module")
+def universities():
+    return list(iter_input(DATASET))
+
+
+def row_count(conn, where="TRUE", *params):
+    return conn.execute(f"SELECT COUNT(*) FROM universities WHERE {where}", params).fetchone()[0]
+
+
+def test_reload_of_unchanged_file_writes_nothing(conn, universities):
+    first = load_universities(conn, iter_input(DATASET))
+    assert first["inserted"] == first["copied"] == len(universities) - first["skipped"]
+    assert row_count(conn) == first["inserted"]
+
+    again = load_universities(conn, iter_input(DATASET))
+    assert again["inserted"] == again["updated"] == again["deleted"] == 0
+
+
+def test_changed_row_is_updated(conn, universities):
+    load_universities(conn, universities)
+    changed = copy.deepcopy(universities)
+    changed[0]["state"] = "ZZ"
+    changed[1]["web_pages"] = ["https://example.edu/"]
+
+    counts = load_universities(conn, changed)
+    assert (counts["inserted"], counts["updated"]) == (0, 2)
+    assert row_count(conn, "name = %s AND state = 'ZZ'", changed[0]["name"]) == 1
+
+
+def test_prune_deletes_rows_missing_from_the_input(conn, universities):
+    load_universities(conn, universities)
+    removed = universities[0]
+    counts = load_universities(conn, universities[1:], prune=True)
+    assert counts["deleted"] == 1
+    assert row_count(conn, "name = %s AND country = %s", removed["name"], removed["country"]) == 0
+
+
+def test_prune_with_country_keeps_other_countries(conn, universities, tmp_path):
+    load_universities(conn, universities)
+    shard_dir = str(tmp_path / "shards")
+    write_shards(universities, shard_dir)
+    canada = [university for university in universities if university["country"] == "Canada"]
+    others = row_count(conn, "country <> 'Canada'")
+
+    # A Canadian school dropped upstream is deleted, no other country is touched
+    shard = list(iter_input(shard_dir, ["CA"]))
+    counts = load_universities(conn, shard[1:], prune=True, countries_only=True)
+    assert counts["deleted"] == 1
+    assert row_count(conn, "country = 'Canada'") == len(canada) - 1
+    assert row_count(conn, "country <> 'Canada'") == others
+
+    # Without --country the same load prunes everything else
+    counts = load_universities(conn, shard[1:], prune=True)
+    assert counts["deleted"] == others
+    assert row_count(conn) == len(canada) - 1
+
+
+def test_failed_copy_rolls_back(conn, universities):
+    load_universities(conn, universities)
+    before = row_count(conn)
+    broken = copy.deepcopy(universities)
+    broken[0]["state"] = "ZZ"
+    broken.append({"name": "x" * 300, "country": "Nowhere"})  # longer than the name column
+
+    with pytest.raises(psycopg.errors.DataError):
+        load_universities(conn, broken)
+    assert row_count(conn) == before
+    assert row_count(conn, "state = 'ZZ'") == 0
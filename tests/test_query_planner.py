@@ -0,0 +1,82 @@
+import json
+
+from query_planner import MAX_DOMAIN_GROUP, agreeing_members, plan_queries, province_state, registrable_domain
+
+DATASET = "app/assets/world_universities_and_domains.json"
+
+
+def university(name, domain, country="United States", province=None):
+    return {"name": name, "country": country, "domains": [domain], "state-province": province}
+
+
+def test_registrable_domain():
+    assert registrable_domain("student.eit.edu.au") == "eit.edu.au"
+    assert registrable_domain("cs.stanford.edu") == "stanford.edu"
+    assert registrable_domain("edu.au") is None
+    assert registrable_domain("iitb.ernet.in") is None
+    assert registrable_domain("westfield.mass.edu") is None
+
+
+def test_records_sharing_a_domain_are_grouped():
+    plan = plan_queries([
+        university("University of Maine at Farmington", "farmington.maine.edu"),
+        university("University of Maine at Machias", "machias.maine.edu"),
+        university("Bates College", "bates.edu"),
+    ])
+    assert [len(group.members) for group in plan.groups] == [2, 1]
+    assert plan.groups[0].query == "University of Maine at Farmington United States"
+    assert plan.saved_by_domain == 1
+
+
+def test_same_named_schools_do_not_chain_domains():
+    plan = plan_queries([
+        university("Westfield State College", "wsc.ma.edu", province="MA"),
+        university("Middlesex Community College", "mxcc.ma.edu", province="MA"),
+        university("Middlesex Community College", "mxcc.ct.edu", province="CT"),
+        university("Manchester Community College", "mcc.ct.edu", province="CT"),
+    ])
+    for group in plan.groups:
+        # Only records sending the same query share a lookup across states
+        if len({member["name"] for member in group.members}) > 1:
+            assert len({province_state(member) for member in group.members} - {None}) <= 1
+    # The two Middlesex colleges share a query, so neither joins a domain group
+    assert sorted(len(group.members) for group in plan.groups) == [1, 1, 2]
+
+
+def test_domain_group_is_refused_when_provinces_disagree():
+    plan = plan_queries([
+        university("Indian Institute of Technology Bombay", "iitb.example.in", "India", "Maharashtra"),
+        university("Indian Institute of Technology Delhi", "iitd.example.in", "India", "Delhi"),
+    ])
+    assert len(plan.groups) == 2
+
+
+def test_domain_group_size_is_capped():
+    plan = plan_queries([university(f"College {i}", f"c{i}.system.edu") for i in range(MAX_DOMAIN_GROUP + 1)])
+    assert len(plan.groups) == MAX_DOMAIN_GROUP + 1
+
+
+def test_result_only_applies_to_agreeing_members():
+    members = [
+        university("Middlesex Community College", "mxcc.edu", province="Massachusetts"),
+        university("Middlesex Community College", "mxcc.edu", province="Connecticut"),
+        university("Middlesex Community College", "mxcc.edu"),
+    ]
+    assert agreeing_members(members, "CT") == members[1:]
+
+
+def test_province_names_match_their_state_exactly():
+    assert province_state(university("West Virginia University", "wvu.edu", province="West Virginia")) == "WV"
+    assert province_state(university("Bard College", "bard.edu", province="ny")) == "NY"
+    assert province_state(university("Curtin University", "curtin.edu.au", "Australia", "Western Australia")) == "WA"
+    members = [university("West Virginia University", "wvu.edu", province="West Virginia")]
+    assert agreeing_members(members, "WV") == members
+    assert agreeing_members(members, "VA") == []
+
+
+def test_no_group_spans_states_on_the_bundled_dataset():
+    with open(DATASET, encoding="utf-8") as f:
+        plan = plan_queries(json.load(f))
+    for group in plan.groups:
+        assert len(group.members) <= MAX_DOMAIN_GROUP or len({member["name"] for member in group.members}) == 1
+        assert len({province_state(member) for member in group.members} - {None}) <= 1, group
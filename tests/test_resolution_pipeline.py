@@ -0,0 +1,57 @@
+import pytest
+
+from enhance_universities_with_google_api import GooglePlacesAPI
+from geocoding_cache import GeocodingCache
+from query_planner import plan_queries, university_query
+from resolution_pipeline import CacheTier, DomainTier, LocalTier, NominatimTier, ResolutionPipeline, Tier
+from university_store import UniversityStore
+
+
+def place_in(state):
+    return {"address_components": [{"short_name": state, "types": ["administrative_area_level_1"]}]}
+
+
+def campuses():
+    return [
+        {"name": "Maine Community College at Farmington", "country": "United States",
+         "domains": ["farmington.mccs.edu"]},
+        {"name": "Maine Community College at Machias", "country": "United States",
+         "domains": ["machias.mccs.edu"]},
+        {"name": "Maine Community College Online", "country": "United States",
+         "domains": ["online.mccs.edu"], "state-province": "New Hampshire"},
+    ]
+
+
+def test_cache_tier_answers_every_member_of_a_cached_group(tmp_path):
+    universities = campuses()
+    group = plan_queries(universities).groups[0]
+    assert len(group.members) == 3
+
+    with GeocodingCache(str(tmp_path / "cache.sqlite3")) as cache:
+        # A remote tier caches the answer under the group's query only
+        cache.store(GooglePlacesAPI.provider, group.query, place_in("ME"))
+        ResolutionPipeline([CacheTier(cache)]).run(universities)
+
+    # The member naming another state does not take the group's answer
+    assert [university.get("state") for university in universities] == ["ME", "ME", None]
+
+
+def test_cache_tier_tries_the_members_own_queries(tmp_path):
+    universities = campuses()
+    with GeocodingCache(str(tmp_path / "cache.sqlite3")) as cache:
+        # Cached by an earlier run whose group had the second campus as its query
+        cache.store(GooglePlacesAPI.provider, university_query(universities[1]), place_in("ME"))
+        CacheTier(cache).run(universities, universities, UniversityStore(universities))
+
+    assert [university.get("state") for university in universities] == ["ME", "ME", None]
+
+
+def test_tier_bases_are_abstract():
+    for base in (Tier, LocalTier):
+        with pytest.raises(TypeError):
+            base()
+    # Remote tiers plan their own lookups and answer no single record
+    assert not hasattr(NominatimTier, "resolve")
+    record = {"name": "Grand Rapids Community College", "country": "United States", "alpha_two_code": "US",
+              "domains": ["grcc.cc.mi.us"]}
+    assert DomainTier().resolve(record) == "MI"
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from university_columnar import ColumnarUniversities, write_columnar
+
+DATASET = "app/assets/world_universities_and_domains.json"
+
+# Records whose values do not fit their columns, or carry fields no column holds
+UNUSUAL = [
+    {"name": "Bates College", "domains": ["bates.edu"], "web_pages": ["http://www.bates.edu/", "https://x.org/"],
+     "country": "United States", "alpha_two_code": "US", "state-province": None, "state": "ME"},
+    {"country": "Canada", "name": "Key Order College", "alpha_two_code": "CA", "domains": [], "web_pages": []},
+    {"name": 42, "domains": "not-a-list.edu", "web_pages": ["http://\0odd/"], "country": ["US"],
+     "alpha_two_code": None, "founded": 1855, "tags": {"private": True}},
+    {"name": "Ünïcødé Üniversität 大学", "domains": ["uni.de", ""], "web_pages": ["http://uni.de/"],
+     "country": "Germany", "alpha_two_code": "DE", "state-province": "Bavaria"},
+    {},
+]
+
+
+def read_back(tmp_path, universities):
+    path = str(tmp_path / "universities.ucol")
+    write_columnar(universities, path)
+    return ColumnarUniversities(path)
+
+
+def test_bundled_dataset_round_trips(tmp_path):
+    with open(DATASET, encoding="utf-8") as f:
+        universities = json.load(f)
+    with read_back(tmp_path, universities) as reader:
+        records = list(reader)
+        assert records == universities
+        assert [list(record) for record in records] == [list(university) for university in universities]
+        assert reader.column("name") == [university["name"] for university in universities]
+
+
+def test_unusual_records_round_trip_with_their_key_order(tmp_path):
+    with read_back(tmp_path, UNUSUAL) as reader:
+        assert len(reader) == len(UNUSUAL)
+        assert list(reader) == UNUSUAL
+        for index, university in enumerate(UNUSUAL):
+            assert reader[index] == university
+            assert list(reader[index]) == list(university)
+
+
+def test_single_values_and_columns_agree(tmp_path):
+    with read_back(tmp_path, UNUSUAL) as reader:
+        for field in ("domains", "web_pages", "state"):
+            assert reader.column(field) == [reader.value(index, field) for index in range(len(reader))]
+        assert reader.value(0, "web_pages") == UNUSUAL[0]["web_pages"]
+        with pytest.raises(IndexError):
+            reader[len(UNUSUAL)]
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "universities.json"
+    path.write_text("[]" + " " * 64, encoding="utf-8")
+    with pytest.raises(ValueError):
+        ColumnarUniversities(str(path))
@@ -0,0 +1,89 @@
+import json
+import pickle
+
+import pytest
+
+from campusly_data import main as campusly_data
+from university_record import University, compact_universities, load_records
+from university_stream import write_universities
+
+DATASET = "app/assets/world_universities_and_domains.json"
+
+BATES = {"name": "Bates College", "domains": ["bates.edu"], "web_pages": ["http://www.bates.edu/"],
+         "country": "United States", "alpha_two_code": "US", "state-province": None}
+
+
+def test_reads_like_the_dict():
+    record = University(BATES)
+    assert dict(record) == {**BATES, "domains": ("bates.edu",), "web_pages": ("http://www.bates.edu/",)}
+    assert list(record) == list(BATES)
+    assert len(record) == len(BATES)
+    assert record["domains"] == ("bates.edu",)
+    assert record["state-province"] is None and "state-province" in record
+    assert "state" not in record and record.get("state", "-") == "-"
+    with pytest.raises(KeyError):
+        record["state"]
+    with pytest.raises(AttributeError):
+        record.founded = 1855
+
+
+def test_to_dict_gives_back_the_json_shape():
+    unusual = {"country": "Canada", "name": "Key Order College", "founded": 1855, "domains": "not-a-list.ca",
+               "alpha_two_code": "CA", "tags": {"private": True}}
+    for university in (BATES, unusual, {}):
+        result = University(university).to_dict()
+        assert result == university
+        assert list(result) == list(university)
+        assert json.dumps(result) == json.dumps(university)
+
+
+def test_writes_and_deletes_keep_the_key_order():
+    record = University(BATES)
+    record["state"] = "ME"
+    record["founded"] = 1855
+    record["domains"] = ["bates.edu", "bates.org"]
+    assert list(record)[-2:] == ["state", "founded"]
+    assert record.to_dict()["domains"] == ["bates.edu", "bates.org"]
+
+    del record["name"], record["founded"]
+    assert list(record) == ["domains", "web_pages", "country", "alpha_two_code", "state-province", "state"]
+    with pytest.raises(KeyError):
+        del record["founded"]
+
+    record.update({"name": "Bates", "state": "NH"})
+    assert record.to_dict() == {**BATES, "domains": ["bates.edu", "bates.org"], "state": "NH", "name": "Bates"}
+
+
+def test_shared_strings_and_layouts():
+    first, second = University(dict(BATES)), University(json.loads(json.dumps(BATES)))
+    assert first.country is second.country
+    assert first._layout is second._layout
+
+
+def test_pickles_for_worker_processes():
+    record = University({**BATES, "founded": 1855})
+    copy = pickle.loads(pickle.dumps(record))
+    assert copy == record and "state" not in copy
+
+
+def test_compact_records_write_byte_for_byte_like_the_dicts(tmp_path):
+    with open(DATASET, encoding="utf-8") as f:
+        universities = json.load(f)
+    records = load_records(DATASET)
+    assert all(isinstance(record, University) for record in records)
+    assert [record.to_dict() for record in records] == universities
+    assert next(compact_universities(records[:1])) is records[0]
+
+    dict_path, record_path = tmp_path / "dicts.json", tmp_path / "records.json"
+    write_universities(universities, str(dict_path))
+    write_universities(records, str(record_path))
+    assert record_path.read_bytes() == dict_path.read_bytes()
+
+
+def test_compact_pipeline_exports_the_same_file(tmp_path):
+    outputs = []
+    for flags in ([], ["--compact"]):
+        output = tmp_path / f"out{len(outputs)}.json"
+        campusly_data(["--input", DATASET, *flags, "export", "--output", str(output)])
+        outputs.append(output.read_bytes())
+    assert outputs[0] == outputs[1]
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from university_stream import iter_universities, write_universities
+
+DATASET = "app/assets/world_universities_and_domains.json"
+
+RECORDS = [
+    {"name": "Ünïcødé \"Quoted\" College", "domains": ["a.edu"], "rank": 2.5, "founded": 1855},
+    {"name": "Nested", "tags": {"list": [1, 2.0, None, True]}, "empty": [], "object": {}},
+    {},
+]
+
+
+def test_reads_the_bundled_dataset_in_small_chunks():
+    with open(DATASET, encoding="utf-8") as f:
+        universities = json.load(f)
+    assert list(iter_universities(DATASET, chunk_size=7)) == universities
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 64, 1 << 16])
+def test_values_split_across_chunks(tmp_path, chunk_size):
+    path = tmp_path / "records.json"
+    # Compact layout, so numbers sit right at chunk boundaries
+    path.write_text(json.dumps(RECORDS + [12.75, -3, "x"], separators=(",", ":")), encoding="utf-8")
+    assert list(iter_universities(str(path), chunk_size)) == RECORDS + [12.75, -3, "x"]
+
+
+def test_writes_what_json_dump_writes(tmp_path):
+    path = tmp_path / "out.json"
+    assert write_universities(iter(RECORDS), str(path)) == len(RECORDS)
+    assert path.read_text(encoding="utf-8") == json.dumps(RECORDS, indent=2, ensure_ascii=False)
+
+    assert write_universities([], str(path)) == 0
+    assert path.read_text(encoding="utf-8") == json.dumps([], indent=2)
+
+
+def test_streaming_a_file_onto_itself(tmp_path):
+    path = str(tmp_path / "out.json")
+    write_universities(RECORDS, path)
+    write_universities(({**record, "seen": True} for record in iter_universities(path, 4)), path)
+    assert list(iter_universities(path)) == [{**record, "seen": True} for record in RECORDS]
+
+
+def test_failed_write_keeps_the_previous_file(tmp_path):
+    path = tmp_path / "out.json"
+    write_universities(RECORDS, str(path))
+
+    def failing():
+        yield RECORDS[0]
+        raise RuntimeError("interrupted")
+
+    with pytest.raises(RuntimeError):
+        write_universities(failing(), str(path))
+    assert json.loads(path.read_text(encoding="utf-8")) == RECORDS
+    assert [item.name for item in tmp_path.iterdir()] == ["out.json"]
+
+
+@pytest.mark.parametrize("text", ['{"name": "x"}', '[{"name": "x"} {"name": "y"}]', '[{"name": "x"},'])
+def test_rejects_malformed_arrays(tmp_path, text):
+    path = tmp_path / "bad.json"
+    path.write_text(text, encoding="utf-8")
+    with pytest.raises(ValueError):
+        list(iter_universities(str(path)))
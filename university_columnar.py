@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Compact columnar binary format for the universities dataset.
+
+The JSON file repeats every key, country and country code in each record.
+This format stores each field as a column instead:
+
+- name: one UTF-8 blob plus an offsets array
+- domains: per-record list offsets into a string column of that kind
+- web_pages: per-record list offsets into 32-bit codes for an interned
+  table of URL templates, with the record's first domain replaced by a
+  placeholder ("http://www.\\0/"), since nearly every URL is built that way
+- country, alpha_two_code, state-province, state: interned tables of the
+  distinct values plus a 16-bit code per record (0 means null)
+
+Each record also has a layout id pointing at the ordered list of keys it
+had, so records read back are equal to the originals and keep their key
+order. Any value that does not fit its column (or any other field) is kept
+as JSON in a per-record "extras" blob.
+
+File layout, all integers little-endian:
+
+    magic b"UNIVCOL\\0", version u32, record count u32, section count u32
+    section table: name (32 bytes, NUL-padded), offset u32, length u32
+    sections, each starting on a 4-byte boundary
+
+ColumnarUniversities reads the file through mmap and memoryview. Opening
+it only parses the header; values are decoded when a record or column is
+accessed.
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from typing import Dict, Iterator, List, Optional
+
+MAGIC = b"UNIVCOL\0"
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("<8sIII")
+_SECTION = struct.Struct("<32sII")
+
+STRING_COLUMNS = ("name",)
+LIST_COLUMNS = ("domains",)
+TEMPLATED_COLUMNS = ("web_pages",)
+INTERNED_COLUMNS = ("country", "alpha_two_code", "state-province", "state")
+COLUMN_FIELDS = STRING_COLUMNS + LIST_COLUMNS + TEMPLATED_COLUMNS + INTERNED_COLUMNS
+
+# Stands for the record's first domain inside a web_pages template
+DOMAIN_PLACEHOLDER = "\0"
+
+NULL_CODE = 0
+MAX_INTERNED = 0xFFFF  # codes are u16 and 0 is reserved for null
+
+
+def _u32_array(values: List[int]) -> bytes:
+    data = array("I", values)
+    if sys.byteorder != "little":
+        data.byteswap()
+    return data.tobytes()
+
+
+def _u16_array(values: List[int]) -> bytes:
+    data = array("H", values)
+    if sys.byteorder != "little":
+        data.byteswap()
+    return data.tobytes()
+
+
+def _string_column(strings: List[str]):
+    """(offsets, blob) for a list of strings; string i is blob[offsets[i]:offsets[i + 1]]."""
+    offsets = [0]
+    parts = []
+    total = 0
+    for string in strings:
+        encoded = string.encode("utf-8")
+        parts.append(encoded)
+        total += len(encoded)
+        offsets.append(total)
+    return _u32_array(offsets), b"".join(parts)
+
+
+def _fits(field: str, value) -> bool:
+    """Whether a value can be stored in its field's column rather than in extras."""
+    if field in STRING_COLUMNS:
+        return isinstance(value, str)
+    if field in LIST_COLUMNS or field in TEMPLATED_COLUMNS:
+        return isinstance(value, (list, tuple)) and all(
+            isinstance(item, str) and DOMAIN_PLACEHOLDER not in item for item in value
+        )
+    return value is None or isinstance(value, str)
+
+
+def _anchor_domain(university: Dict) -> Optional[str]:
+    """The domain web pages are stored relative to: the record's first domain."""
+    domains = university.get("domains")
+    if domains and _fits("domains", domains) and domains[0]:
+        return domains[0]
+    return None
+
+
+def encode_columnar(universities: List[Dict]) -> bytes:
+    """Encode a universities list in the columnar format."""
+    sections: Dict[str, bytes] = {}
+    count = len(universities)
+
+    layouts: Dict[tuple, int] = {}
+    layout_ids = []
+    extras = []
+    for university in universities:
+        layout_ids.append(layouts.setdefault(tuple(university), len(layouts)))
+        extra = {
+            key: value for key, value in university.items()
+            if key not in COLUMN_FIELDS or not _fits(key, value)
+        }
+        extras.append(json.dumps(extra, ensure_ascii=False) if extra else "")
+    if len(layouts) > MAX_INTERNED:
+        raise ValueError(f"Too many distinct key layouts ({len(layouts)})")
+    sections["layouts"] = json.dumps([list(keys) for keys in layouts], ensure_ascii=False).encode("utf-8")
+    sections["layout_ids"] = _u16_array(layout_ids)
+    sections["extras.off"], sections["extras.blob"] = _string_column(extras)
+
+    def column_value(university: Dict, field: str, default):
+        value = university.get(field, default)
+        return value if _fits(field, value) else default
+
+    for field in STRING_COLUMNS:
+        values = [column_value(university, field, "") for university in universities]
+        sections[f"{field}.off"], sections[f"{field}.blob"] = _string_column(values)
+
+    for field in LIST_COLUMNS:
+        list_offsets = [0]
+        items: List[str] = []
+        for university in universities:
+            items.extend(column_value(university, field, []))
+            list_offsets.append(len(items))
+        sections[f"{field}.list"] = _u32_array(list_offsets)
+        sections[f"{field}.off"], sections[f"{field}.blob"] = _string_column(items)
+
+    for field in TEMPLATED_COLUMNS:
+        # "http://www.stanford.edu/" is stored as the template "http://www.\0/",
+        # so a handful of interned templates cover most records
+        list_offsets = [0]
+        table: Dict[str, int] = {}
+        codes = []
+        for university in universities:
+            anchor = _anchor_domain(university)
+            for item in column_value(university, field, []):
+                if anchor and anchor in item:
+                    item = item.replace(anchor, DOMAIN_PLACEHOLDER, 1)
+                codes.append(table.setdefault(item, len(table)))
+            list_offsets.append(len(codes))
+        sections[f"{field}.list"] = _u32_array(list_offsets)
+        sections[f"{field}.codes"] = _u32_array(codes)
+        sections[f"{field}.toff"], sections[f"{field}.tblob"] = _string_column(list(table))
+
+    for field in INTERNED_COLUMNS:
+        table = {}
+        codes = []
+        for university in universities:
+            value = column_value(university, field, None)
+            codes.append(NULL_CODE if value is None else table.setdefault(value, len(table) + 1))
+        if len(table) >= MAX_INTERNED:
+            raise ValueError(f"Too many distinct values for {field} ({len(table)})")
+        sections[f"{field}.codes"] = _u16_array(codes)
+        sections[f"{field}.toff"], sections[f"{field}.tblob"] = _string_column(list(table))
+
+    header_size = _HEADER.size + _SECTION.size * len(sections)
+    table_entries = []
+    body = bytearray()
+    for name, data in sections.items():
+        body.extend(b"\0" * (-(header_size + len(body)) % 4))
+        table_entries.append(_SECTION.pack(name.encode("ascii"), header_size + len(body), len(data)))
+        body.extend(data)
+    return _HEADER.pack(MAGIC, FORMAT_VERSION, count, len(sections)) + b"".join(table_entries) + bytes(body)
+
+
+def write_columnar(universities: List[Dict], file_path: str) -> int:
+    """Write universities in the columnar format; returns the file size in bytes."""
+    data = encode_columnar(universities)
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, file_path)
+    return len(data)
+
+
+class ColumnarUniversities:
+    """Read-only, lazily decoded view of a columnar universities file."""
+
+    def __init__(self, file_path: str):
+        self._file = open(file_path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        self._sections: Dict[str, memoryview] = {}
+        self._int_views: Dict[str, memoryview] = {}
+        self._tables: Dict[str, List[Optional[str]]] = {}
+
+        magic, version, count, section_count = _HEADER.unpack_from(self._view, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"Not a columnar universities file: {file_path}")
+        if version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"Unsupported columnar format version {version} in {file_path}")
+        self.count = count
+
+        for i in range(section_count):
+            name, offset, length = _SECTION.unpack_from(self._view, _HEADER.size + i * _SECTION.size)
+            self._sections[name.rstrip(b"\0").decode("ascii")] = self._view[offset:offset + length]
+
+        self._layouts = [tuple(keys) for keys in json.loads(bytes(self._sections["layouts"]))]
+
+    def _ints(self, section: str, typecode: str):
+        if section not in self._int_views:
+            view = self._sections[section]
+            if sys.byteorder == "little":
+                ints = view.cast(typecode)  # zero-copy
+            else:
+                ints = array(typecode, view.tobytes())
+                ints.byteswap()
+            self._int_views[section] = ints
+        return self._int_views[section]
+
+    def _string(self, field: str, index: int, offsets_section: str = "off", blob_section: str = "blob") -> str:
+        offsets = self._ints(f"{field}.{offsets_section}", "I")
+        blob = self._sections[f"{field}.{blob_section}"]
+        return str(blob[offsets[index]:offsets[index + 1]], "utf-8")
+
+    def _strings(self, field: str, offsets_section: str = "off", blob_section: str = "blob") -> List[str]:
+        """Every string of a string column, decoded in one pass."""
+        offsets = self._ints(f"{field}.{offsets_section}", "I").tolist()
+        blob = self._sections[f"{field}.{blob_section}"].tobytes()
+        return [blob[start:end].decode("utf-8") for start, end in zip(offsets, offsets[1:])]
+
+    def _table(self, field: str) -> List[Optional[str]]:
+        """Interned values of a field, decoded once; for INTERNED_COLUMNS index 0 is null."""
+        if field not in self._tables:
+            values = self._strings(field, "toff", "tblob")
+            self._tables[field] = [None] + values if field in INTERNED_COLUMNS else values
+        return self._tables[field]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def value(self, index: int, field: str):
+        """One field of one record, decoding only that value."""
+        if field in STRING_COLUMNS:
+            return self._string(field, index)
+        if field in INTERNED_COLUMNS:
+            return self._table(field)[self._ints(f"{field}.codes", "H")[index]]
+
+        list_offsets = self._ints(f"{field}.list", "I")
+        items = range(list_offsets[index], list_offsets[index + 1])
+        if field in LIST_COLUMNS:
+            return [self._string(field, item) for item in items]
+        table = self._table(field)
+        codes = self._ints(f"{field}.codes", "I")
+        domains = self.value(index, "domains")
+        anchor = domains[0] if domains else ""
+        return [table[codes[item]].replace(DOMAIN_PLACEHOLDER, anchor, 1) for item in items]
+
+    def column(self, field: str) -> List:
+        """All values of a column, in dataset order."""
+        if field in STRING_COLUMNS:
+            return self._strings(field)
+        if field in INTERNED_COLUMNS:
+            table = self._table(field)
+            return [table[code] for code in self._ints(f"{field}.codes", "H")]
+
+        list_offsets = self._ints(f"{field}.list", "I").tolist()
+        if field in LIST_COLUMNS:
+            items = self._strings(field)
+            return [items[start:end] for start, end in zip(list_offsets, list_offsets[1:])]
+        table = self._table(field)
+        items = [table[code] for code in self._ints(f"{field}.codes", "I")]
+        anchors = [domains[0] if domains else "" for domains in self.column("domains")]
+        return [
+            [item.replace(DOMAIN_PLACEHOLDER, anchor, 1) for item in items[start:end]]
+            for start, end, anchor in zip(list_offsets, list_offsets[1:], anchors)
+        ]
+
+    def __getitem__(self, index: int) -> Dict:
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        extras_text = self._string("extras", index)
+        extras = json.loads(extras_text) if extras_text else {}
+        return {
+            key: extras[key] if key in extras else self.value(index, key)
+            for key in self._layouts[self._ints("layout_ids", "H")[index]]
+        }
+
+    def __iter__(self) -> Iterator[Dict]:
+        """Every record, decoding each column in bulk first."""
+        columns = {field: self.column(field) for field in COLUMN_FIELDS}
+        extras = self._strings("extras")
+        for index, layout_id in enumerate(self._ints("layout_ids", "H")):
+            extra = json.loads(extras[index]) if extras[index] else {}
+            yield {
+                key: extra[key] if key in extra else columns[key][index]
+                for key in self._layouts[layout_id]
+            }
+
+    def close(self):
+        # Views into the mmap must be released before it can be closed
+        for view in list(self._int_views.values()) + list(self._sections.values()):
+            if isinstance(view, memoryview):
+                view.release()
+        self._int_views = {}
+        self._sections = {}
+        self._view.release()
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def compare_with_json(json_file: str, columnar_file: str):
+    """Print file sizes and load times of the JSON and columnar versions."""
+    json_size = os.path.getsize(json_file)
+    columnar_size = os.path.getsize(columnar_file)
+
+    start = time.perf_counter()
+    with open(json_file, 'r', encoding='utf-8') as f:
+        universities = json.load(f)
+    json_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    reader = ColumnarUniversities(columnar_file)
+    open_seconds = time.perf_counter() - start
+    names = reader.column("name")
+    countries = reader.column("country")
+    columns_seconds = time.perf_counter() - start
+    records = list(reader)
+    all_seconds = time.perf_counter() - start
+
+    identical = records == universities and [list(r) for r in records] == [list(u) for u in universities]
+    reader.close()
+
+    print(f"Size: {json_size} bytes JSON, {columnar_size} bytes columnar "
+          f"({json_size / columnar_size:.1f}x smaller)")
+    print(f"json.load:                     {json_seconds * 1000:8.2f} ms")
+    print(f"open columnar:                 {open_seconds * 1000:8.2f} ms ({json_seconds / open_seconds:.0f}x faster)")
+    print(f"open + name/country columns:   {columns_seconds * 1000:8.2f} ms "
+          f"({json_seconds / columns_seconds:.1f}x faster, {len(names)} names, {len(set(countries))} countries)")
+    print(f"open + decode every record:    {all_seconds * 1000:8.2f} ms ({json_seconds / all_seconds:.1f}x)")
+    print(f"{'✅' if identical else '❌'} Records read back {'match' if identical else 'differ from'} the JSON file")
+    return identical
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Export the universities list in the columnar format.")
+    parser.add_argument("--input", default="app/assets/world_universities_and_domains.json",
+                        help="universities JSON file to export")
+    parser.add_argument("--output", default="app/assets/world_universities_and_domains.ucol",
+                        help="where to write the columnar file")
+    parser.add_argument("--compare", action="store_true",
+                        help="measure size and load time against the JSON file and check the round trip")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    with open(args.input, 'r', encoding='utf-8') as f:
+        universities = json.load(f)
+    size = write_columnar(universities, args.output)
+    print(f"✅ Wrote {len(universities)} universities to {args.output} ({size} bytes)")
+    if args.compare:
+        sys.exit(0 if compare_with_json(args.input, args.output) else 1)
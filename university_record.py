@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Compact in-memory representation of a university record.
+
+A record parsed from the JSON file is a dict with its own copy of every
+key ("alpha_two_code", "state-province", ...) and of every value, lists
+for domains and web_pages, and a hash table sized for growth. University
+keeps the same data in __slots__:
+
+- Country, country code and state strings are interned, so the few hundred
+  distinct values are shared by all records.
+- Domains and web pages are tuples.
+- The key order is a layout tuple shared by all records with the same keys.
+- Fields the dataset does not normally have go into a small extra dict.
+
+A University behaves like the dict it came from (get, [], in, items,
+update, iteration in key order), so the planners, the state extraction
+and UniversityStore accept it unchanged. to_dict() gives back exactly the
+JSON shape, and write_universities() writes it byte for byte like the
+dict.
+
+    python university_record.py                       # tracemalloc report on the bundled file
+    python university_record.py --input big.json      # ... or on any other list
+"""
+
+import argparse
+import sys
+import time
+import tracemalloc
+from collections.abc import MutableMapping
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# JSON key -> slot, in the dataset's usual key order
+FIELD_SLOTS = {
+    "name": "name",
+    "domains": "domains",
+    "web_pages": "web_pages",
+    "country": "country",
+    "alpha_two_code": "alpha_two_code",
+    "state-province": "state_province",
+    "state": "state",
+}
+LIST_FIELDS = ("domains", "web_pages")
+INTERNED_FIELDS = ("country", "alpha_two_code", "state-province", "state")
+
+
+class _Missing:
+    """Marks a field the record does not have, as opposed to one that is null."""
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return "<missing>"
+
+
+_MISSING = _Missing()
+
+# Key order tuples, shared by every record with the same keys
+_LAYOUTS: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+
+def _layout(keys: Tuple[str, ...]) -> Tuple[str, ...]:
+    layout = _LAYOUTS.get(keys)
+    if layout is None:
+        layout = _LAYOUTS[keys] = tuple(sys.intern(key) for key in keys)
+    return layout
+
+
+def _compact(key: str, value):
+    if key in LIST_FIELDS and isinstance(value, list):
+        return tuple(value)
+    if key in INTERNED_FIELDS and isinstance(value, str):
+        return sys.intern(value)
+    return value
+
+
+class University(MutableMapping):
+    """A university record in __slots__; reads and writes like the dict it was made from."""
+
+    __slots__ = ("name", "domains", "web_pages", "country", "alpha_two_code", "state_province", "state",
+                 "_layout", "_extra")
+
+    def __init__(self, fields: Optional[Dict] = None):
+        self.name = self.domains = self.web_pages = self.country = _MISSING
+        self.alpha_two_code = self.state_province = self.state = _MISSING
+        self._layout: Tuple[str, ...] = _layout(())
+        self._extra: Optional[Dict] = None
+        if fields:
+            self._set_all(fields)
+
+    def _set_all(self, fields: Dict):
+        intern = sys.intern
+        extra = None
+        for key, value in fields.items():
+            if key == "name":
+                self.name = value
+            elif key == "domains" or key == "web_pages":
+                setattr(self, key, tuple(value) if isinstance(value, list) else value)
+            elif key in FIELD_SLOTS:
+                setattr(self, FIELD_SLOTS[key], intern(value) if isinstance(value, str) else value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        keys = tuple(fields)
+        self._layout = _LAYOUTS.get(keys) or _layout(keys)
+        self._extra = extra
+
+    @classmethod
+    def from_dict(cls, university: Dict) -> "University":
+        return cls(university)
+
+    def to_dict(self) -> Dict:
+        """The record in its JSON shape: same keys, same order, lists for domains and web pages."""
+        result = {}
+        for key in self._layout:
+            value = self[key]
+            result[key] = list(value) if key in LIST_FIELDS and isinstance(value, tuple) else value
+        return result
+
+    def __getitem__(self, key: str):
+        slot = FIELD_SLOTS.get(key)
+        if slot is not None:
+            value = getattr(self, slot)
+            if value is not _MISSING:
+                return value
+        elif self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key: str, default=None):
+        slot = FIELD_SLOTS.get(key)
+        if slot is not None:
+            value = getattr(self, slot)
+            return default if value is _MISSING else value
+        if self._extra is not None:
+            return self._extra.get(key, default)
+        return default
+
+    def __contains__(self, key) -> bool:
+        slot = FIELD_SLOTS.get(key)
+        if slot is not None:
+            return getattr(self, slot) is not _MISSING
+        return self._extra is not None and key in self._extra
+
+    def __setitem__(self, key: str, value):
+        if key not in self:
+            self._layout = _layout(self._layout + (key,))
+        slot = FIELD_SLOTS.get(key)
+        if slot is not None:
+            setattr(self, slot, _compact(key, value))
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key: str):
+        if key not in self:
+            raise KeyError(key)
+        slot = FIELD_SLOTS.get(key)
+        if slot is not None:
+            setattr(self, slot, _MISSING)
+        else:
+            del self._extra[key]
+            if not self._extra:
+                self._extra = None
+        self._layout = _layout(tuple(other for other in self._layout if other != key))
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._layout)
+
+    def __len__(self) -> int:
+        return len(self._layout)
+
+    def __repr__(self) -> str:
+        return f"University({self.to_dict()!r})"
+
+    def __reduce__(self):
+        # The missing-field marker is not shared between processes
+        return University.from_dict, (self.to_dict(),)
+
+
+def compact_universities(universities: Iterable[Dict]) -> Iterator[University]:
+    """University records for dicts, converting one at a time."""
+    for university in universities:
+        yield university if isinstance(university, University) else University.from_dict(university)
+
+
+def load_records(file_path: str) -> List[University]:
+    """The universities of a JSON file as University records, without holding the dicts."""
+    from university_stream import iter_universities
+
+    return list(compact_universities(iter_universities(file_path)))
+
+
+def _measure(load) -> Tuple[object, int, float]:
+    """(result, bytes still allocated by it, seconds) of load()."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = load()
+    seconds = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size, seconds
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Compare the memory of dict and University records.")
+    parser.add_argument("--input", default="app/assets/world_universities_and_domains.json",
+                        help="universities JSON file to load both ways")
+    return parser.parse_args()
+
+
+def main():
+    from university_stream import iter_universities
+
+    args = parse_args()
+    dicts, dict_bytes, dict_seconds = _measure(lambda: list(iter_universities(args.input)))
+    records, record_bytes, record_seconds = _measure(lambda: load_records(args.input))
+
+    lossless = all(record.to_dict() == university for record, university in zip(records, dicts))
+    count = len(records)
+    print(f"📖 {count} universities from {args.input}")
+    print(f"🧮 dict records:       {dict_bytes / 2**20:8.1f} MiB, {dict_bytes / count:6.0f} bytes/record, "
+          f"loaded in {dict_seconds:.2f}s")
+    print(f"🧮 University records: {record_bytes / 2**20:8.1f} MiB, {record_bytes / count:6.0f} bytes/record, "
+          f"loaded in {record_seconds:.2f}s")
+    print(f"📉 {(1 - record_bytes / dict_bytes) * 100:.0f}% less memory per record")
+    print(f"{'✅' if lossless else '❌'} to_dict() {'matches' if lossless else 'differs from'} every parsed record")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+In-memory store for the universities list with hash indexes.
+
+The records stay the objects of the list passed in (plain dicts, or
+university_record.University records), so anything holding the original
+list sees every update. Lookups by (name, country), domain and
+alpha_two_code are dict lookups instead of scans over the whole list.
+"""
+
+from bisect import insort
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+INDEXED_FIELDS = ("name", "country", "domains", "alpha_two_code")
+
+
+def normalize_domain(domain: str) -> str:
+    return domain.strip().lower().rstrip(".")
+
+
+class UniversityStore:
+    """Universities with O(1) lookups on (name, country), domain and country code."""
+
+    def __init__(self, universities: Iterable[Dict] = ()):
+        self.records: List[Dict] = []
+        self._positions: Dict[int, int] = {}  # id(record) -> position in records
+        self._by_name_country: Dict[Tuple[str, str], List[int]] = {}
+        self._by_domain: Dict[str, List[int]] = {}
+        self._by_code: Dict[str, List[int]] = {}
+        for university in universities:
+            self.add(university)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self.records)
+
+    def add(self, university: Dict) -> int:
+        """Add a record and index it; returns its position."""
+        position = len(self.records)
+        self.records.append(university)
+        self._positions[id(university)] = position
+        self._index(position, university)
+        return position
+
+    def _index_keys(self, university: Dict):
+        name_key = (university.get("name"), university.get("country"))
+        domains = {normalize_domain(domain) for domain in university.get("domains") or ()}
+        return name_key, domains, university.get("alpha_two_code")
+
+    def _index(self, position: int, university: Dict):
+        name_key, domains, code = self._index_keys(university)
+        # insort keeps each bucket in dataset order, also after a re-index
+        insort(self._by_name_country.setdefault(name_key, []), position)
+        for domain in domains:
+            insort(self._by_domain.setdefault(domain, []), position)
+        if code:
+            insort(self._by_code.setdefault(code, []), position)
+
+    def _unindex(self, position: int, university: Dict):
+        name_key, domains, code = self._index_keys(university)
+        _discard(self._by_name_country, name_key, position)
+        for domain in domains:
+            _discard(self._by_domain, domain, position)
+        if code:
+            _discard(self._by_code, code, position)
+
+    def find(self, name: str, country: str) -> Optional[Dict]:
+        """First record (in dataset order) with this exact name and country."""
+        positions = self._by_name_country.get((name, country))
+        return self.records[positions[0]] if positions else None
+
+    def find_all(self, name: str, country: str) -> List[Dict]:
+        return [self.records[p] for p in self._by_name_country.get((name, country), ())]
+
+    def by_domain(self, domain: str) -> List[Dict]:
+        return [self.records[p] for p in self._by_domain.get(normalize_domain(domain), ())]
+
+    def by_country_code(self, alpha_two_code: str) -> List[Dict]:
+        return [self.records[p] for p in self._by_code.get(alpha_two_code, ())]
+
+    def update(self, university: Dict, fields: Dict):
+        """Update a stored record in place, re-indexing it if an indexed field changes."""
+        position = self._positions[id(university)]
+        reindex = any(field in INDEXED_FIELDS for field in fields)
+        if reindex:
+            self._unindex(position, university)
+        university.update(fields)
+        if reindex:
+            self._index(position, university)
+
+
+def _discard(index: Dict, key, position: int):
+    positions = index.get(key)
+    if positions is None:
+        return
+    positions.remove(position)
+    if not positions:
+        del index[key]
@@ -0,0 +1,103 @@
+"""
+Streaming read/write helpers for the universities JSON files.
+
+The dataset is one large JSON array. iter_universities() parses it one
+element at a time and write_universities() writes records as they arrive,
+so a pipeline of generators keeps only a small window of records in memory
+no matter how big the file is. The output is byte-for-byte what
+json.dump(universities, f, indent=2, ensure_ascii=False) would write.
+"""
+
+import json
+import os
+from typing import Dict, Iterable, Iterator
+
+READ_CHUNK_SIZE = 1 << 16
+
+_WHITESPACE = " \t\n\r"
+
+
+def iter_universities(file_path: str, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Dict]:
+    """Yield the elements of a JSON array file one at a time."""
+    decoder = json.JSONDecoder()
+
+    with open(file_path, 'r', encoding='utf-8') as f:
+        buffer = ""
+        pos = 0
+        eof = False
+
+        def read_more():
+            nonlocal buffer, pos, eof
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+        def next_char() -> str:
+            """Skip whitespace and return the next character ("" at end of file)."""
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    return buffer[pos] if pos < len(buffer) else ""
+                read_more()
+
+        if next_char() != "[":
+            raise ValueError(f"Expected a JSON array in {file_path}")
+        pos += 1
+        if next_char() == "]":
+            return
+
+        while True:
+            next_char()
+            try:
+                university, end = decoder.raw_decode(buffer, pos)
+                # A value ending this close to the end of the buffer may be a
+                # number cut short ("2." of "2.5"), so wait for more input
+                if len(buffer) - end < 3 and not eof:
+                    raise json.JSONDecodeError("Truncated value", buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                read_more()
+                continue
+
+            pos = end
+            yield university
+
+            separator = next_char()
+            if separator == "]":
+                return
+            if separator != ",":
+                raise ValueError(f"Malformed JSON array in {file_path} near {separator!r}")
+            pos += 1
+
+
+def write_universities(universities: Iterable[Dict], file_path: str) -> int:
+    """
+    Write universities to a JSON array file as they are produced.
+
+    The records go to a temporary file next to file_path which replaces it
+    once the array is complete, so streaming a file onto itself is safe.
+    Returns the number of records written.
+    """
+    tmp_path = f"{file_path}.tmp"
+    count = 0
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for university in universities:
+                if not isinstance(university, dict):
+                    university = university.to_dict()  # a university_record.University
+                f.write(",\n  " if count else "[\n  ")
+                # Same layout as json.dump(..., indent=2) one level deep
+                f.write(json.dumps(university, indent=2, ensure_ascii=False).replace("\n", "\n  "))
+                count += 1
+            f.write("\n]" if count else "[]")
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return count